@@ -1,8 +1,15 @@
+from .bot_host import BotHost
 from .bot_manager import BotManager
 from .logger import setup_logger
+from .message_batcher import MessageBatcher, MessageBatcherStatsDict
 from .messaging import *
-from .model_commands_parser import ModelCommandsParser
+from .model_client import ModelClient, ModelClientError
+from .model_commands_parser import CommandDetector, ModelCommandsParser
 from .plugins import *
+from .profile_registry import ProfileRegistry
+from .prompt_template import PromptTemplate, compile_template
+from .response_cache import ResponseCache, ResponseCacheStatsDict
+from .runtime import Runtime
 from .scheduler import Scheduler, WakeUpSchedule, WakeUpScheduleType
 from .storage import *
 from .webserver import *
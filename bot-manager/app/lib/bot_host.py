@@ -0,0 +1,83 @@
+import logging
+from pathlib import Path
+
+from flask import Flask
+
+from app.lib.bot_manager import BotManager
+from app.lib.logger import setup_logger
+from app.lib.runtime import Runtime
+from app.lib.storage.storage import user_data_dir
+from app.lib.webserver.webserver import create_web_app
+
+
+class BotHost:
+    """
+    Hosts many bots in one process. Every folder in bots_dir holds the
+    config and memory of one bot, the bots are keyed by their config id.
+    They share one event loop, HTTP connection pool and web server, the
+    web api of a bot is served under /bots/<id>/api.
+    """
+
+    def __init__(self, dev_mode: bool, bots_dir: Path | None = None) -> None:
+        self.logger = setup_logger(
+            "BotHost",
+            logging.DEBUG,
+        )
+        self.dev_mode: bool = dev_mode
+        self.bots_dir: Path = (
+            bots_dir
+            if bots_dir is not None
+            else user_data_dir(dev_mode) / "bots"
+        )
+        self.runtime: Runtime = Runtime()
+        self.bots: dict[str, BotManager] = {}
+        self.web_app: Flask = create_web_app(self.bots)
+
+    def load_bots(self, min_bots: int = 1) -> None:
+        """Loads a bot from every folder, creates folders up to min_bots"""
+        self.bots_dir.mkdir(parents=True, exist_ok=True)
+        data_dirs = sorted(
+            path for path in self.bots_dir.iterdir() if path.is_dir()
+        )
+        for number in range(len(data_dirs), min_bots):
+            data_dir = self.bots_dir / f"bot-{number + 1}"
+            while data_dir in data_dirs:
+                data_dir = data_dir.with_name(f"{data_dir.name}-new")
+            data_dirs.append(data_dir)
+        for data_dir in data_dirs:
+            self.add_bot(data_dir)
+        self.logger.info(f"Loaded {len(self.bots)} bots from {self.bots_dir}")
+
+    def add_bot(self, data_dir: Path) -> BotManager:
+        bot = BotManager(
+            dev_mode=self.dev_mode,
+            runtime=self.runtime,
+            data_dir=data_dir,
+            web_app=self.web_app,
+        )
+        if bot.id in self.bots:
+            raise ValueError(
+                f"Bot {bot.id} in {data_dir} is already hosted from {self.bots[bot.id].storage.data_dir}"
+            )
+        self.bots[bot.id] = bot
+        return bot
+
+    def start(self, port: int) -> None:
+        """Starts all bots and serves their web apis, blocks"""
+        for bot_id, bot in self.bots.items():
+            self.logger.info(f"Starting bot {bot_id}...")
+            bot.run_startup_tasks()
+            bot.scheduler.start_scheduler()
+            bot.web_server.init_routes()
+
+        @self.web_app.route('/bots', methods=['GET'])
+        def list_bots() -> tuple[list[dict[str, str | None]], int]:
+            return [
+                {"id": bot_id, "bot_name": bot.storage.bot_config.bot_name}
+                for bot_id, bot in self.bots.items()
+            ], 200
+
+        self.logger.info(
+            f"Starting web server for {len(self.bots)} bots on port: {port}"
+        )
+        self.web_app.run(host="0.0.0.0", port=port, debug=False)
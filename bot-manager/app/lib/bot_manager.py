@@ -1,55 +1,117 @@
 import asyncio
+import atexit
+import concurrent.futures
 import logging
-import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Awaitable, Coroutine
 
+from flask import Flask
+
+from app.lib.context_builder import ContextBuilder
 from app.lib.logger import setup_logger
+from app.lib.message_batcher import MessageBatcher
 from app.lib.messaging.bot_profile import SetUserNameResponse
 from app.lib.messaging.message_received import ReceiveChatMessage
 from app.lib.messaging.message_send import SendChatMessageResponse
 from app.lib.messaging.room import ChatRoom
 from app.lib.messaging.room_users import ChatRoomUsers
 from app.lib.messaging.rooms import ChatRooms
+from app.lib.model_client import ModelClient
 from app.lib.plugins import PluginManager
+from app.lib.profile_registry import ProfileRegistry
+from app.lib.response_cache import ResponseCache
+from app.lib.runtime import Runtime
 from app.lib.scheduler import Scheduler
+from app.lib.storage.async_storage import AsyncStorage
 from app.lib.storage.storage import Storage
 from app.lib.webserver.webserver import WebServer
-from profiles.default import Profile
+
+if TYPE_CHECKING:
+    from profiles.default import Profile
 
 
 class BotManager:
-    def __init__(self, dev_mode: bool) -> None:
+    def __init__(
+        self,
+        dev_mode: bool,
+        runtime: Runtime | None = None,
+        data_dir: Path | None = None,
+        web_app: Flask | None = None,
+    ) -> None:
+        """
+        A bot runs alone with its own runtime and web server, or together
+        with other bots of a BotHost that passes the shared runtime and
+        web app and a data_dir per bot
+        """
         self.logger = setup_logger(
             "BotManager",
             logging.DEBUG,
         )
-        self.threads: list[threading.Thread] = []
-        self.data_lock = threading.Lock()
         self.dev_mode: bool = dev_mode
+        self.runtime: Runtime = runtime if runtime is not None else Runtime()
         self.plugin_manager: PluginManager = PluginManager(self)
-        self.storage = Storage(dev_mode=dev_mode)
-        self.profile: Profile = Profile()
-        self.web_server: WebServer = WebServer(self, dev_mode)
+        self.storage = Storage(dev_mode=dev_mode, data_dir=data_dir)
+        # for coroutines on the runtime loop, writes on an I/O thread
+        self.async_storage: AsyncStorage = AsyncStorage(self.storage)
+        self.runtime.on_shutdown(self.async_storage.close)
+        self.model_client: ModelClient = ModelClient(
+            self.storage.bot_config, self.runtime
+        )
+        self.runtime.on_shutdown(self.model_client.close)
+        self.message_batcher: MessageBatcher = MessageBatcher(
+            self.storage.bot_config, self.deliver_messages
+        )
+        self.response_cache: ResponseCache | None = self._create_cache()
+        self.profile: "Profile" = ProfileRegistry.get(
+            self.storage.bot_config.profile_file_name
+        )
+        self.context_builder: ContextBuilder = ContextBuilder(
+            self.storage, self.profile
+        )
+        self.web_server: WebServer = WebServer(self, dev_mode, web_app)
         self.scheduler: Scheduler = Scheduler(self)
 
+    def _create_cache(self) -> ResponseCache | None:
+        config = self.storage.bot_config
+        if not config.response_cache:
+            return None
+        cache = ResponseCache(
+            max_entries=config.response_cache_size,
+            ttl_seconds=config.response_cache_ttl_seconds,
+            path=(
+                self.storage.data_dir / "response_cache.sqlite3"
+                if config.response_cache_on_disk
+                else None
+            ),
+        )
+        atexit.register(cache.close)
+        return cache
+
+    @property
+    def id(self) -> str:
+        return self.storage.bot_config.id
+
+    def run_task(
+        self, name: str, coroutine: Coroutine[Any, Any, None]
+    ) -> concurrent.futures.Future[None]:
+        """Runs coroutine on the runtime loop and logs when it fails"""
+
+        async def task() -> None:
+            try:
+                await coroutine
+            except Exception as e:
+                self.logger.exception(f"{name} exited with an error: {e}")
+
+        return self.runtime.submit(task())
+
     def run_startup_tasks(self) -> None:
         """
-        Start all loaded plugins by calling their 'listen' method.
+        Start all loaded plugins by calling their 'on_startup' method.
         """
         for name, plugin in self.plugin_manager.plugins.items():
             if self.plugin_manager.is_overridden(plugin, "on_startup"):
                 self.logger.info(f"Starting bot plugin {name}...")
-
-                # def _on_startup():
-                try:
-                    asyncio.run(plugin.on_startup())
-                except Exception as e:
-                    self.logger.exception(
-                        f"Bot plugin {name} exited with an error: {e}"
-                    )
-
-                # thread = threading.Thread(target=_on_startup)
-                # thread.start()
-                # self.threads.append(thread)
+                self.run_task(f"Bot plugin {name}", plugin.on_startup())
                 self.logger.info(f"Started bot plugin {name}...")
 
     async def set_chat_user_name(self, new_name: str) -> SetUserNameResponse:
@@ -103,29 +165,47 @@ class BotManager:
         self.logger.info(error)
         raise RuntimeError(error)
 
-    def execute_new_message_callback(
-        self, message: ReceiveChatMessage
-    ) -> list[threading.Thread]:
+    def execute_new_message_callback(self, message: ReceiveChatMessage) -> None:
         """
-        can be triggered by other plugins e.g. matrix plugin
+        can be triggered by other plugins e.g. matrix plugin, from any thread
         """
-        threads: list[threading.Thread] = []
+        self.runtime.start()
+        if self.storage.bot_config.message_batch_window_seconds > 0:
+            self.runtime.loop.call_soon_threadsafe(
+                self.message_batcher.add, message
+            )
+        else:
+            self.run_task("Message delivery", self.deliver_messages([message]))
+
+    async def deliver_messages(
+        self, messages: list[ReceiveChatMessage]
+    ) -> None:
+        """Hands a batch of messages to the bot plugins and waits for them"""
+        tasks: list[Awaitable[None]] = []
         for name, plugin in self.plugin_manager.plugins.items():
             if self.plugin_manager.is_overridden(
+                plugin, "new_messages_callback"
+            ):
+                tasks.append(
+                    self._run_callback(
+                        name, plugin.new_messages_callback(messages)
+                    )
+                )
+            elif self.plugin_manager.is_overridden(
                 plugin, "new_message_callback"
             ):
-                self.logger.info(f"Starting bot plugin {name}...")
+                tasks += [
+                    self._run_callback(
+                        name, plugin.new_message_callback(message)
+                    )
+                    for message in messages
+                ]
+        await asyncio.gather(*tasks)
 
-                def listener() -> None:
-                    try:
-                        asyncio.run(plugin.new_message_callback(message))
-                    except Exception as e:
-                        self.logger.exception(
-                            f"Bot plugin {name} exited with an error: {e}"
-                        )
-
-                thread = threading.Thread(target=listener)
-                thread.start()
-                threads.append(thread)
-                self.logger.info(f"Started bot plugin {name}...")
-        return threads
+    async def _run_callback(
+        self, name: str, coroutine: Coroutine[Any, Any, None]
+    ) -> None:
+        try:
+            await coroutine
+        except Exception as e:
+            self.logger.exception(f"Bot plugin {name} exited with an error: {e}")
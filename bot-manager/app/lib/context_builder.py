@@ -0,0 +1,196 @@
+import datetime
+import logging
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+from app.lib.logger import setup_logger
+from app.lib.prompt_template import compile_template
+from app.lib.storage.bot_memory import (
+    BotMemory,
+    ModelMessageDict,
+    Periods,
+    Roles,
+)
+from app.lib.storage.search_index import SearchHitDict
+from app.lib.storage.token_counter import MESSAGE_OVERHEAD_TOKENS
+
+if TYPE_CHECKING:
+    from app.lib.storage.storage import Storage
+    from profiles.default import Profile
+
+# budget of models without an entry in context_token_budgets
+DEFAULT_TOKEN_BUDGET = 4000
+
+
+@dataclass
+class ModelContext:
+    messages: list[ModelMessageDict]
+    token_count: int
+    token_budget: int
+
+
+class ContextBuilder:
+    """
+    Packs the messages of a model request into the token budget of the
+    model: the system prompt and the newest message always, then recent
+    messages up to recent_share of the budget, the mind map, the latest
+    summaries and relevant older memories, and with what is left even
+    more recent messages.
+    Message token counts are cached in the memory, so packing only
+    touches the messages it selects. Prompts are only counted once, for
+    a section just the fields filled into the prompt are counted.
+    It reads a snapshot of the memory, messages stored meanwhile do not
+    change the context.
+    """
+
+    def __init__(
+        self,
+        storage: "Storage",
+        profile: "Profile",
+        recent_share: float = 0.5,
+    ) -> None:
+        self.logger = setup_logger(
+            "ContextBuilder",
+            logging.DEBUG,
+        )
+        self.storage: "Storage" = storage
+        self.profile: "Profile" = profile
+        self.recent_share: float = recent_share
+
+    def token_budget(self) -> int:
+        config = self.storage.bot_config
+        budgets = config.context_token_budgets
+        return budgets.get(
+            config.model_name, budgets.get("default", DEFAULT_TOKEN_BUDGET)
+        )
+
+    def build(self, system_prompt: str, query: str) -> ModelContext:
+        """
+        Returns the messages for a request answering query,
+        the newest message of the memory
+        """
+        budget = self.token_budget()
+        used = (
+            compile_template(system_prompt).static_token_count
+            + MESSAGE_OVERHEAD_TOKENS
+        )
+        bot_memory = self.storage.bot_memory.get_snapshot()
+        newest = bot_memory.get_newest_messages()
+        recent: list[tuple[int, ModelMessageDict]] = []
+        pending: tuple[int, ModelMessageDict, int] | None = None
+
+        def take_recent(limit: int) -> None:
+            nonlocal used, pending
+            while True:
+                if pending is None:
+                    entry = next(newest, None)
+                    if entry is None:
+                        return
+                    seq, message, token_count = entry
+                    pending = (seq, message.to_dict(), token_count)
+                seq, message_dict, token_count = pending
+                # the newest message is sent even over the budget
+                if recent and used + token_count > limit:
+                    return
+                recent.append((seq, message_dict))
+                used += token_count
+                pending = None
+
+        take_recent(int(budget * self.recent_share))
+
+        oldest_seq = recent[-1][0] if recent else None
+        sections: list[str] = []
+        for section, token_count in self._sections(
+            bot_memory, query, oldest_seq
+        ):
+            if used + token_count <= budget:
+                sections.append(section)
+                used += token_count
+
+        take_recent(budget)
+        if used > budget:
+            self.logger.warning(
+                f"Model context uses {used} of {budget} tokens, the system prompt and newest message do not fit"
+            )
+        messages: list[ModelMessageDict] = [
+            {"role": Roles.SYSTEM.value, "content": content}
+            for content in [system_prompt, *sections]
+        ]
+        messages += [message for _, message in reversed(recent)]
+        return ModelContext(
+            messages=messages,
+            token_count=used,
+            token_budget=budget,
+        )
+
+    def _sections(
+        self, bot_memory: BotMemory, query: str, oldest_seq: int | None
+    ) -> list[tuple[str, int]]:
+        """
+        The mind map, latest summaries and memories by priority,
+        with their token counts
+        """
+        sections: list[tuple[str, int]] = []
+        if bot_memory.mind_map:
+            sections.append(
+                self._render(
+                    self.profile.context_mind_map,
+                    mind_map=bot_memory.mind_map,
+                )
+            )
+        now = int(time.time())
+        for period in Periods:
+            summary = bot_memory.get_latest_periodic_summary(period, now)
+            if summary:
+                sections.append(
+                    self._render(
+                        self.profile.summary_entry,
+                        interval=summary.period.value,
+                        start_date=datetime.datetime.fromtimestamp(
+                            summary.period_start_date
+                        ).strftime("%Y-%m-%d"),
+                        summary=summary.summary_text,
+                    )
+                )
+        memories = self.storage.get_relevant_memories(
+            query,
+            self.storage.bot_config.relevant_memories,
+            # the selected recent messages are sent anyway
+            before_seq=oldest_seq,
+        )
+        if memories:
+            sections.append(
+                self._render(
+                    self.profile.relevant_memories,
+                    memories=self.format_hits(memories),
+                )
+            )
+        return sections
+
+    def _render(self, prompt: str, **fields: Any) -> tuple[str, int]:
+        """A profile prompt with fields and its tokens as a message"""
+        template = compile_template(prompt)
+        return (
+            template.format(**fields),
+            template.token_count(**fields) + MESSAGE_OVERHEAD_TOKENS,
+        )
+
+    def format_hits(self, hits: list[SearchHitDict]) -> str:
+        entries: list[str] = []
+        for hit in hits:
+            if hit["kind"] == "summary" and hit["start_time"] is not None:
+                start_date = datetime.datetime.fromtimestamp(
+                    hit["start_time"]
+                ).strftime("%Y-%m-%d")
+                source = f"{hit['period']} summary from {start_date}"
+            elif hit["kind"] == "message":
+                source = f"{hit['role']} message {hit['seq']}"
+            else:
+                source = "mind map"
+            entries.append(
+                self.profile.search_entry.format(
+                    source=source, content=hit["content"]
+                )
+            )
+        return "".join(entries)
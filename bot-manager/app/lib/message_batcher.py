@@ -0,0 +1,106 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, TypedDict
+
+from app.lib.logger import setup_logger
+from app.lib.messaging.message_received import ReceiveChatMessage
+from app.lib.storage.config import Config
+
+
+class MessageBatcherStatsDict(TypedDict):
+    messages: int
+    batches: int
+    largest_batch: int
+    # model calls a call per message would have needed on top
+    saved_model_calls: int
+
+
+class MessageBatcher:
+    """
+    Coalesces the incoming chat messages of a bot. Messages arriving
+    within message_batch_window_seconds of the first pending one are
+    delivered together, right away once message_batch_max_size are
+    pending. Batches are delivered one after another, messages arriving
+    while a batch is answered go into the next one. Only to be used on
+    the runtime loop.
+    """
+
+    def __init__(
+        self,
+        config: Config,
+        deliver: Callable[[list[ReceiveChatMessage]], Awaitable[None]],
+    ) -> None:
+        self.logger = setup_logger(
+            "MessageBatcher",
+            logging.DEBUG,
+        )
+        self.config: Config = config
+        self.deliver: Callable[
+            [list[ReceiveChatMessage]], Awaitable[None]
+        ] = deliver
+        self.pending: list[ReceiveChatMessage] = []
+        self.first_pending_time: float = 0.0
+        self.arrived = asyncio.Event()
+        self.full = asyncio.Event()
+        self.task: asyncio.Task[None] | None = None
+        self.messages: int = 0
+        self.batches: int = 0
+        self.largest_batch: int = 0
+
+    @property
+    def max_size(self) -> int:
+        return max(self.config.message_batch_max_size, 1)
+
+    def add(self, message: ReceiveChatMessage) -> None:
+        loop = asyncio.get_running_loop()
+        if not self.pending:
+            self.first_pending_time = loop.time()
+        self.pending.append(message)
+        self.messages += 1
+        self.arrived.set()
+        if len(self.pending) >= self.max_size:
+            self.full.set()
+        if self.task is None or self.task.done():
+            self.task = loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await self.arrived.wait()
+            remaining = (
+                self.first_pending_time
+                + self.config.message_batch_window_seconds
+                - loop.time()
+            )
+            if remaining > 0 and not self.full.is_set():
+                try:
+                    await asyncio.wait_for(self.full.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+            batch = self.pending[: self.max_size]
+            del self.pending[: self.max_size]
+            if len(self.pending) < self.max_size:
+                self.full.clear()
+            if self.pending:
+                self.first_pending_time = loop.time()
+            else:
+                self.arrived.clear()
+            self.batches += 1
+            self.largest_batch = max(self.largest_batch, len(batch))
+            self.logger.debug(f"Delivering a batch of {len(batch)} messages")
+            try:
+                await self.deliver(batch)
+            except Exception as e:
+                self.logger.exception(
+                    f"Failed to deliver {len(batch)} messages: {e}"
+                )
+
+    def to_dict(self) -> MessageBatcherStatsDict:
+        return {
+            "messages": self.messages,
+            "batches": self.batches,
+            "largest_batch": self.largest_batch,
+            "saved_model_calls": self.messages
+            - len(self.pending)
+            - self.batches,
+        }
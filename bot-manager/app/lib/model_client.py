@@ -0,0 +1,191 @@
+import contextlib
+import json
+import logging
+from enum import Enum
+from typing import Any, AsyncGenerator, AsyncIterator, Literal, TypedDict
+
+import aiohttp
+
+from app.lib.logger import setup_logger
+from app.lib.runtime import Runtime
+from app.lib.storage.bot_memory import ModelMessageDict, Roles
+from app.lib.storage.config import Config
+
+
+class ModelFinishReason(Enum):
+    STOP = "stop"
+
+
+class ModelResponseMessage(TypedDict):
+    role: Roles
+    content: str
+    refusal: None
+
+
+class ModelResponseChoices(TypedDict):
+    index: int
+    message: ModelResponseMessage
+
+    logprobs: None
+    finish_reason: ModelFinishReason
+
+
+class ModelResponseUsage(TypedDict):
+    total_tokens: int
+
+
+class ModelResponseDict(TypedDict):
+    id: str
+    object: Literal['chat.completion']
+    created: int
+    model: str
+    choices: list[ModelResponseChoices]
+    usage: ModelResponseUsage
+    system_fingerprint: str
+
+
+class ModelStreamDelta(TypedDict, total=False):
+    role: Roles
+    content: str
+
+
+class ModelStreamChoices(TypedDict):
+    index: int
+    delta: ModelStreamDelta
+    finish_reason: ModelFinishReason | None
+
+
+class ModelStreamChunkDict(TypedDict):
+    id: str
+    object: Literal['chat.completion.chunk']
+    created: int
+    model: str
+    choices: list[ModelStreamChoices]
+
+
+class ModelClientError(Exception):
+    """
+    The model api is not configured, or answered with an error or an
+    unexpected response
+    """
+
+
+class ModelClient:
+    """
+    Client of the chat completions api at model_api_url of the config.
+    Requests go through the model pool of the runtime, which all bots of
+    the process share, so only the first requests to the api pay for the
+    TCP and TLS handshakes. Timeouts are read from the config on every
+    request. Only to be used on the runtime loop.
+    """
+
+    def __init__(
+        self, config: Config, runtime: Runtime, pooled: bool = True
+    ) -> None:
+        self.logger = setup_logger(
+            "ModelClient",
+            logging.DEBUG,
+        )
+        self.config: Config = config
+        self.runtime: Runtime = runtime
+        # without pooling every request opens and closes a connection
+        self.pooled: bool = pooled
+        self._session: aiohttp.ClientSession | None = None
+
+    @property
+    def configured(self) -> bool:
+        """Requests are only sent with an api key and url configured"""
+        return bool(self.config.model_api_key and self.config.model_api_url)
+
+    def session(self) -> aiohttp.ClientSession:
+        if self.pooled:
+            return self.runtime.model_session()
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(force_close=True)
+            )
+        return self._session
+
+    async def complete(self, messages: list[ModelMessageDict]) -> str:
+        """Returns the content of the model's answer to messages"""
+        response = await self.request(
+            {"model": self.config.model_name, "messages": messages}
+        )
+        try:
+            return response["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError) as e:
+            raise ModelClientError(
+                f"Unexpected response from the model {self.config.model_api_url}: {e}"
+            ) from e
+
+    async def stream(
+        self, messages: list[ModelMessageDict]
+    ) -> AsyncGenerator[str, None]:
+        """
+        Yields the content of the model's answer as the server sends it.
+        Closing the iterator early closes the request, which stops the
+        model from generating the rest.
+        """
+        async with self._post(
+            {
+                "model": self.config.model_name,
+                "messages": messages,
+                "stream": True,
+            }
+        ) as response:
+            # server sent events, one "data: <chunk json>" line per chunk
+            async for line in response.content:
+                data = line.strip()
+                if not data.startswith(b"data:"):
+                    continue
+                data = data[len(b"data:") :].strip()
+                if data == b"[DONE]":
+                    return
+                try:
+                    chunk: ModelStreamChunkDict = json.loads(data)
+                    content = chunk["choices"][0]["delta"].get("content")
+                except (ValueError, KeyError, IndexError, TypeError) as e:
+                    raise ModelClientError(
+                        f"Unexpected stream chunk from the model {self.config.model_api_url}: {e}"
+                    ) from e
+                if content:
+                    yield content
+
+    async def request(self, data: dict[str, Any]) -> ModelResponseDict:
+        async with self._post(data) as response:
+            result: ModelResponseDict = await response.json(content_type=None)
+            return result
+
+    @contextlib.asynccontextmanager
+    async def _post(
+        self, data: dict[str, Any]
+    ) -> AsyncIterator[aiohttp.ClientResponse]:
+        if not self.configured:
+            raise ModelClientError(
+                "No model_api_key or model_api_url configured, set them in the bot config"
+            )
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.config.model_api_key}",
+        }
+        timeout = aiohttp.ClientTimeout(
+            total=self.config.model_request_timeout_seconds,
+            sock_connect=self.config.model_connect_timeout_seconds,
+        )
+        async with self.session().post(
+            self.config.model_api_url,
+            json=data,
+            headers=headers,
+            timeout=timeout,
+        ) as response:
+            if response.status != 200:
+                raise ModelClientError(
+                    f"Error response from the model {self.config.model_api_url} - Error: {response.status}, {await response.text()}"
+                )
+            yield response
+
+    async def close(self) -> None:
+        """Closes the connections of an unpooled client, the runtime closes the pool"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
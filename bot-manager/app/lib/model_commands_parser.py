@@ -12,6 +12,64 @@ if TYPE_CHECKING:
     from plugins.bots.standard_api.main import Plugin
 
 
+class CommandDetector:
+    """
+    Finds the command(...) a completion starts with while it is fed chunk
+    by chunk, as soon as its closing parenthesis arrives. Parentheses in
+    quoted arguments and nested ones do not close the command. Only
+    whitespace and a code fence may come before it, like parse_command
+    accepts. Whatever follows the command is not looked at.
+    """
+
+    command_name_pattern = re.compile(r'(\w+)\s*\Z')
+    prefix_pattern = re.compile(r'\s*(?:```\w*\s*)?\Z')
+
+    def __init__(self) -> None:
+        self.text: str = ""
+        self.command: str | None = None
+        # scan state, kept between chunks
+        self.position: int = 0
+        self.start: int = 0
+        self.depth: int = 0
+        self.quote: str | None = None
+        # the completion does not start with a command
+        self.failed: bool = False
+
+    def feed(self, chunk: str) -> str | None:
+        """Returns the command once the chunk completes it"""
+        self.text += chunk
+        if self.command is not None or self.failed:
+            return None
+        while self.position < len(self.text):
+            char = self.text[self.position]
+            self.position += 1
+            if self.depth == 0:
+                if char == "(":
+                    match = self.command_name_pattern.search(
+                        self.text, 0, self.position - 1
+                    )
+                    if not match or not self.prefix_pattern.match(
+                        self.text, 0, match.start(1)
+                    ):
+                        self.failed = True
+                        return None
+                    self.start = match.start(1)
+                    self.depth = 1
+            elif self.quote:
+                if char == self.quote:
+                    self.quote = None
+            elif char in "'\"":
+                self.quote = char
+            elif char == "(":
+                self.depth += 1
+            elif char == ")":
+                self.depth -= 1
+                if self.depth == 0:
+                    self.command = self.text[self.start : self.position]
+                    return self.command
+        return None
+
+
 class ModelCommandsParser:
     logger = setup_logger(
         "Scheduler",
@@ -34,6 +92,12 @@ class ModelCommandsParser:
         except ValueError:
             return None
 
+    @staticmethod
+    def get_command_name(command: str) -> str | None:
+        """The name of the command an answer starts with, if any"""
+        match = re.match(r'\s*(?:```\w*\s*)?(\w+)\s*\(', command)
+        return match.group(1) if match else None
+
     def _extract_command(self, command: str) -> tuple[str, str] | None:
         # Improved regex to handle nested parentheses and quotes
         command_pattern = re.compile(r'^(\w+)\s*\(([\s\S]*)\)$')
@@ -60,6 +60,15 @@ class PluginBase:
         This gets called when a new message comes in from a messaging plugin
         """
 
+    @abstractmethod
+    async def new_messages_callback(
+        self, messages: list[ReceiveChatMessage]
+    ) -> None:
+        """
+        This gets called with the messages that came in within the batching
+        window, plugins implementing it don't get new_message_callback calls
+        """
+
     ##
     ## web api plugins
     ##
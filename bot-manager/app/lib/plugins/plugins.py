@@ -12,6 +12,9 @@ if TYPE_CHECKING:
 
 
 class PluginManager:
+    # plugin modules by path, bots hosted together import them only once
+    modules: dict[str, ModuleType] = {}
+
     def __init__(self, bot: "BotManager"):
         self.logger = setup_logger(
             "PluginManager",
@@ -57,11 +60,14 @@ class PluginManager:
         """
         Load a Python module from the given file path.
         """
+        if path in PluginManager.modules:
+            return PluginManager.modules[path]
         try:
             spec = importlib.util.spec_from_file_location("plugin_module", path)
             if spec and spec.loader:
                 module = importlib.util.module_from_spec(spec)
                 spec.loader.exec_module(module)
+                PluginManager.modules[path] = module
                 return module
             return None
         except Exception as e:
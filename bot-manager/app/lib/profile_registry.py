@@ -0,0 +1,78 @@
+import importlib
+import logging
+import re
+import threading
+from typing import TYPE_CHECKING
+
+from app.lib.logger import setup_logger
+from app.lib.prompt_template import PromptTemplate
+
+if TYPE_CHECKING:
+    from profiles.default import Profile
+
+DEFAULT_PROFILE = "default"
+# module names in the profiles folder
+PROFILE_NAME = re.compile(r"\w+")
+
+
+class ProfileRegistry:
+    """
+    Profiles by their file name in the profiles folder, the
+    profile_file_name of the config. A profile is a Profile subclass named
+    Profile in that file. Every profile is loaded and its prompts compiled
+    once, bots using the same profile share it and its memoized renders.
+    """
+
+    profiles: dict[str, "Profile"] = {}
+    lock = threading.Lock()
+    logger = setup_logger(
+        "ProfileRegistry",
+        logging.DEBUG,
+    )
+
+    @classmethod
+    def get(cls, name: str) -> "Profile":
+        """The profile called name, the default one if it can't be loaded"""
+        with cls.lock:
+            profile = cls.profiles.get(name)
+            if profile is None:
+                try:
+                    profile = cls.load(name)
+                except Exception as e:
+                    if name == DEFAULT_PROFILE:
+                        raise
+                    cls.logger.exception(
+                        f"Failed to load profile {name}, using {DEFAULT_PROFILE} - error: {e}"
+                    )
+                    profile = cls.profiles.get(DEFAULT_PROFILE) or cls.load(
+                        DEFAULT_PROFILE
+                    )
+                    cls.profiles[DEFAULT_PROFILE] = profile
+                cls.profiles[name] = profile
+            return profile
+
+    @classmethod
+    def load(cls, name: str) -> "Profile":
+        if not PROFILE_NAME.fullmatch(name):
+            raise ValueError(f"Invalid profile file name: {name}")
+        # imported here, profiles import from app.lib themselves. A static
+        # import, so that pyinstaller bundles the default profile
+        from profiles.default import Profile as base_class
+
+        module = importlib.import_module(f"profiles.{name}")
+        profile_class = getattr(module, "Profile", None)
+        if not isinstance(profile_class, type) or not issubclass(
+            profile_class, base_class
+        ):
+            raise ValueError(f"profiles/{name}.py has no Profile class")
+        profile: "Profile" = profile_class()
+        cls.compile(profile)
+        cls.logger.info(f"Loaded profile {name}")
+        return profile
+
+    @staticmethod
+    def compile(profile: "Profile") -> None:
+        """Replaces the prompts of profile with their compiled templates"""
+        for key, value in vars(profile).items():
+            if isinstance(value, str) and not isinstance(value, PromptTemplate):
+                setattr(profile, key, PromptTemplate(value))
@@ -0,0 +1,87 @@
+from functools import lru_cache
+from string import Formatter
+from typing import Any, Callable
+
+from app.lib.storage.token_counter import count_tokens
+
+# renders memoized per template
+RENDER_CACHE_SIZE = 64
+
+
+@lru_cache(maxsize=1024)
+def count_field_tokens(value: str) -> int:
+    """Token count of a field value, mind maps and summaries repeat"""
+    return count_tokens(value)
+
+
+class PromptTemplate(str):
+    """
+    A profile prompt parsed once into its literal parts and fields.
+    format() joins the parts instead of parsing the prompt again and
+    memoizes the renders by their arguments. static_token_count is the
+    token count of the literal parts, token_count() adds the fields.
+    """
+
+    parts: list[tuple[str, str | None]]
+    # only plain {field} replacements, which format() renders itself
+    simple: bool
+    static_token_count: int
+    render: Callable[[tuple[tuple[str, Any], ...]], str]
+
+    def __new__(cls, text: str) -> "PromptTemplate":
+        template = super().__new__(cls, text)
+        template.parts = []
+        simple = True
+        try:
+            for literal, field_name, spec, conversion in Formatter().parse(
+                text
+            ):
+                template.parts.append((literal, field_name))
+                if field_name is not None and (
+                    spec or conversion or not field_name.isidentifier()
+                ):
+                    simple = False
+        except ValueError:
+            # not a valid format string, format() raises like str.format
+            template.parts = [(text, None)]
+            simple = False
+        template.simple = simple
+        template.static_token_count = sum(
+            count_tokens(literal) for literal, _ in template.parts
+        )
+        template.render = lru_cache(maxsize=RENDER_CACHE_SIZE)(
+            template._render
+        )
+        return template
+
+    def format(self, *args: Any, **kwargs: Any) -> str:
+        if args or not self.simple:
+            return str.format(self, *args, **kwargs)
+        try:
+            return self.render(tuple(sorted(kwargs.items())))
+        except TypeError:
+            # unhashable arguments are rendered without the cache
+            return self._render(tuple(sorted(kwargs.items())))
+
+    def _render(self, fields: tuple[tuple[str, Any], ...]) -> str:
+        values = dict(fields)
+        rendered: list[str] = []
+        for literal, field_name in self.parts:
+            rendered.append(literal)
+            if field_name is not None:
+                rendered.append(format(values[field_name]))
+        return "".join(rendered)
+
+    def token_count(self, **kwargs: Any) -> int:
+        """Estimated tokens of the prompt rendered with kwargs"""
+        return self.static_token_count + sum(
+            count_field_tokens(format(value)) for value in kwargs.values()
+        )
+
+
+@lru_cache(maxsize=256)
+def compile_template(text: str) -> PromptTemplate:
+    """The compiled template of a prompt, compiled prompts are returned as is"""
+    if isinstance(text, PromptTemplate):
+        return text
+    return PromptTemplate(text)
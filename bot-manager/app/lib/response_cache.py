@@ -0,0 +1,183 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, TypedDict
+
+from app.lib.logger import setup_logger
+from app.lib.storage.bot_memory import ModelMessageDict
+
+# the database is pruned every this many writes
+PRUNE_WRITES = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    answer TEXT NOT NULL,
+    created REAL NOT NULL,
+    latency_seconds REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_created ON responses (created);
+"""
+
+
+class ResponseCacheStatsDict(TypedDict):
+    lookups: int
+    hits: int
+    disk_hits: int
+    hit_ratio: float
+    # model latency the hits did not wait for
+    saved_seconds: float
+    entries: int
+
+
+@dataclass
+class CachedResponse:
+    answer: str
+    created: float
+    # how long the model took to give the answer
+    latency_seconds: float
+
+
+class ResponseCache:
+    """
+    Model answers keyed by a hash of the model, the messages and the
+    request parameters. Keeps the max_entries most recently used answers
+    in memory, answers older than ttl_seconds are not returned. With a
+    path, answers are also stored in a sqlite database of up to
+    max_disk_entries, which survives restarts.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: float,
+        path: Path | None = None,
+        max_disk_entries: int = 10_000,
+    ) -> None:
+        self.logger = setup_logger(
+            "ResponseCache",
+            logging.DEBUG,
+        )
+        self.max_entries: int = max(max_entries, 1)
+        self.ttl_seconds: float = ttl_seconds
+        self.max_disk_entries: int = max_disk_entries
+        self.entries: OrderedDict[str, CachedResponse] = OrderedDict()
+        self.lookups: int = 0
+        self.hits: int = 0
+        self.disk_hits: int = 0
+        self.saved_seconds: float = 0.0
+        self.disk_writes: int = 0
+        self.lock = threading.Lock()
+        self.connection: sqlite3.Connection | None = None
+        if path is not None:
+            self.connection = sqlite3.connect(path, check_same_thread=False)
+            self.connection.executescript(SCHEMA)
+            self._prune()
+
+    @staticmethod
+    def key(
+        model: str, messages: list[ModelMessageDict], params: dict[str, Any]
+    ) -> str:
+        data = json.dumps(
+            {"model": model, "messages": messages, "params": params},
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        with self.lock:
+            self.lookups += 1
+            response = self.entries.get(key)
+            from_disk = response is None
+            if response is None:
+                response = self._load(key)
+            if response is None:
+                return None
+            if time.time() - response.created > self.ttl_seconds:
+                self.entries.pop(key, None)
+                return None
+            self._remember(key, response)
+            self.hits += 1
+            self.disk_hits += from_disk
+            self.saved_seconds += response.latency_seconds
+            return response.answer
+
+    def put(self, key: str, answer: str, latency_seconds: float) -> None:
+        response = CachedResponse(
+            answer=answer, created=time.time(), latency_seconds=latency_seconds
+        )
+        with self.lock:
+            self._remember(key, response)
+            if self.connection is None:
+                return
+            with self.connection:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                    (key, answer, response.created, latency_seconds),
+                )
+            self.disk_writes += 1
+            if self.disk_writes % PRUNE_WRITES == 0:
+                self._prune()
+
+    def _remember(self, key: str, response: CachedResponse) -> None:
+        self.entries[key] = response
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _load(self, key: str) -> CachedResponse | None:
+        if self.connection is None:
+            return None
+        row = self.connection.execute(
+            "SELECT answer, created, latency_seconds FROM responses"
+            + " WHERE key = ?",
+            (key,),
+        ).fetchone()
+        if row is None:
+            return None
+        return CachedResponse(
+            answer=row[0], created=row[1], latency_seconds=row[2]
+        )
+
+    def _prune(self) -> None:
+        """Deletes expired answers and the oldest beyond max_disk_entries"""
+        if self.connection is None:
+            return
+        with self.connection:
+            expired = self.connection.execute(
+                "DELETE FROM responses WHERE created < ?",
+                (time.time() - self.ttl_seconds,),
+            ).rowcount
+            evicted = self.connection.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM"
+                + " responses ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                (self.max_disk_entries,),
+            ).rowcount
+        if expired or evicted:
+            self.logger.info(
+                f"Deleted {expired} expired and {evicted} old cached responses"
+            )
+
+    def close(self) -> None:
+        with self.lock:
+            if self.connection is not None:
+                self._prune()
+                self.connection.close()
+                self.connection = None
+
+    def to_dict(self) -> ResponseCacheStatsDict:
+        return {
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "hit_ratio": self.hits / self.lookups if self.lookups else 0.0,
+            "saved_seconds": self.saved_seconds,
+            "entries": len(self.entries),
+        }
@@ -0,0 +1,198 @@
+import asyncio
+import atexit
+import concurrent.futures
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Coroutine, TypedDict, TypeVar
+
+import aiohttp
+
+from app.lib.logger import setup_logger
+
+# connections the shared pool keeps open to all hosts together
+HTTP_POOL_SIZE = 100
+# keep-alive connections of all bots together to a model api host
+MODEL_POOL_SIZE = 10
+
+T = TypeVar("T")
+
+
+class LoopStatsDict(TypedDict):
+    checks: int
+    blocked_seconds: float
+    max_blocked_seconds: float
+    slow_checks: int
+
+
+class LoopMonitor:
+    """
+    Measures how long an event loop is blocked: a task sleeps for
+    interval_seconds and records how much later than asked it wakes up.
+    """
+
+    def __init__(
+        self, interval_seconds: float = 0.01, slow_seconds: float = 0.1
+    ) -> None:
+        self.logger = setup_logger(
+            "LoopMonitor",
+            logging.DEBUG,
+        )
+        self.interval_seconds: float = interval_seconds
+        # blocks at least this long are logged
+        self.slow_seconds: float = slow_seconds
+        self.checks: int = 0
+        self.blocked_seconds: float = 0.0
+        self.max_blocked_seconds: float = 0.0
+        self.slow_checks: int = 0
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval_seconds)
+            self.record(loop.time() - started - self.interval_seconds)
+
+    def record(self, blocked_seconds: float) -> None:
+        blocked_seconds = max(blocked_seconds, 0.0)
+        self.checks += 1
+        self.blocked_seconds += blocked_seconds
+        self.max_blocked_seconds = max(
+            self.max_blocked_seconds, blocked_seconds
+        )
+        if blocked_seconds >= self.slow_seconds:
+            self.slow_checks += 1
+            self.logger.warning(
+                f"Event loop was blocked for {blocked_seconds * 1_000:.0f} ms"
+            )
+
+    def reset(self) -> None:
+        self.checks = 0
+        self.blocked_seconds = 0.0
+        self.max_blocked_seconds = 0.0
+        self.slow_checks = 0
+
+    def to_dict(self) -> LoopStatsDict:
+        return {
+            "checks": self.checks,
+            "blocked_seconds": self.blocked_seconds,
+            "max_blocked_seconds": self.max_blocked_seconds,
+            "slow_checks": self.slow_checks,
+        }
+
+
+class Runtime:
+    """
+    Event loop and HTTP connection pools shared by all bots of the process.
+    The loop runs in its own thread, bots submit their coroutines to it
+    instead of starting a thread with an event loop for every task.
+    Model requests get a pool of their own, the long polling requests of
+    the chat clients would take its connections otherwise.
+    """
+
+    def __init__(
+        self,
+        http_pool_size: int = HTTP_POOL_SIZE,
+        model_pool_size: int = MODEL_POOL_SIZE,
+    ) -> None:
+        self.logger = setup_logger(
+            "Runtime",
+            logging.DEBUG,
+        )
+        self.http_pool_size: int = http_pool_size
+        self.model_pool_size: int = model_pool_size
+        self.loop: asyncio.AbstractEventLoop = asyncio.new_event_loop()
+        self.thread: threading.Thread = threading.Thread(
+            target=self._run, name="runtime", daemon=True
+        )
+        self.start_lock = threading.Lock()
+        self._http_connector: aiohttp.TCPConnector | None = None
+        self._model_session: aiohttp.ClientSession | None = None
+        self.monitor: LoopMonitor = LoopMonitor()
+        self.shutdown_callbacks: list[Callable[[], Awaitable[None]]] = []
+
+    def start(self) -> None:
+        with self.start_lock:
+            if self.thread.is_alive() or self.loop.is_closed():
+                return
+            self.thread.start()
+            atexit.register(self.stop)
+            asyncio.run_coroutine_threadsafe(self.monitor.run(), self.loop)
+            self.logger.info("Started runtime event loop")
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(
+        self, coroutine: Coroutine[Any, Any, T]
+    ) -> concurrent.futures.Future[T]:
+        """Schedules coroutine on the shared loop, from any thread"""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def run(self, coroutine: Coroutine[Any, Any, T]) -> T:
+        """Runs coroutine on the shared loop and waits for its result"""
+        return self.submit(coroutine).result()
+
+    def http_connector(self) -> aiohttp.TCPConnector:
+        """
+        The keep-alive connection pool of the process, for clients that
+        need a session of their own. Their sessions must be created with
+        connector_owner=False, the runtime closes the pool when it stops.
+        Only to be used on the runtime loop
+        """
+        if self._http_connector is None or self._http_connector.closed:
+            self._http_connector = aiohttp.TCPConnector(
+                limit=self.http_pool_size
+            )
+        return self._http_connector
+
+    def model_session(self) -> aiohttp.ClientSession:
+        """
+        The keep-alive connection pool of the model clients of all bots,
+        up to model_pool_size connections per host.
+        Only to be used on the runtime loop
+        """
+        if self._model_session is None or self._model_session.closed:
+            self._model_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.http_pool_size,
+                    limit_per_host=self.model_pool_size,
+                )
+            )
+        return self._model_session
+
+    def on_shutdown(self, callback: Callable[[], Awaitable[None]]) -> None:
+        """Registers a coroutine function the runtime awaits when stopping"""
+        self.shutdown_callbacks.append(callback)
+
+    async def _shutdown(self) -> None:
+        """Cancels the tasks of the bots and closes the connections"""
+        current = asyncio.current_task()
+        tasks = [task for task in asyncio.all_tasks() if task is not current]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for callback in self.shutdown_callbacks:
+            try:
+                await callback()
+            except Exception as e:
+                self.logger.warning(f"Failed to run a shutdown callback: {e}")
+        if self._model_session is not None:
+            await self._model_session.close()
+        if self._http_connector is not None:
+            await self._http_connector.close()
+        self._model_session = None
+        self._http_connector = None
+
+    def stop(self) -> None:
+        if not self.thread.is_alive():
+            return
+        try:
+            self.submit(self._shutdown()).result(timeout=5)
+        except Exception as e:
+            self.logger.warning(f"Failed to shut down the runtime tasks: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.logger.info("Stopped runtime event loop")
@@ -9,6 +9,7 @@ if TYPE_CHECKING:
     from app.lib.bot_manager import BotManager
 
 from app.lib.logger import setup_logger
+from app.lib.storage.storage import RETENTION_BATCH
 
 
 class WakeUpScheduleType(Enum):
@@ -33,13 +34,9 @@ class Scheduler:
         Makes sure the bot wakes up according to the schedule
         """
         self.logger.info(f"Starting wakeup scheduler...")
-
-        def _wakeup_schedule_main_loop() -> None:
-            asyncio.run(self._wakeup_schedule_main_loop())
-
-        thread = threading.Thread(target=_wakeup_schedule_main_loop)
-        thread.start()
-        self.bot.threads.append(thread)
+        self.bot.run_task(
+            "Wakeup scheduler", self._wakeup_schedule_main_loop()
+        )
         self.logger.info(f"Started wakeup_scheduler...")
 
     async def _wakeup_schedule_main_loop(self) -> None:
@@ -69,31 +66,58 @@ class Scheduler:
                     self.logger.info(
                         f"Still dreaming - next wakeup in {round((time.time() - self.scheduled_wakeup.wakeup_time)*-1 / 60 / 60, 1)} hours"
                     )
+                    await self.enforce_retention()
                     await asyncio.sleep(60)
                 else:
                     self.logger.info(
                         f"Starting dreaming - next wakeup in {round((time.time() - self.scheduled_wakeup.wakeup_time)*-1 / 60 / 60, 1)} hours"
                     )
                     self.should_dream.set()
+                    await self.enforce_retention()
                     self.start_dreaming()
 
+    async def enforce_retention(self) -> None:
+        """
+        Evicts old messages, summaries and archived days while the bot
+        sleeps, one batch at a time so the loop stays responsive
+        """
+        storage = self.bot.storage
+        loop = asyncio.get_running_loop()
+        try:
+            evicted = 0
+            while True:
+                # selecting and archiving run on a worker thread, the loop
+                # is shared by all bots
+                messages, evicted_bytes = await loop.run_in_executor(
+                    None, storage.select_evictions, RETENTION_BATCH
+                )
+                if not messages:
+                    break
+                evicted += storage.evict_messages(messages, evicted_bytes)
+                self.bot.async_storage.store_data()
+                if len(messages) < RETENTION_BATCH:
+                    break
+            summaries = storage.enforce_summary_retention()
+            if summaries:
+                self.bot.async_storage.store_data()
+            segments = await loop.run_in_executor(
+                None, storage.enforce_archive_retention
+            )
+            if evicted or summaries or segments:
+                self.logger.info(
+                    f"Retention evicted {evicted} messages, {summaries} summaries and {segments} archived days"
+                )
+        except Exception as e:
+            self.logger.exception(f"Enforcing retention failed: {e}")
+
     def start_dreaming(self) -> None:
         self.should_dream.set()
         for name, plugin in self.bot.plugin_manager.plugins.items():
             if self.bot.plugin_manager.is_overridden(plugin, "dream"):
                 self.logger.info(f"Start dreaming on {name}...")
-
-                def dream() -> None:
-                    try:
-                        asyncio.run(plugin.dream())
-                    except Exception as e:
-                        self.logger.exception(
-                            f"Bot plugin {name} exited dreaming with an error: {e}"
-                        )
-
-                thread = threading.Thread(target=dream)
-                thread.start()
-                self.bot.threads.append(thread)
+                self.bot.run_task(
+                    f"Bot plugin {name} dreaming", plugin.dream()
+                )
                 self.logger.info(f"Started dreaming on {name}...")
 
 
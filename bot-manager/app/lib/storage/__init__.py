@@ -1,18 +1,51 @@
+from .async_storage import AsyncStorage
+from .binary_snapshot import BinarySnapshot
 from .bot_memory import (
+    AddMessageRecordDict,
     BotMemory,
     BotMemoryDict,
+    DeletePeriodicSummaryRecordDict,
+    DropMessagesRecordDict,
+    MemoryRecordDict,
+    MemorySections,
+    MessageLog,
+    MessageLogView,
     ModelMessage,
     ModelMessageDict,
     PeriodicSummary,
     PeriodicSummaryDict,
     Periods,
     Roles,
+    SetMindMapRecordDict,
+    SetPeriodicSummaryRecordDict,
+    StoredModelMessageDict,
 )
 from .config import (
     BotConfigDict,
     Config,
     ConfigDict,
+    Durability,
     MessageInterfaceConfigDict,
+    RetentionActions,
+    SnapshotFormats,
+    StorageConfigDict,
+    StorageModes,
     WebInterfaceConfigDict,
 )
-from .storage import Storage, StorageDict
+from .durable_files import DurableFiles
+from .memory_backend import MemoryBackend
+from .message_archive import ArchiveSegment, MessageArchive
+from .memory_engines import JsonMemoryEngine, MemoryEngine, WalMemoryEngine
+from .search_index import InvertedIndex, MemorySearchIndex, SearchHitDict
+from .sqlite_memory_engine import SqliteMemoryEngine
+from .storage import (
+    Storage,
+    StorageDict,
+    StorageSnapshot,
+    user_data_dir,
+)
+from .storage_flusher import StorageFlusher
+from .storage_stats import StorageStats, StorageStatsDict
+from .token_counter import count_message_tokens, count_tokens
+from .vector_index import HashingEmbedder, MemoryVectorIndex, VectorIndex
+from .write_ahead_log import WriteAheadLog
@@ -0,0 +1,79 @@
+import asyncio
+import atexit
+import concurrent.futures
+import logging
+import time
+
+from app.lib.logger import setup_logger
+from app.lib.storage.storage import Storage
+
+
+class AsyncStorage:
+    """
+    Storage API for coroutines on an event loop. Serializing and writing
+    the memory run on a dedicated I/O thread, never on the loop.
+    Commits are written in the order they were made, awaiting one
+    returns once its changes and all before them are on disk.
+    Mutations still go to the storage on the loop, they only touch RAM.
+    """
+
+    def __init__(self, storage: Storage) -> None:
+        self.logger = setup_logger(
+            "AsyncStorage",
+            logging.DEBUG,
+        )
+        self.storage: Storage = storage
+        # one thread, so writes happen in submission order
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="StorageIO"
+        )
+        atexit.register(self.executor.shutdown)
+        self.commits: int = 0
+        self.commit_seconds: float = 0.0
+
+    def store_data(self) -> None:
+        """
+        Marks the changes for a later write and returns right away,
+        like Storage.store_data() but without writing on the caller's
+        thread when the flusher is disabled
+        """
+        flusher = self.storage.flusher
+        flusher.mark(self.storage.bot_memory.journal_bytes)
+        if flusher.thread is None:
+            self.executor.submit(self._flush).add_done_callback(
+                self._log_failure
+            )
+
+    async def commit(self) -> bool:
+        """
+        Marks the changes and waits until they are written,
+        returns False when writing failed
+        """
+        started = time.perf_counter()
+        self.storage.flusher.mark(self.storage.bot_memory.journal_bytes)
+        try:
+            # a commit queued behind another finds its changes written
+            await asyncio.wrap_future(self.executor.submit(self._flush))
+        except Exception as e:
+            self.logger.exception(f"Failed to store bot config and memory: {e}")
+            return False
+        finally:
+            self.commits += 1
+            self.commit_seconds += time.perf_counter() - started
+        return True
+
+    def _flush(self) -> None:
+        self.storage.flush()
+
+    def _log_failure(self, future: concurrent.futures.Future[None]) -> None:
+        error = future.exception()
+        if error is not None:
+            self.logger.error(f"Failed to store bot config and memory: {error}")
+
+    async def close(self) -> None:
+        """
+        Writes what is pending and stops the I/O thread,
+        the runtime awaits it when stopping
+        """
+        await self.commit()
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,200 @@
+import json
+import struct
+import sys
+from array import array
+
+from app.lib.storage.bot_memory import (
+    BOT_MEMORY_FORMAT_VERSION,
+    BotMemory,
+    MessageLog,
+    PeriodicSummary,
+    Periods,
+)
+
+BINARY_SNAPSHOT_MAGIC = b"AIMSNAP\0"
+BINARY_SNAPSHOT_VERSION = 1
+# magic, binary snapshot version, bot memory format version
+SNAPSHOT_HEADER = struct.Struct("<8sHH")
+COUNT = struct.Struct("<I")
+PERIODS: tuple[Periods, ...] = tuple(Periods)
+PERIOD_CODES: dict[Periods, int] = {
+    period: code for code, period in enumerate(PERIODS)
+}
+
+
+class BinarySnapshot:
+    """
+    Versioned binary snapshot of the bot memory.
+    All strings go into one string table, equal strings are stored once.
+    The table stores the lengths in characters followed by the utf-8 text,
+    so it decodes in one pass and is sliced without copying each string.
+    Messages are stored as columns that load straight into the arrays
+    of the message log.
+
+    layout, little endian:
+    header      magic, version, memory format version
+    strings     count, lengths (uint32 each), utf-8 text length, utf-8 text
+    mind map    string index + 1, 0 when there is no mind map
+    summaries   count, then per summary period code (uint8),
+                start date (int64), string index (uint32)
+    messages    count, next seq, then the columns seqs (int64),
+                timestamps_ns (int64), roles (uint8), string indexes (uint32)
+    """
+
+    @staticmethod
+    def encode(bot_memory: BotMemory) -> bytes:
+        strings: dict[str, int] = {}
+
+        def string_index(text: str) -> int:
+            index = strings.get(text)
+            if index is None:
+                index = strings[text] = len(strings)
+            return index
+
+        mind_map_index = (
+            0
+            if bot_memory.mind_map is None
+            else string_index(bot_memory.mind_map) + 1
+        )
+        summaries = bytearray()
+        summary_count = 0
+        for period in Periods:
+            for summary in bot_memory.get_periodic_summaries(period):
+                summaries += struct.pack(
+                    "<BqI",
+                    PERIOD_CODES[summary.period],
+                    summary.period_start_date,
+                    string_index(summary.summary_text),
+                )
+                summary_count += 1
+
+        # columns of their own, the memory may grow while encoding
+        messages = bot_memory.messages.copy()
+        contents = array(
+            "I", (string_index(content) for content in messages.contents)
+        )
+
+        text = "".join(strings).encode("utf-8")
+        lengths = array("I", (len(string) for string in strings))
+        return b"".join(
+            [
+                SNAPSHOT_HEADER.pack(
+                    BINARY_SNAPSHOT_MAGIC,
+                    BINARY_SNAPSHOT_VERSION,
+                    BOT_MEMORY_FORMAT_VERSION,
+                ),
+                COUNT.pack(len(lengths)),
+                _to_little_endian(lengths),
+                struct.pack("<Q", len(text)),
+                text,
+                COUNT.pack(mind_map_index),
+                COUNT.pack(summary_count),
+                bytes(summaries),
+                struct.pack("<Iq", len(contents), messages.next_seq),
+                _to_little_endian(messages.seqs),
+                _to_little_endian(messages.timestamps_ns),
+                messages.roles.tobytes(),
+                _to_little_endian(contents),
+            ]
+        )
+
+    @staticmethod
+    def decode(data: bytes) -> BotMemory:
+        magic, version, format_version = SNAPSHOT_HEADER.unpack_from(data, 0)
+        if magic != BINARY_SNAPSHOT_MAGIC:
+            raise ValueError("Not a binary bot memory snapshot")
+        if (
+            version != BINARY_SNAPSHOT_VERSION
+            or format_version != BOT_MEMORY_FORMAT_VERSION
+        ):
+            raise ValueError(
+                f"Unsupported binary snapshot version {version}.{format_version}"
+            )
+        reader = _Reader(data, SNAPSHOT_HEADER.size)
+
+        lengths = reader.read_array("I", reader.read_count())
+        (text_size,) = reader.read_struct("<Q")
+        text = reader.read_bytes(text_size).decode("utf-8")
+        strings: list[str] = []
+        offset = 0
+        for length in lengths:
+            strings.append(text[offset : offset + length])
+            offset += length
+
+        mind_map_index = reader.read_count()
+        bot_memory = BotMemory(
+            mind_map=strings[mind_map_index - 1] if mind_map_index else None
+        )
+
+        for _ in range(reader.read_count()):
+            period_code, start_date, text_index = reader.read_struct("<BqI")
+            period = PERIODS[period_code]
+            bot_memory.periodic_summaries.setdefault(period.value, {})[
+                start_date
+            ] = PeriodicSummary(period, start_date, strings[text_index])
+
+        message_count, next_seq = reader.read_struct("<Iq")
+        message_log = MessageLog()
+        message_log.seqs = reader.read_array("q", message_count)
+        message_log.timestamps_ns = reader.read_array("q", message_count)
+        message_log.roles = reader.read_array("B", message_count)
+        message_log.contents = [
+            strings[index] for index in reader.read_array("I", message_count)
+        ]
+        # token counts are not stored, they are counted on first use
+        message_log.token_counts = array("I", [0]) * message_count
+        message_log.next_seq = next_seq
+        bot_memory.messages = message_log
+        return bot_memory
+
+
+class _Reader:
+    def __init__(self, data: bytes, offset: int) -> None:
+        self.data: memoryview = memoryview(data)
+        self.offset: int = offset
+
+    def read_struct(self, format: str) -> tuple[int, ...]:
+        values: tuple[int, ...] = struct.unpack_from(
+            format, self.data, self.offset
+        )
+        self.offset += struct.calcsize(format)
+        return values
+
+    def read_count(self) -> int:
+        return self.read_struct("<I")[0]
+
+    def read_bytes(self, size: int) -> bytes:
+        data = bytes(self.data[self.offset : self.offset + size])
+        self.offset += size
+        return data
+
+    def read_array(self, typecode: str, count: int) -> "array[int]":
+        values = array(typecode)
+        values.frombytes(self.read_bytes(count * values.itemsize))
+        if sys.byteorder == "big":
+            values.byteswap()
+        return values
+
+
+def _to_little_endian(values: "array[int]") -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def convert_snapshot(source: str, target: str, to_binary: bool) -> None:
+    """
+    Convert a snapshot between json and binary,
+    used by convert_memory.py in the bot-manager folder
+    """
+    if to_binary:
+        with open(source, "r", encoding="utf-8") as f:
+            bot_memory = BotMemory.from_dict(json.load(f))
+        with open(target, "wb") as binary_file:
+            binary_file.write(BinarySnapshot.encode(bot_memory))
+        return
+    with open(source, "rb") as binary_file:
+        bot_memory = BinarySnapshot.decode(binary_file.read())
+    with open(target, "w", encoding="utf-8") as f:
+        json.dump(bot_memory.to_dict(), f, indent=4)
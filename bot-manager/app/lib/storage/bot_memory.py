@@ -1,10 +1,35 @@
+import calendar
+import datetime
 import logging
+import threading
 import time
+from array import array
+from bisect import bisect_left, bisect_right, insort
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import Optional, TypedDict
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Generic,
+    Iterator,
+    Literal,
+    MutableSequence,
+    Optional,
+    TypedDict,
+    TypeVar,
+    Union,
+    cast,
+)
 
 from app.lib.logger import setup_logger
+from app.lib.storage.memory_backend import MemoryBackend
+from app.lib.storage.token_counter import count_message_tokens
+
+if TYPE_CHECKING:
+    from app.lib.storage.search_index import MemorySearchIndex
+
+# version 1 keyed messages by second resolution timestamps
+BOT_MEMORY_FORMAT_VERSION = 2
 
 
 class Periods(Enum):
@@ -13,6 +38,47 @@ class Periods(Enum):
     MONTHLY = "monthly"
     YEARLY = "yearly"
 
+    def end_of(self, start_time: int) -> int:
+        """
+        Returns the end of the period that starts at start_time,
+        in local time like the dates of ModelCommandsParser.parse_date
+        """
+        start = datetime.datetime.fromtimestamp(start_time)
+        if self == Periods.DAILY:
+            end = start + datetime.timedelta(days=1)
+        elif self == Periods.WEEKLY:
+            end = start + datetime.timedelta(weeks=1)
+        else:
+            months = 1 if self == Periods.MONTHLY else 12
+            year, month = divmod(start.month - 1 + months, 12)
+            year += start.year
+            month += 1
+            end = start.replace(
+                year=year,
+                month=month,
+                day=min(start.day, calendar.monthrange(year, month)[1]),
+            )
+        return int(end.timestamp())
+
+    def start_of(self, time: int) -> int:
+        """Returns the start of the period that contains time, in local time"""
+        start = datetime.datetime.fromtimestamp(time).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        if self == Periods.WEEKLY:
+            start -= datetime.timedelta(days=start.weekday())
+        elif self == Periods.MONTHLY:
+            start = start.replace(day=1)
+        elif self == Periods.YEARLY:
+            start = start.replace(month=1, day=1)
+        return int(start.timestamp())
+
+
+class MemorySections(Enum):
+    PERIODIC_SUMMARIES = "periodic_summaries"
+    MIND_MAP = "mind_map"
+    MESSAGES = "messages"
+
 
 class PeriodicSummaryDict(TypedDict):
     period: str
@@ -53,6 +119,10 @@ class ModelMessageDict(TypedDict):
     content: str
 
 
+class StoredModelMessageDict(ModelMessageDict):
+    timestamp_ns: int
+
+
 @dataclass
 class ModelMessage:
     role: Roles
@@ -72,10 +142,491 @@ class ModelMessage:
         }
 
 
+class AddMessageRecordDict(TypedDict):
+    op: Literal["add_message"]
+    seq: int
+    timestamp_ns: int
+    message: ModelMessageDict
+
+
+class SetPeriodicSummaryRecordDict(TypedDict):
+    op: Literal["set_periodic_summary"]
+    summary: PeriodicSummaryDict
+
+
+class SetMindMapRecordDict(TypedDict):
+    op: Literal["set_mind_map"]
+    mind_map: str | None
+
+
+class DropMessagesRecordDict(TypedDict):
+    op: Literal["drop_messages"]
+    before_seq: int
+
+
+class DeletePeriodicSummaryRecordDict(TypedDict):
+    op: Literal["delete_periodic_summary"]
+    period: str
+    start_time: int
+
+
+MemoryRecordDict = Union[
+    AddMessageRecordDict,
+    SetPeriodicSummaryRecordDict,
+    SetMindMapRecordDict,
+    DropMessagesRecordDict,
+    DeletePeriodicSummaryRecordDict,
+]
+
+ROLES: tuple[Roles, ...] = tuple(Roles)
+ROLE_CODES: dict[Roles, int] = {role: code for code, role in enumerate(ROLES)}
+
+T = TypeVar("T")
+
+
+class ColumnView(Generic[T]):
+    """The first length items of a column that only grows at its end"""
+
+    __slots__ = ("column", "length")
+
+    def __init__(self, column: MutableSequence[T], length: int) -> None:
+        self.column: MutableSequence[T] = column
+        self.length: int = length
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, index: int) -> T:
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("column view index out of range")
+        return self.column[index]
+
+    def __setitem__(self, index: int, value: T) -> None:
+        # only used to cache token counts, which never change
+        self.column[index] = value
+
+    def copy(self) -> MutableSequence[T]:
+        """Returns the items as a column of the type of the viewed one"""
+        return self.column[: self.length]
+
+
+class MessageLog:
+    """
+    Append only message log stored as columns.
+    Sequence ids increase monotonically and timestamps never go backwards,
+    so both columns stay sorted and can be searched with bisect.
+    A lazily loaded log only holds the recent tail until a read needs
+    older messages, then loader() returns the older part of the log.
+    Token counts are cached per message, 0 means not counted yet.
+    Columns are only appended to or replaced as a whole, never changed
+    in place, so a view() stays valid while the log goes on.
+    """
+
+    def __init__(self) -> None:
+        self.seqs: array[int] = array("q")
+        self.timestamps_ns: array[int] = array("q")
+        self.roles: array[int] = array("B")
+        self.contents: list[str] = []
+        self.token_counts: array[int] = array("I")
+        self.next_seq: int = 0
+        self.loader: Optional[Callable[[], "MessageLog"]] = None
+        # older messages before this seq are dropped once loaded
+        self.drop_pending: int = 0
+        # held while the columns are replaced, and by appends while the
+        # older messages may still be merged in
+        self.materialize_lock: threading.Lock = threading.Lock()
+
+    def __len__(self) -> int:
+        self.materialize()
+        return len(self.seqs)
+
+    def materialize(self) -> None:
+        """Loads the older messages of a lazily loaded log."""
+        if self.loader is not None:
+            with self.materialize_lock:
+                self._merge_loaded()
+
+    def _merge_loaded(self) -> None:
+        loader = self.loader
+        if loader is None:
+            # loaded by another thread meanwhile
+            return
+        message_log = loader()
+        if self.drop_pending:
+            message_log.drop_before(self.drop_pending)
+        # the tail and messages added since loading, known seqs are skipped
+        for position in range(len(self.seqs)):
+            message_log.append(
+                ROLES[self.roles[position]],
+                self.contents[position],
+                timestamp_ns=self.timestamps_ns[position],
+                seq=self.seqs[position],
+                token_count=self.token_counts[position],
+            )
+        self.seqs = message_log.seqs
+        self.timestamps_ns = message_log.timestamps_ns
+        self.roles = message_log.roles
+        self.contents = message_log.contents
+        self.token_counts = message_log.token_counts
+        self.next_seq = max(self.next_seq, message_log.next_seq)
+        self.loader = None
+
+    def append(
+        self,
+        role: Roles,
+        content: str,
+        timestamp_ns: int | None = None,
+        seq: int | None = None,
+        token_count: int = 0,
+    ) -> int:
+        """
+        Appends a message and returns its sequence id.
+        Passing a seq that is already in the log is a no-op, so replaying
+        a write ahead log on top of a newer snapshot is safe.
+        Without a token_count the tokens are counted on first use.
+        """
+        if self.loader is not None:
+            # a reader may merge the older messages in meanwhile
+            with self.materialize_lock:
+                return self._append(
+                    role, content, timestamp_ns, seq, token_count
+                )
+        return self._append(role, content, timestamp_ns, seq, token_count)
+
+    def _append(
+        self,
+        role: Roles,
+        content: str,
+        timestamp_ns: int | None,
+        seq: int | None,
+        token_count: int,
+    ) -> int:
+        if seq is None:
+            seq = self.next_seq
+        elif seq < self.next_seq:
+            return seq
+        if timestamp_ns is None:
+            timestamp_ns = time.time_ns()
+        if self.timestamps_ns and timestamp_ns < self.timestamps_ns[-1]:
+            # the wall clock went backwards, keep the column sorted
+            timestamp_ns = self.timestamps_ns[-1]
+        self.seqs.append(seq)
+        self.timestamps_ns.append(timestamp_ns)
+        self.roles.append(ROLE_CODES[role])
+        self.contents.append(content)
+        self.token_counts.append(token_count)
+        self.next_seq = seq + 1
+        return seq
+
+    def _message(self, position: int) -> ModelMessage:
+        return ModelMessage(
+            ROLES[self.roles[position]], self.contents[position]
+        )
+
+    def token_count(self, position: int) -> int:
+        token_count = self.token_counts[position]
+        if not token_count:
+            token_count = count_message_tokens(self.contents[position])
+            self.token_counts[position] = token_count
+        return token_count
+
+    def newest_first(self) -> Iterator[tuple[int, ModelMessage, int]]:
+        """
+        Yields (seq, message, token count) from the newest message
+        backwards, older messages are only loaded once reached
+        """
+        position = len(self.seqs)
+        while True:
+            if not position:
+                if self.loader is None:
+                    return
+                oldest_seq = self.seqs[0] if self.seqs else self.next_seq
+                self.materialize()
+                position = bisect_left(self.seqs, oldest_seq)
+                if not position:
+                    return
+            position -= 1
+            yield (
+                self.seqs[position],
+                self._message(position),
+                self.token_count(position),
+            )
+
+    def get(self, seq: int) -> ModelMessage | None:
+        if not self.seqs or seq < self.seqs[0]:
+            self.materialize()
+        position = bisect_left(self.seqs, seq)
+        if position < len(self.seqs) and self.seqs[position] == seq:
+            return self._message(position)
+        return None
+
+    def last_n(self, n: int) -> list[ModelMessage]:
+        """Returns the newest n messages from oldest to newest"""
+        if n <= 0:
+            return []
+        if n > len(self.seqs):
+            self.materialize()
+        return [
+            self._message(position)
+            for position in range(max(len(self.seqs) - n, 0), len(self.seqs))
+        ]
+
+    def between(self, start_ns: int, to_ns: int) -> list[ModelMessage]:
+        """Returns the messages with start_ns <= timestamp <= to_ns"""
+        if not self.timestamps_ns or start_ns < self.timestamps_ns[0]:
+            self.materialize()
+        return [
+            self._message(position)
+            for position in range(
+                bisect_left(self.timestamps_ns, start_ns),
+                bisect_right(self.timestamps_ns, to_ns),
+            )
+        ]
+
+    def next_timestamp(self, start_ns: int) -> int | None:
+        """Returns the first timestamp at or after start_ns"""
+        if not self.timestamps_ns or start_ns < self.timestamps_ns[0]:
+            self.materialize()
+        position = bisect_left(self.timestamps_ns, start_ns)
+        if position == len(self.timestamps_ns):
+            return None
+        return self.timestamps_ns[position]
+
+    def entries(self) -> Iterator[tuple[int, int, ModelMessage]]:
+        """Yields (seq, timestamp_ns, message) from oldest to newest"""
+        self.materialize()
+        for position in range(len(self.seqs)):
+            yield (
+                self.seqs[position],
+                self.timestamps_ns[position],
+                self._message(position),
+            )
+
+    def entries_from(
+        self, seq: int, limit: int | None = None
+    ) -> list[tuple[int, ModelMessage]]:
+        """
+        Returns up to limit (seq, message) from seq on
+        without loading older messages
+        """
+        if not self.seqs or seq < self.seqs[0]:
+            self.materialize()
+        start = bisect_left(self.seqs, seq)
+        end = len(self.seqs)
+        if limit is not None:
+            end = min(start + limit, end)
+        return [
+            (self.seqs[position], self._message(position))
+            for position in range(start, end)
+        ]
+
+    def entries_before(
+        self, timestamp_ns: int
+    ) -> list[tuple[int, int, ModelMessage]]:
+        """Returns (seq, timestamp_ns, message) older than timestamp_ns"""
+        self.materialize()
+        return [
+            (
+                self.seqs[position],
+                self.timestamps_ns[position],
+                self._message(position),
+            )
+            for position in range(bisect_left(self.timestamps_ns, timestamp_ns))
+        ]
+
+    def oldest(self, n: int) -> list[tuple[int, int, ModelMessage]]:
+        """Returns (seq, timestamp_ns, message) of the oldest n messages"""
+        self.materialize()
+        return [
+            (
+                self.seqs[position],
+                self.timestamps_ns[position],
+                self._message(position),
+            )
+            for position in range(min(n, len(self.seqs)))
+        ]
+
+    def content_bytes(self) -> int:
+        """Returns the utf-8 size of all message contents"""
+        self.materialize()
+        return sum(len(content.encode("utf-8")) for content in self.contents)
+
+    def first_seq(self) -> int:
+        """Returns the oldest seq in the log, or the next seq when empty"""
+        self.materialize()
+        return self.seqs[0] if self.seqs else self.next_seq
+
+    def drop_before(self, seq: int) -> int:
+        """
+        Removes the messages older than seq and returns how many were removed.
+        The columns are replaced by new arrays instead of shifted in place,
+        so readers holding the old ones keep a consistent view.
+        """
+        self.materialize()
+        count = bisect_left(self.seqs, seq)
+        if not count:
+            return 0
+        with self.materialize_lock:
+            self.seqs = self.seqs[count:]
+            self.timestamps_ns = self.timestamps_ns[count:]
+            self.roles = self.roles[count:]
+            self.contents = self.contents[count:]
+            self.token_counts = self.token_counts[count:]
+        return count
+
+    def defer_drop_before(self, seq: int) -> None:
+        """
+        Like drop_before(), but a lazily loaded log only drops from its
+        tail now and from the older messages once they are loaded
+        """
+        if self.loader is None:
+            self.drop_before(seq)
+            return
+        with self.materialize_lock:
+            self.drop_pending = max(self.drop_pending, seq)
+            count = bisect_left(self.seqs, seq)
+            if count:
+                self.seqs = self.seqs[count:]
+                self.timestamps_ns = self.timestamps_ns[count:]
+                self.roles = self.roles[count:]
+                self.contents = self.contents[count:]
+                self.token_counts = self.token_counts[count:]
+
+    def view(self) -> "MessageLogView":
+        """Returns a read only view of the messages in the log now"""
+        with self.materialize_lock:
+            return MessageLogView(self)
+
+    def copy(self) -> "MessageLog":
+        """Returns a log with its own columns holding all messages"""
+        self.materialize()
+        return self.view().copy()
+
+    def to_dict(self) -> dict[int, StoredModelMessageDict]:
+        self.materialize()
+        return self.tail_to_dict(len(self.seqs))
+
+    def tail_to_dict(self, n: int) -> dict[int, StoredModelMessageDict]:
+        """Serializes up to n of the newest messages without loading older ones"""
+        return {
+            self.seqs[position]: {
+                "role": ROLES[self.roles[position]].value,
+                "content": self.contents[position],
+                "timestamp_ns": self.timestamps_ns[position],
+            }
+            for position in range(max(len(self.seqs) - n, 0), len(self.seqs))
+        }
+
+    @staticmethod
+    def from_dict(
+        data: dict[int, StoredModelMessageDict], format_version: int
+    ) -> "MessageLog":
+        message_log = MessageLog()
+        if format_version < 2:
+            # keys were timestamps in seconds, sequence ids follow their order
+            for timestamp in sorted(data, key=int):
+                message = data[timestamp]
+                message_log.append(
+                    Roles(message["role"]),
+                    message["content"],
+                    timestamp_ns=int(timestamp) * 1_000_000_000,
+                )
+            return message_log
+        for seq in sorted(data, key=int):
+            message = data[seq]
+            message_log.append(
+                Roles(message["role"]),
+                message["content"],
+                timestamp_ns=message["timestamp_ns"],
+                seq=int(seq),
+            )
+        return message_log
+
+
+class MessageLogView(MessageLog):
+    """
+    Read only view of the messages a MessageLog held when the view was
+    taken, for readers on other threads. It shares the columns of the
+    log and only reads their first positions, which never change.
+    Older messages of a lazily loaded log are loaded into the log itself
+    when the view needs them, the view then moves to the merged columns.
+    """
+
+    def __init__(self, message_log: MessageLog) -> None:
+        # called with the materialize_lock of message_log held
+        self.message_log: MessageLog = message_log
+        self.next_seq = message_log.next_seq
+        self.loader = message_log.loader
+        self.materialize_lock = threading.Lock()
+        self._bind(len(message_log.seqs))
+
+    def _bind(self, length: int) -> None:
+        message_log = self.message_log
+        self.seqs = cast("array[int]", ColumnView(message_log.seqs, length))
+        self.timestamps_ns = cast(
+            "array[int]", ColumnView(message_log.timestamps_ns, length)
+        )
+        self.roles = cast("array[int]", ColumnView(message_log.roles, length))
+        self.contents = cast(
+            "list[str]", ColumnView(message_log.contents, length)
+        )
+        self.token_counts = cast(
+            "array[int]", ColumnView(message_log.token_counts, length)
+        )
+
+    def _merge_loaded(self) -> None:
+        if self.loader is None:
+            return
+        self.message_log.materialize()
+        with self.message_log.materialize_lock:
+            # the merged columns may hold messages added after the view
+            self._bind(bisect_left(self.message_log.seqs, self.next_seq))
+        self.loader = None
+
+    def append(
+        self,
+        role: Roles,
+        content: str,
+        timestamp_ns: int | None = None,
+        seq: int | None = None,
+        token_count: int = 0,
+    ) -> int:
+        raise TypeError("Message log views are read only")
+
+    def drop_before(self, seq: int) -> int:
+        raise TypeError("Message log views are read only")
+
+    def defer_drop_before(self, seq: int) -> None:
+        raise TypeError("Message log views are read only")
+
+    def view(self) -> "MessageLogView":
+        return self
+
+    def copy(self) -> MessageLog:
+        self.materialize()
+        message_log = MessageLog()
+        message_log.seqs = self._column_copy(self.seqs)
+        message_log.timestamps_ns = self._column_copy(self.timestamps_ns)
+        message_log.roles = self._column_copy(self.roles)
+        message_log.contents = cast(
+            "list[str]", cast(ColumnView[str], self.contents).copy()
+        )
+        message_log.token_counts = self._column_copy(self.token_counts)
+        message_log.next_seq = self.next_seq
+        return message_log
+
+    @staticmethod
+    def _column_copy(column: "array[int]") -> "array[int]":
+        return cast("array[int]", cast(ColumnView[int], column).copy())
+
+
 class BotMemoryDict(TypedDict):
+    format_version: int
     periodic_summaries: dict[str, dict[int, PeriodicSummaryDict]]
     mind_map: str | None
-    messages: dict[int, ModelMessageDict]
+    messages: dict[int, StoredModelMessageDict]
 
 
 @dataclass
@@ -84,22 +635,186 @@ class BotMemory:
         default_factory=dict
     )
     mind_map: Optional[str] = None
-    messages: dict[int, ModelMessage] = field(default_factory=dict)
+    messages: MessageLog = field(default_factory=MessageLog)
+    # mutations since the last drain, used by the log-structured storage mode
+    journal: list[MemoryRecordDict] = field(
+        default_factory=list, repr=False, compare=False
+    )
+    # approximate size of the journaled changes
+    journal_bytes: int = field(default=0, repr=False, compare=False)
+    # sections changed since the memory was last stored
+    dirty_sections: set[MemorySections] = field(
+        default_factory=set, repr=False, compare=False
+    )
+    # set by engines that keep messages and summaries out of RAM
+    backend: Optional[MemoryBackend] = field(
+        default=None, repr=False, compare=False
+    )
+    # set on lazily loaded memories, returns the stored summaries
+    summaries_loader: Optional[
+        Callable[[], dict[str, dict[int, PeriodicSummary]]]
+    ] = field(default=None, repr=False, compare=False)
+    # sorted start dates of the summaries per period, built on first query
+    summary_starts: dict[str, list[int]] = field(
+        default_factory=dict, repr=False, compare=False
+    )
+    # full text index kept up to date with every mutation when set
+    search_index: Optional["MemorySearchIndex"] = field(
+        default=None, repr=False, compare=False
+    )
+    # the latest published read only copy, see publish()
+    snapshot: Optional["BotMemory"] = field(
+        default=None, repr=False, compare=False
+    )
+    version: int = field(default=0, repr=False, compare=False)
+    summaries_lock: threading.Lock = field(
+        default_factory=threading.Lock, repr=False, compare=False
+    )
+    # summaries deleted while the stored ones are not loaded yet
+    deleted_summaries: set[tuple[str, int]] = field(
+        default_factory=set, repr=False, compare=False
+    )
+    # the flusher thread drains the journal while the loop appends to it
+    journal_lock: threading.Lock = field(
+        default_factory=threading.Lock, repr=False, compare=False
+    )
 
-    def get_last_n_messages(self, n: int) -> list[ModelMessageDict]:
-        # Step 1: Sort the timestamps in descending order
-        sorted_timestamps_desc = sorted(self.messages.keys(), reverse=True)
-        length: int = len(sorted_timestamps_desc)
-        _n: int = length if length < n else n
-        newest_timestamps = sorted_timestamps_desc[:_n]
+    def _load_summaries(self) -> None:
+        if self.summaries_loader is not None:
+            # readers of snapshots may load them at the same time
+            with self.summaries_lock:
+                self._merge_loaded_summaries()
+
+    def _merge_loaded_summaries(self) -> None:
+        loader = self.summaries_loader
+        if loader is None:
+            # loaded by another thread meanwhile
+            return
+        periodic_summaries = dict(self.periodic_summaries)
+        for period, summaries in loader().items():
+            # summaries set since loading are newer than the stored ones
+            periodic_summaries[period] = {
+                **{
+                    start: summary
+                    for start, summary in summaries.items()
+                    if (period, start) not in self.deleted_summaries
+                },
+                **periodic_summaries.get(period, {}),
+            }
+        self.periodic_summaries = periodic_summaries
+        self.summary_starts = {}
+        self.deleted_summaries = set()
+        self.summaries_loader = None
+
+    def _loaded_summaries(self) -> dict[str, dict[int, PeriodicSummary]]:
+        """Loads the stored summaries for a snapshot taken before"""
+        self._load_summaries()
+        return self.periodic_summaries
+
+    def publish(self) -> "BotMemory":
+        """
+        Publishes the memory as it is now for readers on other threads.
+        The snapshot is a read only BotMemory sharing the message columns
+        and the summaries, which are copied on write instead of changed,
+        so taking it copies nothing and readers need no locks.
+        With a backend messages and summaries are read from the database.
+        Mutations publish before they mark the memory dirty, so a write
+        that drains the dirty marks and then takes the snapshot stores
+        every change it drained.
+        """
+        self.version += 1
+        self.snapshot = snapshot = BotMemory(
+            periodic_summaries=self.periodic_summaries,
+            mind_map=self.mind_map,
+            messages=self.messages.view(),
+            backend=self.backend,
+            summaries_loader=(
+                self._loaded_summaries if self.summaries_loader else None
+            ),
+            summary_starts=dict(self.summary_starts),
+            version=self.version,
+        )
+        return snapshot
 
+    def get_snapshot(self) -> "BotMemory":
+        """Returns the latest published version of the memory"""
+        snapshot = self.snapshot
+        if snapshot is None:
+            snapshot = self.publish()
+        return snapshot
+
+    def get_last_n_messages(self, n: int) -> list[ModelMessageDict]:
+        if self.backend:
+            messages = self.backend.get_last_n_messages(n)
+        else:
+            messages = self.messages.last_n(n)
         # from oldest to newest
-        newest_timestamps_sorted = sorted(newest_timestamps)
-        newest_messages_ordered = [
-            self.messages[timestamp].to_dict()
-            for timestamp in newest_timestamps_sorted
-        ]
-        return newest_messages_ordered
+        return [message.to_dict() for message in messages]
+
+    def get_messages_in_range(
+        self, start_ns: int, to_ns: int
+    ) -> list[ModelMessageDict]:
+        """Returns the messages with start_ns <= timestamp <= to_ns"""
+        if self.backend:
+            messages = self.backend.get_messages_in_range(start_ns, to_ns)
+        else:
+            messages = self.messages.between(start_ns, to_ns)
+        return [message.to_dict() for message in messages]
+
+    def get_message(self, seq: int) -> ModelMessage | None:
+        if self.backend:
+            return self.backend.get_message(seq)
+        return self.messages.get(seq)
+
+    def get_messages_from(
+        self, seq: int, limit: int | None = None
+    ) -> list[tuple[int, ModelMessage]]:
+        """
+        Returns (seq, message) of up to limit messages from seq on,
+        oldest first
+        """
+        if self.backend:
+            return self.backend.get_messages_from(seq, limit)
+        return self.messages.entries_from(seq, limit)
+
+    def count_messages(self) -> int:
+        if self.backend:
+            return self.backend.count_messages()
+        return len(self.messages)
+
+    def get_messages_bytes(self) -> int:
+        """Returns the utf-8 size of all message contents"""
+        if self.backend:
+            return self.backend.get_messages_bytes()
+        return self.messages.content_bytes()
+
+    def get_oldest_messages(self, n: int) -> list[tuple[int, int, ModelMessage]]:
+        """Returns (seq, timestamp_ns, message) of the oldest n messages"""
+        if self.backend:
+            return self.backend.get_oldest_messages(n)
+        return self.messages.oldest(n)
+
+    def get_newest_messages(self) -> Iterator[tuple[int, ModelMessage, int]]:
+        """Yields (seq, message, token count) from the newest message on"""
+        if self.backend:
+            return self.backend.get_newest_messages()
+        return self.messages.newest_first()
+
+    def get_next_message_time(self, start_ns: int) -> int | None:
+        """Returns the timestamp of the first message at or after start_ns"""
+        if self.backend:
+            return self.backend.get_next_message_time(start_ns)
+        return self.messages.next_timestamp(start_ns)
+
+    def get_summarized_until(self) -> int:
+        """
+        Returns the end of the latest daily summary, the messages
+        before it are summarized
+        """
+        latest = self.get_latest_periodic_summary(
+            Periods.DAILY, int(time.time())
+        )
+        return Periods.DAILY.end_of(latest.period_start_date) if latest else 0
 
     @staticmethod
     def logger() -> logging.Logger:
@@ -111,58 +826,352 @@ class BotMemory:
     def set_periodic_summary(
         self, interval: Periods, start_time: int, summary: str
     ) -> None:
-        interval_summary = self.periodic_summaries.get(interval.value)
-        if not interval_summary:
-            self.periodic_summaries[interval.value] = {}
-        self.periodic_summaries[interval.value][start_time] = PeriodicSummary(
+        self._load_summaries()
+        periodic_summary = PeriodicSummary(
             period=interval,
             period_start_date=start_time,
             summary_text=summary,
         )
+        if self.backend:
+            self.backend.set_periodic_summary(periodic_summary)
+        else:
+            self._index_summary(periodic_summary)
+        if self.search_index:
+            self.search_index.set_summary(interval.value, start_time, summary)
+        self.publish()
+        self._journal(
+            MemorySections.PERIODIC_SUMMARIES,
+            {
+                "op": "set_periodic_summary",
+                "summary": periodic_summary.to_dict(),
+            },
+            len(summary),
+        )
 
     def get_periodic_summary(
         self, interval: Periods, start_time: int
     ) -> PeriodicSummary | None:
+        if self.backend:
+            return self.backend.get_periodic_summary(interval, start_time)
+        self._load_summaries()
         return self.periodic_summaries.get(interval.value, {}).get(start_time)
 
-    def add_message(self, role: Roles, content: str) -> None:
-        self.messages[int(time.time())] = ModelMessage(role, content)
+    def get_periodic_summaries(self, interval: Periods) -> list[PeriodicSummary]:
+        if self.backend:
+            return self.backend.get_periodic_summaries(interval)
+        starts = self._summary_starts(interval)
+        summaries = self.periodic_summaries.get(interval.value, {})
+        return [summaries[date] for date in starts]
 
-    @staticmethod
-    def from_dict(data: BotMemoryDict) -> "BotMemory":
-        periodic_summaries: dict[str, dict[int, PeriodicSummary]] = {}
-        raw_summaries: dict[str, dict[int, PeriodicSummaryDict]] = data.get(
-            "periodic_summaries", {}
+    def get_latest_periodic_summary(
+        self, interval: Periods, time: int
+    ) -> PeriodicSummary | None:
+        """Returns the summary with the latest start at or before time"""
+        if self.backend:
+            return self.backend.get_latest_periodic_summary(interval, time)
+        starts = self._summary_starts(interval)
+        position = bisect_right(starts, time)
+        if not position:
+            return None
+        return self.periodic_summaries.get(interval.value, {})[
+            starts[position - 1]
+        ]
+
+    def get_periodic_summaries_between(
+        self, interval: Periods, start_time: int, to_time: int
+    ) -> list[PeriodicSummary]:
+        """
+        Returns the summaries whose period overlaps [start_time, to_time],
+        ordered by start date
+        """
+        summaries: list[PeriodicSummary] = []
+        # a period that started before start_time may still be running
+        latest = self.get_latest_periodic_summary(interval, start_time)
+        if latest and interval.end_of(latest.period_start_date) > start_time:
+            summaries.append(latest)
+        if self.backend:
+            summaries += [
+                summary
+                for summary in self.backend.get_periodic_summaries_starting(
+                    interval, start_time, to_time
+                )
+                if not latest
+                or summary.period_start_date != latest.period_start_date
+            ]
+            return summaries
+        starts = self._summary_starts(interval)
+        period_summaries = self.periodic_summaries.get(interval.value, {})
+        summaries += [
+            period_summaries[start]
+            for start in starts[
+                bisect_right(starts, start_time) : bisect_right(starts, to_time)
+            ]
+        ]
+        return summaries
+
+    def _summary_starts(self, interval: Periods) -> list[int]:
+        self._load_summaries()
+        starts = self.summary_starts.get(interval.value)
+        if starts is None:
+            starts = self.summary_starts[interval.value] = sorted(
+                self.periodic_summaries.get(interval.value, {})
+            )
+        return starts
+
+    def _index_summary(self, summary: PeriodicSummary) -> None:
+        # snapshots share the dicts and lists, so they are copied on write
+        period = summary.period.value
+        summaries = self.periodic_summaries.get(period, {})
+        starts = self.summary_starts.get(period)
+        if starts is not None and summary.period_start_date not in summaries:
+            starts = list(starts)
+            insort(starts, summary.period_start_date)
+            self.summary_starts[period] = starts
+        self.periodic_summaries = {
+            **self.periodic_summaries,
+            period: {**summaries, summary.period_start_date: summary},
+        }
+
+    def add_message(self, role: Roles, content: str) -> int:
+        message = ModelMessage(role, content)
+        timestamp_ns = time.time_ns()
+        token_count = count_message_tokens(content)
+        if self.backend:
+            seq = self.backend.add_message(timestamp_ns, message, token_count)
+        else:
+            seq = self.messages.append(
+                role,
+                content,
+                timestamp_ns=timestamp_ns,
+                token_count=token_count,
+            )
+        if self.search_index:
+            self.search_index.add_message(seq, content)
+        self.publish()
+        self._journal(
+            MemorySections.MESSAGES,
+            {
+                "op": "add_message",
+                "seq": seq,
+                "timestamp_ns": timestamp_ns,
+                "message": message.to_dict(),
+            },
+            len(content),
         )
-        for period, summaries in raw_summaries.items():
-            periodic_summaries[period] = {
-                date: PeriodicSummary.from_dict(summary)
+        return seq
+
+    def set_mind_map(self, mind_map: str | None) -> None:
+        self.mind_map = mind_map
+        if self.backend:
+            self.backend.set_mind_map(mind_map)
+        if self.search_index:
+            self.search_index.set_mind_map(mind_map)
+        self.publish()
+        self._journal(
+            MemorySections.MIND_MAP,
+            {"op": "set_mind_map", "mind_map": mind_map},
+            len(mind_map or ""),
+        )
+
+    def drop_messages_before(self, seq: int) -> int:
+        """
+        Removes messages older than seq from the memory once they are
+        archived or expired, returns how many were removed
+        """
+        if self.backend:
+            dropped = self.backend.drop_messages_before(seq)
+        else:
+            dropped = self.messages.drop_before(seq)
+        if self.search_index:
+            self.search_index.drop_messages_before(seq)
+        if dropped:
+            self.publish()
+            self._journal(
+                MemorySections.MESSAGES,
+                {"op": "drop_messages", "before_seq": seq},
+            )
+        return dropped
+
+    def delete_periodic_summary(self, interval: Periods, start_time: int) -> bool:
+        """Removes a summary, returns False if there was none"""
+        if self.backend:
+            deleted = self.backend.delete_periodic_summary(interval, start_time)
+        else:
+            deleted = self._unindex_summary(interval, start_time)
+        if not deleted:
+            return False
+        if self.search_index:
+            self.search_index.delete_summary(interval.value, start_time)
+        self.publish()
+        self._journal(
+            MemorySections.PERIODIC_SUMMARIES,
+            {
+                "op": "delete_periodic_summary",
+                "period": interval.value,
+                "start_time": start_time,
+            },
+        )
+        return True
+
+    def _unindex_summary(self, interval: Periods, start_time: int) -> bool:
+        self._load_summaries()
+        return self._unindex_loaded_summary(interval, start_time)
+
+    def _unindex_loaded_summary(
+        self, interval: Periods, start_time: int
+    ) -> bool:
+        summaries = self.periodic_summaries.get(interval.value, {})
+        if start_time not in summaries:
+            return False
+        starts = self.summary_starts.get(interval.value)
+        if starts is not None:
+            position = bisect_left(starts, start_time)
+            self.summary_starts[interval.value] = (
+                starts[:position] + starts[position + 1 :]
+            )
+        self.periodic_summaries = {
+            **self.periodic_summaries,
+            interval.value: {
+                start: summary
+                for start, summary in summaries.items()
+                if start != start_time
+            },
+        }
+        return True
+
+    def _journal(
+        self, section: MemorySections, record: MemoryRecordDict, size: int = 0
+    ) -> None:
+        with self.journal_lock:
+            self.journal_bytes += size
+            self.dirty_sections.add(section)
+            self.journal.append(record)
+
+    def drain_journal(self) -> tuple[list[MemoryRecordDict], int]:
+        """Returns the journaled records and their size since the last drain"""
+        with self.journal_lock:
+            journal = self.journal
+            journal_bytes = self.journal_bytes
+            self.journal = []
+            self.journal_bytes = 0
+        return journal, journal_bytes
+
+    def drain_dirty_sections(self) -> set[MemorySections]:
+        with self.journal_lock:
+            dirty_sections = self.dirty_sections
+            self.dirty_sections = set()
+        return dirty_sections
+
+    def apply_record(self, record: MemoryRecordDict) -> None:
+        """
+        Replays a journaled mutation, records are idempotent
+        so applying one twice leaves the same state.
+        A lazily loaded memory stays unloaded, summaries and drops are
+        merged with the older data once it is loaded.
+        """
+        # replayed while loading, published again on the next read
+        self.snapshot = None
+        if record["op"] == "add_message":
+            message = ModelMessage.from_dict(record["message"])
+            self.messages.append(
+                message.role,
+                message.content,
+                timestamp_ns=record["timestamp_ns"],
+                seq=record["seq"],
+            )
+        elif record["op"] == "set_periodic_summary":
+            summary = PeriodicSummary.from_dict(record["summary"])
+            self.deleted_summaries.discard(
+                (summary.period.value, summary.period_start_date)
+            )
+            self._index_summary(summary)
+        elif record["op"] == "set_mind_map":
+            self.mind_map = record["mind_map"]
+        elif record["op"] == "drop_messages":
+            self.messages.defer_drop_before(record["before_seq"])
+        elif record["op"] == "delete_periodic_summary":
+            if self.summaries_loader is not None:
+                self.deleted_summaries.add(
+                    (record["period"], record["start_time"])
+                )
+                self._unindex_loaded_summary(
+                    Periods(record["period"]), record["start_time"]
+                )
+            else:
+                self._unindex_summary(
+                    Periods(record["period"]), record["start_time"]
+                )
+        else:
+            raise ValueError(f"Unknown memory record: {record}")
+
+    @staticmethod
+    def periodic_summaries_from_dict(
+        data: dict[str, dict[int, PeriodicSummaryDict]]
+    ) -> dict[str, dict[int, PeriodicSummary]]:
+        return {
+            period: {
+                int(date): PeriodicSummary.from_dict(summary)
                 for date, summary in summaries.items()
             }
+            for period, summaries in data.items()
+        }
 
-        messages: dict[int, ModelMessage] = {}
-        raw_messages: dict[int, ModelMessageDict] = data.get("messages", {})
-        for timestamp, message in raw_messages.items():
-            messages[int(timestamp)] = ModelMessage.from_dict(message)
+    @staticmethod
+    def from_dict(data: BotMemoryDict) -> "BotMemory":
+        format_version = data.get("format_version", 1)
         return BotMemory(
-            periodic_summaries=periodic_summaries,
-            messages=messages,
+            periodic_summaries=BotMemory.periodic_summaries_from_dict(
+                data.get("periodic_summaries", {})
+            ),
+            messages=MessageLog.from_dict(
+                data.get("messages", {}), format_version
+            ),
             mind_map=data.get("mind_map", None),
+            # write older formats back in the current one
+            dirty_sections=(
+                set(MemorySections)
+                if format_version < BOT_MEMORY_FORMAT_VERSION
+                else set()
+            ),
         )
 
-    def to_dict(self) -> BotMemoryDict:
-        serialized_summaries = {
+    def periodic_summaries_to_dict(
+        self,
+    ) -> dict[str, dict[int, PeriodicSummaryDict]]:
+        if self.backend:
+            periodic_summaries = {
+                period.value: {
+                    summary.period_start_date: summary
+                    for summary in self.backend.get_periodic_summaries(period)
+                }
+                for period in Periods
+            }
+        else:
+            self._load_summaries()
+            periodic_summaries = self.periodic_summaries
+        return {
             period: {
                 date: summary.to_dict() for date, summary in summaries.items()
             }
-            for period, summaries in self.periodic_summaries.items()
-        }
-        serialized_messages = {
-            int(timestamp): message.to_dict()
-            for timestamp, message in self.messages.items()
+            for period, summaries in periodic_summaries.items()
         }
+
+    def messages_to_dict(self) -> dict[int, StoredModelMessageDict]:
+        if self.backend:
+            return {
+                seq: {
+                    "role": message.role.value,
+                    "content": message.content,
+                    "timestamp_ns": timestamp_ns,
+                }
+                for seq, timestamp_ns, message in self.backend.get_messages()
+            }
+        return self.messages.to_dict()
+
+    def to_dict(self) -> BotMemoryDict:
         return {
-            "periodic_summaries": serialized_summaries,
+            "format_version": BOT_MEMORY_FORMAT_VERSION,
+            "periodic_summaries": self.periodic_summaries_to_dict(),
             "mind_map": self.mind_map,
-            "messages": serialized_messages,
+            "messages": self.messages_to_dict(),
         }
@@ -1,7 +1,15 @@
 import logging
 import uuid
-from dataclasses import dataclass
-from typing import Optional, TypedDict
+from dataclasses import dataclass, field, fields
+from enum import Enum
+from typing import (
+    Optional,
+    TypedDict,
+    Union,
+    get_args,
+    get_origin,
+    get_type_hints,
+)
 
 from app.lib.logger import setup_logger
 
@@ -12,6 +20,7 @@ class ConfigDict(TypedDict):
     bot: "BotConfigDict"
     web_interface: "WebInterfaceConfigDict"
     message_interface: "MessageInterfaceConfigDict"
+    storage: "StorageConfigDict"
 
 
 class WebInterfaceConfigDict(TypedDict):
@@ -22,10 +31,23 @@ class WebInterfaceConfigDict(TypedDict):
 class BotConfigDict(TypedDict):
     bot_name: Optional[str]
     bot_timeout: int
+    summarize_while_dreaming: bool
+    relevant_memories: int
+    context_token_budgets: dict[str, int]
+    mind_map_max_chars: int
     profile_file_name: str
     model_name: str
     model_api_key: Optional[str]
     model_api_url: str
+    model_connect_timeout_seconds: float
+    model_request_timeout_seconds: float
+    model_stream: bool
+    message_batch_window_seconds: float
+    message_batch_max_size: int
+    response_cache: bool
+    response_cache_size: int
+    response_cache_ttl_seconds: float
+    response_cache_on_disk: bool
 
 
 class MessageInterfaceConfigDict(TypedDict):
@@ -34,21 +56,170 @@ class MessageInterfaceConfigDict(TypedDict):
     matrix_server: str
 
 
+class StorageModes(Enum):
+    # rewrite the whole memory file on every store
+    JSON = "json"
+    # append mutations to a write ahead log and compact it periodically
+    WAL = "wal"
+    # keep messages and summaries in an indexed sqlite database
+    SQLITE = "sqlite"
+
+
+class SnapshotFormats(Enum):
+    # bot_memory.json, readable and diffable
+    JSON = "json"
+    # bot_memory.bin, smaller and faster to load and store
+    BINARY = "binary"
+
+
+class RetentionActions(Enum):
+    # evicted messages move to the archive
+    ARCHIVE = "archive"
+    # evicted messages are deleted
+    DELETE = "delete"
+
+
+class Durability(Enum):
+    # never fsync, a crash can lose the latest writes
+    NONE = "none"
+    # fsync once per flush of the storage
+    BATCH = "batch"
+    # fsync every write
+    ALWAYS = "always"
+
+
+class StorageConfigDict(TypedDict):
+    storage_mode: str
+    durability: str
+    wal_compaction_records: int
+    flush_interval_seconds: float
+    flush_max_pending_bytes: int
+    archive_after_days: int
+    retention_max_messages: int
+    retention_max_bytes: int
+    retention_keep_unsummarized: bool
+    retention_action: str
+    archive_retention_days: int
+    summary_retention_days: int
+    lazy_load: bool
+    snapshot_format: str
+    search_index: bool
+    vector_index: bool
+    embedding_dimensions: int
+
+
 @dataclass
 class Config:
     id: str  # Changed from Optional[str] to str
     bot_name: Optional[str]
     bot_profile_name: str  # Changed from Optional[str] to str
     bot_timeout: int
+    summarize_while_dreaming: bool
+    relevant_memories: int
+    context_token_budgets: dict[str, int]
+    mind_map_max_chars: int
     profile_file_name: str
     model_api_key: Optional[str]
     model_api_url: str
     model_name: str
+    model_connect_timeout_seconds: float
+    model_request_timeout_seconds: float
+    model_stream: bool
+    message_batch_window_seconds: float
+    message_batch_max_size: int
+    response_cache: bool
+    response_cache_size: int
+    response_cache_ttl_seconds: float
+    response_cache_on_disk: bool
     web_interface_port: int
     web_interface_api_key: str
     matrix_user_name: Optional[str]
     matrix_user_password: Optional[str]
     matrix_server: str
+    storage_mode: StorageModes
+    durability: Durability
+    wal_compaction_records: int
+    flush_interval_seconds: float
+    flush_max_pending_bytes: int
+    archive_after_days: int
+    retention_max_messages: int
+    retention_max_bytes: int
+    retention_keep_unsummarized: bool
+    retention_action: RetentionActions
+    archive_retention_days: int
+    summary_retention_days: int
+    lazy_load: bool
+    snapshot_format: SnapshotFormats
+    search_index: bool
+    vector_index: bool
+    embedding_dimensions: int
+    # names of the fields changed since the config was last stored
+    dirty_fields: set[str] = field(
+        default_factory=set, init=False, repr=False, compare=False
+    )
+
+    def __setattr__(self, name: str, value: object) -> None:
+        super().__setattr__(name, value)
+        if name != "dirty_fields" and hasattr(self, "dirty_fields"):
+            self.dirty_fields.add(name)
+
+    def update(self, data: dict[str, object]) -> None:
+        """
+        Sets the fields in data, values are checked against the field
+        types first, so an unknown field or a wrong value changes nothing
+        """
+        hints = get_type_hints(Config)
+        names = {config_field.name for config_field in fields(Config)}
+        names.discard("dirty_fields")
+        values: dict[str, object] = {}
+        for name, value in data.items():
+            if name not in names:
+                raise ValueError(f"Unknown config field: {name}")
+            values[name] = Config._coerce(name, hints[name], value)
+        for name, value in values.items():
+            setattr(self, name, value)
+
+    @staticmethod
+    def _coerce(name: str, hint: object, value: object) -> object:
+        """Returns value as the type of the field, enums from their values"""
+        if get_origin(hint) is Union:
+            if value is None and type(None) in get_args(hint):
+                return None
+            hint = next(arg for arg in get_args(hint) if arg is not type(None))
+        valid = False
+        if isinstance(hint, type) and issubclass(hint, Enum):
+            try:
+                return hint(value)
+            except ValueError:
+                pass
+        elif hint is float:
+            valid = isinstance(value, (int, float)) and not isinstance(
+                value, bool
+            )
+            if valid:
+                return float(value)  # type: ignore
+        elif hint is int:
+            valid = isinstance(value, int) and not isinstance(value, bool)
+        elif hint is bool or hint is str:
+            valid = isinstance(value, hint)
+        elif get_origin(hint) is dict:
+            key_type, value_type = get_args(hint)
+            valid = isinstance(value, dict) and all(
+                isinstance(key, key_type)
+                and isinstance(item, value_type)
+                and not isinstance(item, bool)
+                for key, item in value.items()
+            )
+        if not valid:
+            raise ValueError(
+                f"Invalid value for config field {name}: {value!r}"
+            )
+        return value
+
+    def drain_dirty_fields(self) -> set[str]:
+        dirty_fields = self.dirty_fields
+        self.dirty_fields = set()
+        return dirty_fields
 
     @staticmethod
     def logger() -> logging.Logger:
@@ -66,10 +237,33 @@ class Config:
         bot: BotConfigDict = {
             "bot_name": None,
             "bot_timeout": 86400,  # one day
+            # summarize old messages while the bot sleeps
+            "summarize_while_dreaming": True,
+            # similar older memories sent to the model with every request
+            "relevant_memories": 5,
+            # tokens a model request may use per model_name
+            "context_token_budgets": {"default": 4000},
+            # longer mind maps are rejected, 0 allows any length
+            "mind_map_max_chars": 8000,
             "profile_file_name": "default",
             "model_name": "gpt-4o-mini",
             "model_api_key": None,
             "model_api_url": "https://api.openai.com/v1/chat/completions",
+            "model_connect_timeout_seconds": 10.0,
+            # whole request, including reading the completion
+            "model_request_timeout_seconds": 120.0,
+            # stream completions and run their command once it is complete
+            "model_stream": True,
+            # chat messages arriving within this window after the first
+            # one are answered in one model call, 0 answers each alone
+            "message_batch_window_seconds": 2.0,
+            "message_batch_max_size": 20,
+            # reuse the model's answer to an identical request, read at
+            # startup, on disk the answers are kept in response_cache.sqlite3
+            "response_cache": False,
+            "response_cache_size": 256,
+            "response_cache_ttl_seconds": 3600.0,
+            "response_cache_on_disk": False,
         }
         web_interface: WebInterfaceConfigDict = {
             "web_interface_port": 5000,
@@ -80,12 +274,43 @@ class Config:
             "matrix_user_password": None,
             "matrix_server": "matrix.org",
         }
+        storage: StorageConfigDict = {
+            "storage_mode": StorageModes.JSON.value,
+            "durability": Durability.BATCH.value,
+            "wal_compaction_records": 1000,
+            # 0 writes synchronously on every store_data call
+            "flush_interval_seconds": 1.0,
+            "flush_max_pending_bytes": 64 * 1024,
+            # messages older than this are evicted from the memory,
+            # 0 disables it
+            "archive_after_days": 0,
+            # evict the oldest messages beyond these limits, 0 disables them
+            "retention_max_messages": 0,
+            "retention_max_bytes": 0,
+            # only evict messages a daily summary covers
+            "retention_keep_unsummarized": True,
+            "retention_action": RetentionActions.ARCHIVE.value,
+            # archived days older than this are deleted, 0 keeps them
+            "archive_retention_days": 0,
+            # daily and weekly summaries older than this are deleted once
+            # the monthly summary covers them, 0 keeps them
+            "summary_retention_days": 0,
+            # load older messages and summaries on first access
+            "lazy_load": False,
+            "snapshot_format": SnapshotFormats.JSON.value,
+            # keep a full text index of the memory in search_index.bin
+            "search_index": True,
+            # embed messages while dreaming to find relevant memories
+            "vector_index": True,
+            "embedding_dimensions": 256,
+        }
         config: ConfigDict = {
             "id": str(uuid.uuid4()),
             "profile_name": "anon bot",
             "bot": bot,
             "web_interface": web_interface,
             "message_interface": message_interface,
+            "storage": storage,
         }
         return config
 
@@ -103,30 +328,74 @@ class Config:
         bot_config: BotConfigDict = get_value(data, default_config, "bot")  # type: ignore
         web_interface_config: WebInterfaceConfigDict = get_value(data, default_config, "web_interface")  # type: ignore
         message_interface_config: MessageInterfaceConfigDict = get_value(data, default_config, "message_interface")  # type: ignore
+        storage_config: StorageConfigDict = get_value(data, default_config, "storage")  # type: ignore
         return Config(
             id=get_value(data, default_config, "id"),  # type: ignore
             bot_profile_name=get_value(data, default_config, "profile_name"),  # type: ignore
             bot_name=get_value(bot_config, default_config["bot"], "bot_name"),  # type: ignore
             bot_timeout=get_value(bot_config, default_config["bot"], "bot_timeout"),  # type: ignore
+            summarize_while_dreaming=bool(get_value(bot_config, default_config["bot"], "summarize_while_dreaming")),  # type: ignore
+            relevant_memories=int(get_value(bot_config, default_config["bot"], "relevant_memories")),  # type: ignore
+            context_token_budgets=dict(get_value(bot_config, default_config["bot"], "context_token_budgets")),  # type: ignore
+            mind_map_max_chars=int(get_value(bot_config, default_config["bot"], "mind_map_max_chars")),  # type: ignore
             model_name=get_value(bot_config, default_config["bot"], "model_name"),  # type: ignore
             profile_file_name=get_value(bot_config, default_config["bot"], "profile_file_name"),  # type: ignore
             model_api_key=get_value(bot_config, default_config["bot"], "model_api_key"),  # type: ignore
             model_api_url=get_value(bot_config, default_config["bot"], "model_api_url"),  # type: ignore
+            model_connect_timeout_seconds=float(get_value(bot_config, default_config["bot"], "model_connect_timeout_seconds")),  # type: ignore
+            model_request_timeout_seconds=float(get_value(bot_config, default_config["bot"], "model_request_timeout_seconds")),  # type: ignore
+            model_stream=bool(get_value(bot_config, default_config["bot"], "model_stream")),  # type: ignore
+            message_batch_window_seconds=float(get_value(bot_config, default_config["bot"], "message_batch_window_seconds")),  # type: ignore
+            message_batch_max_size=int(get_value(bot_config, default_config["bot"], "message_batch_max_size")),  # type: ignore
+            response_cache=bool(get_value(bot_config, default_config["bot"], "response_cache")),  # type: ignore
+            response_cache_size=int(get_value(bot_config, default_config["bot"], "response_cache_size")),  # type: ignore
+            response_cache_ttl_seconds=float(get_value(bot_config, default_config["bot"], "response_cache_ttl_seconds")),  # type: ignore
+            response_cache_on_disk=bool(get_value(bot_config, default_config["bot"], "response_cache_on_disk")),  # type: ignore
             web_interface_port=int(get_value(web_interface_config, default_config["web_interface"], "web_interface_port")),  # type: ignore
             web_interface_api_key=get_value(web_interface_config, default_config["web_interface"], "web_interface_api_key"),  # type: ignore
             matrix_user_name=get_value(message_interface_config, default_config["message_interface"], "matrix_user_name"),  # type: ignore
             matrix_user_password=get_value(message_interface_config, default_config["message_interface"], "matrix_user_password"),  # type: ignore
             matrix_server=get_value(message_interface_config, default_config["message_interface"], "matrix_server"),  # type: ignore
+            storage_mode=StorageModes(get_value(storage_config, default_config["storage"], "storage_mode")),  # type: ignore
+            durability=Durability(get_value(storage_config, default_config["storage"], "durability")),  # type: ignore
+            wal_compaction_records=int(get_value(storage_config, default_config["storage"], "wal_compaction_records")),  # type: ignore
+            flush_interval_seconds=float(get_value(storage_config, default_config["storage"], "flush_interval_seconds")),  # type: ignore
+            flush_max_pending_bytes=int(get_value(storage_config, default_config["storage"], "flush_max_pending_bytes")),  # type: ignore
+            archive_after_days=int(get_value(storage_config, default_config["storage"], "archive_after_days")),  # type: ignore
+            retention_max_messages=int(get_value(storage_config, default_config["storage"], "retention_max_messages")),  # type: ignore
+            retention_max_bytes=int(get_value(storage_config, default_config["storage"], "retention_max_bytes")),  # type: ignore
+            retention_keep_unsummarized=bool(get_value(storage_config, default_config["storage"], "retention_keep_unsummarized")),  # type: ignore
+            retention_action=RetentionActions(get_value(storage_config, default_config["storage"], "retention_action")),  # type: ignore
+            archive_retention_days=int(get_value(storage_config, default_config["storage"], "archive_retention_days")),  # type: ignore
+            summary_retention_days=int(get_value(storage_config, default_config["storage"], "summary_retention_days")),  # type: ignore
+            lazy_load=bool(get_value(storage_config, default_config["storage"], "lazy_load")),  # type: ignore
+            snapshot_format=SnapshotFormats(get_value(storage_config, default_config["storage"], "snapshot_format")),  # type: ignore
+            search_index=bool(get_value(storage_config, default_config["storage"], "search_index")),  # type: ignore
+            vector_index=bool(get_value(storage_config, default_config["storage"], "vector_index")),  # type: ignore
+            embedding_dimensions=int(get_value(storage_config, default_config["storage"], "embedding_dimensions")),  # type: ignore
         )
 
     def to_dict(self) -> ConfigDict:
         bot: BotConfigDict = {
             "bot_name": self.bot_name,
             "bot_timeout": self.bot_timeout,
+            "summarize_while_dreaming": self.summarize_while_dreaming,
+            "relevant_memories": self.relevant_memories,
+            "context_token_budgets": self.context_token_budgets,
+            "mind_map_max_chars": self.mind_map_max_chars,
             "profile_file_name": self.profile_file_name,
             "model_name": self.model_name,
             "model_api_key": self.model_api_key,
             "model_api_url": self.model_api_url,
+            "model_connect_timeout_seconds": self.model_connect_timeout_seconds,
+            "model_request_timeout_seconds": self.model_request_timeout_seconds,
+            "model_stream": self.model_stream,
+            "message_batch_window_seconds": self.message_batch_window_seconds,
+            "message_batch_max_size": self.message_batch_max_size,
+            "response_cache": self.response_cache,
+            "response_cache_size": self.response_cache_size,
+            "response_cache_ttl_seconds": self.response_cache_ttl_seconds,
+            "response_cache_on_disk": self.response_cache_on_disk,
         }
         web_interface: WebInterfaceConfigDict = {
             "web_interface_port": self.web_interface_port,
@@ -137,11 +406,31 @@ class Config:
             "matrix_user_password": self.matrix_user_password,
             "matrix_server": self.matrix_server,
         }
+        storage: StorageConfigDict = {
+            "storage_mode": self.storage_mode.value,
+            "durability": self.durability.value,
+            "wal_compaction_records": self.wal_compaction_records,
+            "flush_interval_seconds": self.flush_interval_seconds,
+            "flush_max_pending_bytes": self.flush_max_pending_bytes,
+            "archive_after_days": self.archive_after_days,
+            "retention_max_messages": self.retention_max_messages,
+            "retention_max_bytes": self.retention_max_bytes,
+            "retention_keep_unsummarized": self.retention_keep_unsummarized,
+            "retention_action": self.retention_action.value,
+            "archive_retention_days": self.archive_retention_days,
+            "summary_retention_days": self.summary_retention_days,
+            "lazy_load": self.lazy_load,
+            "snapshot_format": self.snapshot_format.value,
+            "search_index": self.search_index,
+            "vector_index": self.vector_index,
+            "embedding_dimensions": self.embedding_dimensions,
+        }
         config: ConfigDict = {
             "id": self.id,
             "profile_name": self.bot_profile_name,
             "bot": bot,
             "web_interface": web_interface,
             "message_interface": message_interface,
+            "storage": storage,
         }
         return config
@@ -0,0 +1,69 @@
+import os
+from pathlib import Path
+
+from app.lib.storage.config import Durability
+
+
+class DurableFiles:
+    """
+    Crash safe file writes for the storage.
+    Files are replaced atomically by writing a temp file and renaming it,
+    how often data is fsynced depends on the durability:
+    none never fsyncs, a crash can lose the last writes but never
+    leaves a truncated file. always fsyncs every write and its directory.
+    batch fsyncs temp files before the rename, but defers directory
+    and append fsyncs to sync(), which the storage calls once per flush.
+    """
+
+    def __init__(self, durability: Durability) -> None:
+        self.durability: Durability = durability
+        self.pending_syncs: set[Path] = set()
+        self.fsync_count: int = 0
+
+    def write_atomic(self, path: Path, data: bytes) -> None:
+        temp_path = path.with_name(f".{path.name}.tmp")
+        with open(temp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            if self.durability != Durability.NONE:
+                self._fsync(f.fileno())
+        os.replace(temp_path, path)
+        if self.durability == Durability.ALWAYS:
+            self._fsync_directory(path.parent)
+        elif self.durability == Durability.BATCH:
+            self.pending_syncs.add(path.parent)
+
+    def append(self, path: Path, data: bytes) -> None:
+        with open(path, "ab") as f:
+            f.write(data)
+            f.flush()
+            if self.durability == Durability.ALWAYS:
+                self._fsync(f.fileno())
+        if self.durability == Durability.BATCH:
+            self.pending_syncs.add(path)
+
+    def sync(self) -> None:
+        """Fsync everything written since the last sync in batch mode."""
+        pending_syncs = self.pending_syncs
+        self.pending_syncs = set()
+        for path in pending_syncs:
+            if path.is_dir():
+                self._fsync_directory(path)
+            elif path.is_file():
+                with open(path, "rb") as f:
+                    self._fsync(f.fileno())
+
+    def _fsync(self, file_descriptor: int) -> None:
+        os.fsync(file_descriptor)
+        self.fsync_count += 1
+
+    def _fsync_directory(self, path: Path) -> None:
+        """Persist the rename, directories can't be opened on windows."""
+        try:
+            file_descriptor = os.open(path, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            self._fsync(file_descriptor)
+        finally:
+            os.close(file_descriptor)
@@ -0,0 +1,153 @@
+from abc import abstractmethod
+from typing import TYPE_CHECKING, Iterator
+
+if TYPE_CHECKING:
+    from app.lib.storage.bot_memory import (
+        ModelMessage,
+        PeriodicSummary,
+        Periods,
+    )
+
+
+class MemoryBackend:
+    """
+    Storage engines that keep messages and summaries outside of RAM
+    implement this, BotMemory then forwards reads and writes to it
+    """
+
+    @abstractmethod
+    def add_message(
+        self, timestamp_ns: int, message: "ModelMessage", token_count: int
+    ) -> int:
+        """
+        Persist a new message with its token count and return its sequence id
+        """
+
+    @abstractmethod
+    def get_newest_messages(
+        self,
+    ) -> Iterator[tuple[int, "ModelMessage", int]]:
+        """
+        Yields (seq, message, token count) from the newest message backwards
+        """
+
+    @abstractmethod
+    def get_last_n_messages(self, n: int) -> list["ModelMessage"]:
+        """
+        Returns the newest n messages ordered from oldest to newest
+        """
+
+    @abstractmethod
+    def get_messages_in_range(
+        self, start_ns: int, to_ns: int
+    ) -> list["ModelMessage"]:
+        """
+        Returns the messages with start_ns <= timestamp <= to_ns, oldest first
+        """
+
+    @abstractmethod
+    def get_message(self, seq: int) -> "ModelMessage | None":
+        """
+        Returns the message with the sequence id seq
+        """
+
+    @abstractmethod
+    def get_messages_from(
+        self, seq: int, limit: int | None
+    ) -> list[tuple[int, "ModelMessage"]]:
+        """
+        Returns (seq, message) of up to limit messages with a seq
+        from seq on, oldest first, all of them when limit is None
+        """
+
+    @abstractmethod
+    def get_next_message_time(self, start_ns: int) -> int | None:
+        """
+        Returns the timestamp of the first message at or after start_ns
+        """
+
+    @abstractmethod
+    def get_messages(self) -> list[tuple[int, int, "ModelMessage"]]:
+        """
+        Returns (seq, timestamp_ns, message) of all messages, oldest first
+        """
+
+    @abstractmethod
+    def count_messages(self) -> int:
+        """
+        Returns the number of stored messages
+        """
+
+    @abstractmethod
+    def get_messages_bytes(self) -> int:
+        """
+        Returns the utf-8 size of all message contents
+        """
+
+    @abstractmethod
+    def get_oldest_messages(
+        self, n: int
+    ) -> list[tuple[int, int, "ModelMessage"]]:
+        """
+        Returns (seq, timestamp_ns, message) of the oldest n messages
+        """
+
+    @abstractmethod
+    def drop_messages_before(self, seq: int) -> int:
+        """
+        Deletes the messages older than seq, returns how many were deleted
+        """
+
+    @abstractmethod
+    def set_periodic_summary(self, summary: "PeriodicSummary") -> None:
+        """
+        Insert or replace the summary for its period and start date
+        """
+
+    @abstractmethod
+    def get_periodic_summary(
+        self, interval: "Periods", start_time: int
+    ) -> "PeriodicSummary | None":
+        """
+        Returns the summary for the exact period and start date
+        """
+
+    @abstractmethod
+    def get_periodic_summaries(
+        self, interval: "Periods"
+    ) -> list["PeriodicSummary"]:
+        """
+        Returns all summaries of a period ordered by start date
+        """
+
+    @abstractmethod
+    def get_latest_periodic_summary(
+        self, interval: "Periods", time: int
+    ) -> "PeriodicSummary | None":
+        """
+        Returns the summary with the latest start date at or before time
+        """
+
+    @abstractmethod
+    def get_periodic_summaries_starting(
+        self, interval: "Periods", start_time: int, to_time: int
+    ) -> list["PeriodicSummary"]:
+        """
+        Returns the summaries with start_time <= start date <= to_time,
+        ordered by start date
+        """
+
+    @abstractmethod
+    def delete_periodic_summary(
+        self, interval: "Periods", start_time: int
+    ) -> bool:
+        """
+        Deletes the summary for the period and start date,
+        returns False if there was none
+        """
+
+    @abstractmethod
+    def set_mind_map(self, mind_map: str | None) -> None:
+        """
+        Persist the mind map
+        """
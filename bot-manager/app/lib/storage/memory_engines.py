@@ -0,0 +1,371 @@
+import json
+import logging
+import time
+from abc import abstractmethod
+from pathlib import Path
+from typing import TypedDict
+
+from app.lib.logger import setup_logger
+from app.lib.storage.binary_snapshot import BinarySnapshot
+from app.lib.storage.bot_memory import (
+    BOT_MEMORY_FORMAT_VERSION,
+    BotMemory,
+    MemorySections,
+    MessageLog,
+    PeriodicSummary,
+    StoredModelMessageDict,
+)
+from app.lib.storage.config import Config, SnapshotFormats
+from app.lib.storage.durable_files import DurableFiles
+from app.lib.storage.storage_stats import StorageStats
+from app.lib.storage.write_ahead_log import WriteAheadLog
+
+# newest messages kept in the header for lazy loading
+HEADER_RECENT_MESSAGES = 200
+
+
+class BotMemoryHeaderDict(TypedDict):
+    format_version: int
+    # identify the snapshot the header was written for
+    snapshot_size: int
+    snapshot_mtime_ns: int
+    mind_map: str | None
+    next_seq: int
+    recent_messages: dict[int, StoredModelMessageDict]
+
+
+class MemoryEngine:
+    """
+    Base class for the engines that persist the bot memory.
+    The engine is selected by storage_mode in the config.
+    """
+
+    def __init__(
+        self,
+        data_dir: Path,
+        config: Config,
+        stats: StorageStats,
+        files: DurableFiles,
+    ) -> None:
+        self.logger = setup_logger(
+            "MemoryEngine",
+            logging.DEBUG,
+        )
+        self.config: Config = config
+        self.stats: StorageStats = stats
+        self.files: DurableFiles = files
+        json_path = data_dir / "bot_memory.json"
+        binary_path = data_dir / "bot_memory.bin"
+        binary = config.snapshot_format == SnapshotFormats.BINARY
+        self.memory_path: Path = binary_path if binary else json_path
+        self.other_memory_path: Path = json_path if binary else binary_path
+        self.header_path: Path = data_dir / "bot_memory.head.json"
+        self.wal: WriteAheadLog = WriteAheadLog(
+            data_dir / "bot_memory.wal", files
+        )
+        # serialized sections of the last snapshot, reused while unchanged
+        self.section_cache: dict[MemorySections, str] = {}
+        self.snapshot_bytes: int = 0
+
+    @abstractmethod
+    def load(self) -> BotMemory:
+        """
+        Restore the bot memory
+        """
+
+    @abstractmethod
+    def store(self, bot_memory: BotMemory) -> None:
+        """
+        Persist all changes made to the bot memory since the last store
+        """
+
+    def close(self) -> None:
+        """
+        Release files or connections held by the engine
+        """
+
+    def _load_snapshot(self, lazy: bool = False) -> BotMemory:
+        """
+        Load the snapshot and replay the write ahead log on top of it.
+        When lazy, only the header is read and the older messages and
+        summaries are loaded from the snapshot on first access.
+        """
+        bot_memory: BotMemory | None = self._load_header() if lazy else None
+        if bot_memory is not None:
+            self.logger.info(
+                f"Bot memory header loaded from {self.header_path}, older messages load on first access"
+            )
+        elif (
+            not self.memory_path.is_file()
+            and not self.other_memory_path.is_file()
+        ):
+            self.logger.warning(
+                f"Memory file not found at {self.memory_path}. Initializing empty memory."
+            )
+            bot_memory = BotMemory()
+        else:
+            bot_memory = self._read_snapshot()
+            if lazy and self.memory_path.is_file():
+                self._store_header(bot_memory)
+        for record in self.wal.read():
+            bot_memory.apply_record(record)
+        if self.wal.record_count:
+            self.logger.info(
+                f"Replayed {self.wal.record_count} records from {self.wal.path}"
+            )
+        return bot_memory
+
+    def _read_snapshot(self) -> BotMemory:
+        """
+        Read the whole snapshot, a snapshot in the other format
+        is converted on the next store
+        """
+        path = (
+            self.memory_path
+            if self.memory_path.is_file()
+            else self.other_memory_path
+        )
+        self.snapshot_bytes = path.stat().st_size
+        bot_memory: BotMemory
+        if path.suffix == ".bin":
+            with open(path, "rb") as binary_file:
+                bot_memory = BinarySnapshot.decode(binary_file.read())
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                try:
+                    bot_memory = BotMemory.from_dict(json.load(f))
+                except json.JSONDecodeError as e:
+                    raise ValueError(
+                        f"Invalid JSON in memory file: {e}"
+                    ) from e
+        self.logger.info(f"Bot memory loaded successfully from {path}")
+        if path != self.memory_path:
+            self.logger.info(f"Converting {path} to {self.memory_path}")
+            bot_memory.dirty_sections = set(MemorySections)
+        return bot_memory
+
+    def _load_header(self) -> BotMemory | None:
+        """
+        Returns a lazily loaded memory if the header matches the snapshot
+        """
+        if not self.header_path.is_file() or not self.memory_path.is_file():
+            return None
+        with open(self.header_path, "r", encoding="utf-8") as f:
+            try:
+                header: BotMemoryHeaderDict = json.load(f)
+            except json.JSONDecodeError as e:
+                self.logger.warning(f"Ignoring invalid memory header: {e}")
+                return None
+        stat = self.memory_path.stat()
+        if (
+            header.get("format_version") != BOT_MEMORY_FORMAT_VERSION
+            or header.get("snapshot_size") != stat.st_size
+            or header.get("snapshot_mtime_ns") != stat.st_mtime_ns
+        ):
+            self.logger.info(
+                f"Memory header {self.header_path} is outdated, loading the whole memory"
+            )
+            return None
+        self.snapshot_bytes = stat.st_size
+        messages = MessageLog.from_dict(
+            header["recent_messages"], BOT_MEMORY_FORMAT_VERSION
+        )
+        messages.next_seq = max(messages.next_seq, header["next_seq"])
+        # the full snapshot is kept until both loaders used it
+        snapshot: dict[str, BotMemory] = {}
+        pending = {"messages", "summaries"}
+
+        def load_snapshot(part: str) -> BotMemory:
+            started = time.perf_counter()
+            if not snapshot:
+                snapshot["memory"] = self._read_snapshot()
+            bot_memory = snapshot["memory"]
+            pending.discard(part)
+            if not pending:
+                snapshot.clear()
+            self.stats.materialize_seconds += time.perf_counter() - started
+            return bot_memory
+
+        def load_messages() -> MessageLog:
+            return load_snapshot("messages").messages
+
+        def load_summaries() -> dict[str, dict[int, PeriodicSummary]]:
+            return load_snapshot("summaries").periodic_summaries
+
+        messages.loader = load_messages
+        return BotMemory(
+            mind_map=header["mind_map"],
+            messages=messages,
+            summaries_loader=load_summaries,
+        )
+
+    def _store_header(self, bot_memory: BotMemory) -> None:
+        """Store the parts of the snapshot that are loaded eagerly."""
+        stat = self.memory_path.stat()
+        header: BotMemoryHeaderDict = {
+            "format_version": BOT_MEMORY_FORMAT_VERSION,
+            "snapshot_size": stat.st_size,
+            "snapshot_mtime_ns": stat.st_mtime_ns,
+            "mind_map": bot_memory.mind_map,
+            "next_seq": bot_memory.messages.next_seq,
+            "recent_messages": bot_memory.messages.tail_to_dict(
+                HEADER_RECENT_MESSAGES
+            ),
+        }
+        data = json.dumps(header).encode("utf-8")
+        self.files.write_atomic(self.header_path, data)
+        self.stats.bytes_written += len(data)
+
+    def _store_snapshot(
+        self, bot_memory: BotMemory, dirty_sections: set[MemorySections]
+    ) -> None:
+        """
+        Store bot memory in the configured snapshot format.
+        The published snapshot is serialized, writes run on another
+        thread than the mutations, so the live memory may change.
+        """
+        bot_memory = bot_memory.get_snapshot()
+        if self.config.snapshot_format == SnapshotFormats.BINARY:
+            data = BinarySnapshot.encode(bot_memory)
+        else:
+            data = self._serialize_json(bot_memory, dirty_sections)
+        self.files.write_atomic(self.memory_path, data)
+        if self.other_memory_path.is_file():
+            # converted, the old snapshot must not be loaded again
+            self.other_memory_path.unlink()
+        self.snapshot_bytes = len(data)
+        self.stats.writes += 1
+        self.stats.bytes_written += len(data)
+        if self.config.lazy_load:
+            self._store_header(bot_memory)
+        self.logger.info(
+            f"Bot memory stored successfully to {self.memory_path}"
+        )
+
+    def _serialize_json(
+        self, bot_memory: BotMemory, dirty_sections: set[MemorySections]
+    ) -> bytes:
+        """
+        Only the dirty sections are serialized again,
+        the output matches json.dump with indent=4.
+        """
+        sections = [f'    "format_version": {BOT_MEMORY_FORMAT_VERSION}']
+        for section in MemorySections:
+            serialized = self.section_cache.get(section)
+            if serialized is None or section in dirty_sections:
+                serialized = json.dumps(
+                    self._section_to_dict(bot_memory, section), indent=4
+                ).replace("\n", "\n    ")
+                self.section_cache[section] = serialized
+            else:
+                self.stats.bytes_not_serialized += len(serialized)
+            sections.append(f'    "{section.value}": {serialized}')
+        return ("{\n" + ",\n".join(sections) + "\n}").encode("utf-8")
+
+    @staticmethod
+    def _section_to_dict(
+        bot_memory: BotMemory, section: MemorySections
+    ) -> object:
+        if section == MemorySections.PERIODIC_SUMMARIES:
+            return bot_memory.periodic_summaries_to_dict()
+        if section == MemorySections.MIND_MAP:
+            return bot_memory.mind_map
+        return bot_memory.messages_to_dict()
+
+    def _skip_store(self) -> None:
+        self.stats.skipped_writes += 1
+        self.stats.bytes_not_written += self.snapshot_bytes
+
+    def _append_journal(self, bot_memory: BotMemory) -> None:
+        """Appends the journaled changes to the write ahead log"""
+        records, journal_bytes = bot_memory.drain_journal()
+        if not records:
+            self.stats.skipped_writes += 1
+            return
+        self.wal.append(records)
+        self.stats.writes += 1
+        self.stats.bytes_written += journal_bytes
+        self.stats.bytes_not_written += self.snapshot_bytes
+
+    def _journal_full(self, bot_memory: BotMemory) -> bool:
+        return (
+            self.wal.record_count + len(bot_memory.journal)
+            >= self.config.wal_compaction_records
+        )
+
+
+class JsonMemoryEngine(MemoryEngine):
+    """
+    Rewrites bot_memory.json whenever a memory section changed.
+    Rewriting a lazily loaded memory would load all its messages, so
+    until something else loads them the changes are appended to
+    bot_memory.wal, and the snapshot and its header stay valid.
+    """
+
+    def load(self) -> BotMemory:
+        return self._load_snapshot(lazy=self.config.lazy_load)
+
+    def store(self, bot_memory: BotMemory) -> None:
+        if (
+            bot_memory.messages.loader is not None
+            and self.memory_path.is_file()
+            and not self._journal_full(bot_memory)
+        ):
+            # the sections are all serialized when the snapshot is written
+            bot_memory.drain_dirty_sections()
+            self._append_journal(bot_memory)
+            return
+        dirty_sections = bot_memory.drain_dirty_sections()
+        bot_memory.drain_journal()
+        if (
+            not dirty_sections
+            and self.memory_path.is_file()
+            and not self.wal.record_count
+        ):
+            self._skip_store()
+            return
+        self._store_snapshot(bot_memory, dirty_sections)
+        if self.wal.record_count:
+            # left over from a previous run in wal mode
+            self.wal.truncate()
+
+
+class WalMemoryEngine(MemoryEngine):
+    """
+    Appends mutations to bot_memory.wal and folds the log into
+    bot_memory.json once it reaches wal_compaction_records
+    """
+
+    def __init__(
+        self,
+        data_dir: Path,
+        config: Config,
+        stats: StorageStats,
+        files: DurableFiles,
+    ) -> None:
+        super().__init__(data_dir, config, stats, files)
+        # the snapshot sections that the log changed since the last compaction
+        self.dirty_sections: set[MemorySections] = set()
+
+    def load(self) -> BotMemory:
+        return self._load_snapshot(lazy=self.config.lazy_load)
+
+    def store(self, bot_memory: BotMemory) -> None:
+        self.dirty_sections |= bot_memory.drain_dirty_sections()
+        if not self.memory_path.is_file() or self._journal_full(bot_memory):
+            self.compact(bot_memory)
+            return
+        self._append_journal(bot_memory)
+
+    def compact(self, bot_memory: BotMemory) -> None:
+        """
+        Folds the write ahead log into a new bot_memory.json snapshot.
+        Replaying a record twice is harmless, so a crash between writing
+        the snapshot and truncating the log loses nothing.
+        """
+        self.dirty_sections |= bot_memory.drain_dirty_sections()
+        bot_memory.drain_journal()
+        self._store_snapshot(bot_memory, self.dirty_sections)
+        self.dirty_sections = set()
+        self.wal.truncate()
+        self.logger.info(f"Compacted memory log into {self.memory_path}")
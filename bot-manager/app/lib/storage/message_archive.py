@@ -0,0 +1,400 @@
+import datetime
+import hashlib
+import logging
+import mmap
+import struct
+import zlib
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+
+from app.lib.logger import setup_logger
+from app.lib.storage.bot_memory import ROLE_CODES, ROLES, ModelMessage
+from app.lib.storage.durable_files import DurableFiles
+from app.lib.storage.storage_stats import StorageStats
+
+SEGMENT_MAGIC = b"AIMSEG"
+SEGMENT_VERSION = 2
+# magic, version
+SEGMENT_PREFIX = struct.Struct("<6sH")
+# version 1 stored the contents uncompressed after the index
+# magic, version, message count
+SEGMENT_HEADER_V1 = struct.Struct("<6sHI")
+# seq, timestamp_ns, role code, content offset, content length
+SEGMENT_ENTRY_V1 = struct.Struct("<qqBII")
+# magic, version, message count, body count, chunk count, dictionary id
+SEGMENT_HEADER = struct.Struct("<6sHIIII")
+# seq, timestamp_ns, role code, body id
+SEGMENT_ENTRY = struct.Struct("<qqBI")
+# chunk, offset in the uncompressed chunk, length
+SEGMENT_BODY = struct.Struct("<III")
+# offset in the payload, compressed length
+SEGMENT_CHUNK = struct.Struct("<QI")
+# uncompressed size of a chunk, a read decompresses only the chunks it needs
+CHUNK_BYTES = 64 * 1024
+# zlib uses at most the last 32 KiB of a preset dictionary
+DICTIONARY_BYTES = 32 * 1024
+DAY_NS = 24 * 60 * 60 * 1_000_000_000
+
+ArchivedMessage = tuple[int, int, ModelMessage]
+
+
+@dataclass
+class ArchiveSegment:
+    """An immutable segment file holding messages of one UTC day"""
+
+    path: Path
+    day_start_ns: int
+    first_seq: int
+
+    @property
+    def day_end_ns(self) -> int:
+        return self.day_start_ns + DAY_NS
+
+    @staticmethod
+    def from_path(path: Path) -> "ArchiveSegment":
+        # messages-YYYY-MM-DD-<first seq>.seg
+        _, year, month, day, first_seq = path.stem.split("-")
+        day_start = datetime.datetime(
+            int(year), int(month), int(day), tzinfo=datetime.timezone.utc
+        )
+        return ArchiveSegment(
+            path=path,
+            day_start_ns=int(day_start.timestamp()) * 1_000_000_000,
+            first_seq=int(first_seq),
+        )
+
+
+class MessageArchive:
+    """
+    Cold storage for messages that left the hot window.
+    Messages are written once into day partitioned segment files,
+    which are opened with mmap only when a range read touches their day.
+    Identical message bodies are stored once per segment and referenced
+    by id, the bodies are compressed in chunks with a zlib dictionary
+    trained on the most repeated bodies, like the profile prompts.
+    """
+
+    def __init__(
+        self, archive_dir: Path, files: DurableFiles, stats: StorageStats
+    ) -> None:
+        self.logger = setup_logger(
+            "MessageArchive",
+            logging.DEBUG,
+        )
+        self.archive_dir: Path = archive_dir
+        self.files: DurableFiles = files
+        self.stats: StorageStats = stats
+        self.segments: list[ArchiveSegment] = []
+        # zlib preset dictionaries by id, loaded on first use
+        self.dictionaries: dict[int, bytes] = {}
+        # the dictionary new segments are compressed with, 0 for none
+        self.dictionary_id: int = 0
+        # messages up to this seq are archived already
+        self.archived_seq: int = -1
+        self._scan()
+
+    def _scan(self) -> None:
+        if not self.archive_dir.is_dir():
+            return
+        dictionaries = sorted(
+            self.archive_dir.glob("dictionary-*.zdict"),
+            key=lambda path: path.stat().st_mtime_ns,
+        )
+        if dictionaries:
+            self.dictionary_id = int(dictionaries[-1].stem.split("-")[1], 16)
+        self.segments = sorted(
+            (
+                ArchiveSegment.from_path(path)
+                for path in self.archive_dir.glob("messages-*.seg")
+            ),
+            key=lambda segment: (segment.day_start_ns, segment.first_seq),
+        )
+        if self.segments:
+            # seqs follow the timestamps, the newest segment holds the last one
+            with open(self.segments[-1].path, "rb") as f:
+                data = f.read()
+            _, version = SEGMENT_PREFIX.unpack_from(data, 0)
+            header, entry = (
+                (SEGMENT_HEADER_V1, SEGMENT_ENTRY_V1)
+                if version == 1
+                else (SEGMENT_HEADER, SEGMENT_ENTRY)
+            )
+            count = header.unpack_from(data, 0)[2]
+            self.archived_seq = entry.unpack_from(
+                data, header.size + (count - 1) * entry.size
+            )[0]
+
+    def archive(self, messages: list[ArchivedMessage]) -> int:
+        """
+        Write messages (seq, timestamp_ns, message) into new segments,
+        already archived messages are skipped. Returns the number archived.
+        """
+        by_day: dict[int, list[ArchivedMessage]] = {}
+        for message in messages:
+            if message[0] <= self.archived_seq:
+                continue
+            day_start_ns = message[1] - message[1] % DAY_NS
+            by_day.setdefault(day_start_ns, []).append(message)
+        if not by_day:
+            return 0
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        if not self.dictionary_id:
+            self._train_dictionary(messages)
+        archived = 0
+        for day_start_ns, day_messages in sorted(by_day.items()):
+            segment = self._write_segment(day_start_ns, day_messages)
+            self.segments.append(segment)
+            self.archived_seq = max(self.archived_seq, day_messages[-1][0])
+            archived += len(day_messages)
+        self.stats.archived_messages += archived
+        self.segments.sort(
+            key=lambda segment: (segment.day_start_ns, segment.first_seq)
+        )
+        self.logger.info(f"Archived {archived} messages to {self.archive_dir}")
+        return archived
+
+    def read_range(self, start_ns: int, to_ns: int) -> list[ArchivedMessage]:
+        """Returns archived messages with start_ns <= timestamp <= to_ns"""
+        messages: list[ArchivedMessage] = []
+        for segment in self.segments:
+            if segment.day_end_ns <= start_ns or segment.day_start_ns > to_ns:
+                continue
+            messages += self._read_segment(segment, start_ns, to_ns)
+            self.stats.archive_segments_read += 1
+        return messages
+
+    def drop_before(self, timestamp_ns: int) -> int:
+        """
+        Delete the segments whose whole day is older than timestamp_ns,
+        returns the number of deleted segments
+        """
+        dropped = [
+            segment
+            for segment in self.segments
+            if segment.day_end_ns <= timestamp_ns
+        ]
+        for segment in dropped:
+            if segment.path.is_file():
+                self.stats.deleted_archive_bytes += segment.path.stat().st_size
+            segment.path.unlink(missing_ok=True)
+        self.stats.deleted_archive_segments += len(dropped)
+        self.segments = [
+            segment
+            for segment in self.segments
+            if segment.day_end_ns > timestamp_ns
+        ]
+        return len(dropped)
+
+    def _train_dictionary(self, messages: list[ArchivedMessage]) -> None:
+        """
+        Builds the compression dictionary from the bodies that repeat most.
+        Dictionaries are never changed, so old segments stay readable.
+        """
+        counts = Counter(message.content for _, _, message in messages)
+        repeated = sorted(
+            (
+                (count * len(content), content)
+                for content, count in counts.items()
+                if count > 1
+            ),
+            reverse=True,
+        )
+        parts: list[bytes] = []
+        size = 0
+        for _, content in repeated:
+            encoded = content.encode("utf-8")
+            if size + len(encoded) > DICTIONARY_BYTES:
+                continue
+            parts.append(encoded)
+            size += len(encoded)
+        if not parts:
+            return
+        # zlib finds matches near the end of the dictionary cheapest
+        dictionary = b"".join(reversed(parts))
+        dictionary_id = zlib.crc32(dictionary) or 1
+        self.files.write_atomic(
+            self.archive_dir / f"dictionary-{dictionary_id:08x}.zdict",
+            dictionary,
+        )
+        self.dictionaries[dictionary_id] = dictionary
+        self.dictionary_id = dictionary_id
+        self.logger.info(
+            f"Trained a {len(dictionary)} byte compression dictionary for the archive"
+        )
+
+    def _dictionary(self, dictionary_id: int) -> bytes:
+        dictionary = self.dictionaries.get(dictionary_id)
+        if dictionary is None:
+            path = self.archive_dir / f"dictionary-{dictionary_id:08x}.zdict"
+            dictionary = self.dictionaries[dictionary_id] = path.read_bytes()
+        return dictionary
+
+    def _write_segment(
+        self, day_start_ns: int, messages: list[ArchivedMessage]
+    ) -> ArchiveSegment:
+        day = datetime.datetime.fromtimestamp(
+            day_start_ns // 1_000_000_000, tz=datetime.timezone.utc
+        )
+        path = (
+            self.archive_dir
+            / f"messages-{day.strftime('%Y-%m-%d')}-{messages[0][0]}.seg"
+        )
+        # content addressed bodies, identical bodies share one id
+        body_ids: dict[bytes, int] = {}
+        bodies = bytearray()
+        entries = bytearray()
+        chunks: list[bytearray] = [bytearray()]
+        raw_bytes = 0
+        for seq, timestamp_ns, message in messages:
+            content = message.content.encode("utf-8")
+            raw_bytes += len(content)
+            digest = hashlib.blake2b(content, digest_size=16).digest()
+            body_id = body_ids.get(digest)
+            if body_id is None:
+                if chunks[-1] and len(chunks[-1]) + len(content) > CHUNK_BYTES:
+                    chunks.append(bytearray())
+                body_id = body_ids[digest] = len(body_ids)
+                bodies += SEGMENT_BODY.pack(
+                    len(chunks) - 1, len(chunks[-1]), len(content)
+                )
+                chunks[-1] += content
+            entries += SEGMENT_ENTRY.pack(
+                seq, timestamp_ns, ROLE_CODES[message.role], body_id
+            )
+        chunk_table = bytearray()
+        payload = bytearray()
+        for chunk in chunks:
+            if self.dictionary_id:
+                compressor = zlib.compressobj(
+                    9, zdict=self._dictionary(self.dictionary_id)
+                )
+            else:
+                compressor = zlib.compressobj(9)
+            compressed = compressor.compress(chunk) + compressor.flush()
+            chunk_table += SEGMENT_CHUNK.pack(len(payload), len(compressed))
+            payload += compressed
+        data = b"".join(
+            [
+                SEGMENT_HEADER.pack(
+                    SEGMENT_MAGIC,
+                    SEGMENT_VERSION,
+                    len(messages),
+                    len(body_ids),
+                    len(chunks),
+                    self.dictionary_id,
+                ),
+                entries,
+                bodies,
+                chunk_table,
+                payload,
+            ]
+        )
+        self.files.write_atomic(path, data)
+        self.stats.archive_bytes_raw += raw_bytes
+        self.stats.archive_bytes_stored += len(data)
+        return ArchiveSegment(
+            path=path, day_start_ns=day_start_ns, first_seq=messages[0][0]
+        )
+
+    def _read_segment(
+        self, segment: ArchiveSegment, start_ns: int, to_ns: int
+    ) -> list[ArchivedMessage]:
+        with open(segment.path, "rb") as f, mmap.mmap(
+            f.fileno(), 0, access=mmap.ACCESS_READ
+        ) as data:
+            magic, version = SEGMENT_PREFIX.unpack_from(data, 0)
+            if magic != SEGMENT_MAGIC or version not in (1, SEGMENT_VERSION):
+                raise ValueError(f"Unsupported archive segment {segment.path}")
+            header, entry_struct = (
+                (SEGMENT_HEADER_V1, SEGMENT_ENTRY_V1)
+                if version == 1
+                else (SEGMENT_HEADER, SEGMENT_ENTRY)
+            )
+            count = header.unpack_from(data, 0)[2]
+
+            def entry(position: int) -> tuple[int, ...]:
+                values: tuple[int, ...] = entry_struct.unpack_from(
+                    data, header.size + position * entry_struct.size
+                )
+                return values
+
+            # timestamps inside a segment are sorted, bisect for the start
+            low, high = 0, count
+            while low < high:
+                middle = (low + high) // 2
+                if entry(middle)[1] < start_ns:
+                    low = middle + 1
+                else:
+                    high = middle
+            entries: list[tuple[int, ...]] = []
+            for position in range(low, count):
+                values = entry(position)
+                if values[1] > to_ns:
+                    break
+                entries.append(values)
+            if version == 1:
+                payload_start = header.size + count * entry_struct.size
+                return [
+                    (
+                        seq,
+                        timestamp_ns,
+                        ModelMessage(
+                            ROLES[role],
+                            data[
+                                payload_start
+                                + offset : payload_start
+                                + offset
+                                + length
+                            ].decode("utf-8"),
+                        ),
+                    )
+                    for seq, timestamp_ns, role, offset, length in entries
+                ]
+            return self._read_bodies(data, count, entries)
+
+    def _read_bodies(
+        self, data: mmap.mmap, count: int, entries: list[tuple[int, ...]]
+    ) -> list[ArchivedMessage]:
+        """Decompresses only the chunks holding the bodies of the entries."""
+        _, _, _, body_count, chunk_count, dictionary_id = (
+            SEGMENT_HEADER.unpack_from(data, 0)
+        )
+        bodies_start = SEGMENT_HEADER.size + count * SEGMENT_ENTRY.size
+        chunks_start = bodies_start + body_count * SEGMENT_BODY.size
+        payload_start = chunks_start + chunk_count * SEGMENT_CHUNK.size
+        chunks: dict[int, bytes] = {}
+        messages: list[ArchivedMessage] = []
+        for seq, timestamp_ns, role, body_id in entries:
+            chunk_id, offset, length = SEGMENT_BODY.unpack_from(
+                data, bodies_start + body_id * SEGMENT_BODY.size
+            )
+            chunk = chunks.get(chunk_id)
+            if chunk is None:
+                chunk_offset, chunk_length = SEGMENT_CHUNK.unpack_from(
+                    data, chunks_start + chunk_id * SEGMENT_CHUNK.size
+                )
+                decompressor = (
+                    zlib.decompressobj(zdict=self._dictionary(dictionary_id))
+                    if dictionary_id
+                    else zlib.decompressobj()
+                )
+                chunk = chunks[chunk_id] = decompressor.decompress(
+                    data[
+                        payload_start
+                        + chunk_offset : payload_start
+                        + chunk_offset
+                        + chunk_length
+                    ]
+                )
+            messages.append(
+                (
+                    seq,
+                    timestamp_ns,
+                    ModelMessage(
+                        ROLES[role],
+                        chunk[offset : offset + length].decode("utf-8"),
+                    ),
+                )
+            )
+        return messages
@@ -0,0 +1,370 @@
+import logging
+import re
+import struct
+import sys
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+from typing import Optional, TypedDict
+
+from app.lib.logger import setup_logger
+from app.lib.storage.binary_snapshot import _to_little_endian
+from app.lib.storage.bot_memory import BotMemory, Periods
+from app.lib.storage.durable_files import DurableFiles
+
+TOKEN = re.compile(r"\w+")
+INDEX_MAGIC = b"AIMINDEX"
+INDEX_VERSION = 1
+# magic, version, next doc, first doc, term count
+INDEX_HEADER = struct.Struct("<8sHqqI")
+# term length, posting count
+INDEX_TERM = struct.Struct("<II")
+# the mind map is indexed together with the summaries under this key
+MIND_MAP_KEY = ("mind_map", 0)
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN.findall(text.lower())
+
+
+class SearchHitDict(TypedDict):
+    kind: str
+    seq: Optional[int]
+    role: Optional[str]
+    period: Optional[str]
+    start_time: Optional[int]
+    content: str
+
+
+class InvertedIndex:
+    """
+    Positional inverted index, every term maps to the columns
+    (doc, position) of its occurrences sorted by doc.
+    Searching walks the postings of the rarest term from the newest doc
+    backwards and checks the other terms with bisect, so a query stops
+    after limit hits instead of intersecting whole posting lists.
+    """
+
+    def __init__(self) -> None:
+        self.postings: dict[str, tuple[array[int], array[int]]] = {}
+        # docs below next_doc are indexed
+        self.next_doc: int = 0
+        # docs below first_doc were dropped and are skipped
+        self.first_doc: int = 0
+
+    def add(self, doc: int, text: str) -> None:
+        for position, term in enumerate(tokenize(text)):
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = (array("q"), array("I"))
+            docs, positions = postings
+            if not docs or docs[-1] <= doc:
+                docs.append(doc)
+                positions.append(position)
+            else:
+                insert_at = bisect_right(docs, doc)
+                docs.insert(insert_at, doc)
+                positions.insert(insert_at, position)
+        self.next_doc = max(self.next_doc, doc + 1)
+
+    def remove(self, doc: int, text: str) -> None:
+        for term in set(tokenize(text)):
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            docs, positions = postings
+            start = bisect_left(docs, doc)
+            end = bisect_right(docs, doc)
+            del docs[start:end]
+            del positions[start:end]
+            if not docs:
+                del self.postings[term]
+
+    def search(self, query: str, limit: int) -> list[int]:
+        """
+        Returns up to limit docs containing all query terms, newest first.
+        A query in double quotes only matches the terms as a phrase.
+        """
+        stripped = query.strip()
+        phrase = len(stripped) > 1 and stripped[0] == stripped[-1] == '"'
+        terms = tokenize(stripped)
+        if not terms or limit <= 0:
+            return []
+        term_postings = []
+        for term in terms:
+            postings = self.postings.get(term)
+            if postings is None:
+                return []
+            term_postings.append(postings)
+        rarest = min(term_postings, key=lambda postings: len(postings[0]))
+        rarest_docs = rarest[0]
+        docs: list[int] = []
+        end = len(rarest_docs)
+        while end and len(docs) < limit:
+            doc = rarest_docs[end - 1]
+            if doc < self.first_doc:
+                break
+            end = bisect_left(rarest_docs, doc, 0, end)
+            if self._matches(doc, term_postings, phrase):
+                docs.append(doc)
+        return docs
+
+    @staticmethod
+    def _matches(
+        doc: int,
+        term_postings: list[tuple["array[int]", "array[int]"]],
+        phrase: bool,
+    ) -> bool:
+        doc_positions: list[set[int]] = []
+        for docs, positions in term_postings:
+            start = bisect_left(docs, doc)
+            if start == len(docs) or docs[start] != doc:
+                return False
+            if phrase:
+                doc_positions.append(
+                    set(positions[start : bisect_right(docs, doc, start)])
+                )
+        if not phrase:
+            return True
+        return any(
+            all(
+                first + offset in positions
+                for offset, positions in enumerate(doc_positions)
+            )
+            for first in doc_positions[0]
+        )
+
+    def compact(self) -> None:
+        """Removes the postings of dropped docs."""
+        for term in list(self.postings):
+            docs, positions = self.postings[term]
+            start = bisect_left(docs, self.first_doc)
+            if start == len(docs):
+                del self.postings[term]
+            elif start:
+                self.postings[term] = (docs[start:], positions[start:])
+
+    def to_bytes(self) -> bytes:
+        self.compact()
+        parts = [
+            INDEX_HEADER.pack(
+                INDEX_MAGIC,
+                INDEX_VERSION,
+                self.next_doc,
+                self.first_doc,
+                len(self.postings),
+            )
+        ]
+        for term, (docs, positions) in self.postings.items():
+            encoded = term.encode("utf-8")
+            parts.append(INDEX_TERM.pack(len(encoded), len(docs)))
+            parts.append(encoded)
+            parts.append(_to_little_endian(docs))
+            parts.append(_to_little_endian(positions))
+        return b"".join(parts)
+
+    @staticmethod
+    def from_bytes(data: bytes) -> "InvertedIndex":
+        magic, version, next_doc, first_doc, term_count = (
+            INDEX_HEADER.unpack_from(data, 0)
+        )
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            raise ValueError("Unsupported search index file")
+        index = InvertedIndex()
+        index.next_doc = next_doc
+        index.first_doc = first_doc
+        view = memoryview(data)
+        offset = INDEX_HEADER.size
+        for _ in range(term_count):
+            term_size, count = INDEX_TERM.unpack_from(data, offset)
+            offset += INDEX_TERM.size
+            term = bytes(view[offset : offset + term_size]).decode("utf-8")
+            offset += term_size
+            docs = array("q")
+            docs.frombytes(view[offset : offset + count * docs.itemsize])
+            offset += count * docs.itemsize
+            positions = array("I")
+            positions.frombytes(
+                view[offset : offset + count * positions.itemsize]
+            )
+            offset += count * positions.itemsize
+            if sys.byteorder == "big":
+                docs.byteswap()
+                positions.byteswap()
+            index.postings[term] = (docs, positions)
+        return index
+
+
+class MemorySearchIndex:
+    """
+    Full text search over the bot memory.
+    Messages are indexed by seq and persisted to search_index.bin,
+    summaries and the mind map are few and indexed again on the first
+    search. The messages the saved index misses are indexed on the first
+    search too, so a lazily loaded memory stays unloaded at startup.
+    """
+
+    def __init__(self, path: Path, files: DurableFiles) -> None:
+        self.logger = setup_logger(
+            "MemorySearchIndex",
+            logging.DEBUG,
+        )
+        self.path: Path = path
+        self.files: DurableFiles = files
+        self.messages: InvertedIndex = InvertedIndex()
+        self.summaries: InvertedIndex = InvertedIndex()
+        # summary (period, start time) and the mind map by doc id
+        self.summary_keys: list[tuple[str, int]] = []
+        self.summary_docs: dict[tuple[str, int], int] = {}
+        self.summary_texts: dict[int, str] = {}
+        # messages indexed since the index was last saved
+        self.unsaved_messages: int = 0
+        self.bot_memory: Optional[BotMemory] = None
+        # summaries are indexed on the first search instead of at startup
+        self.summaries_indexed: bool = False
+        # the first seq the saved index misses until the first search
+        self.catch_up_from: Optional[int] = None
+        # the first seq added after attaching, the catch up stops there
+        self.live_from: Optional[int] = None
+        # the flusher thread saves while the bot thread adds messages
+        self.lock: threading.Lock = threading.Lock()
+
+    def load(self) -> None:
+        if not self.path.is_file():
+            return
+        try:
+            self.messages = InvertedIndex.from_bytes(self.path.read_bytes())
+        except (ValueError, struct.error) as e:
+            self.logger.warning(f"Rebuilding the search index: {e}")
+            self.messages = InvertedIndex()
+
+    def save(self, min_unsaved: int = 1) -> None:
+        """
+        Writes the message index once min_unsaved messages changed.
+        An index that did not catch up yet is not saved, the next start
+        catches up from the saved one.
+        """
+        if self.catch_up_from is not None:
+            return
+        if self.unsaved_messages < min_unsaved and self.path.is_file():
+            return
+        with self.lock:
+            data = self.messages.to_bytes()
+            self.unsaved_messages = 0
+        self.files.write_atomic(self.path, data)
+        self.logger.info(f"Search index stored to {self.path}")
+
+    def attach(self, bot_memory: BotMemory) -> None:
+        """
+        Keeps the index up to date with the memory from now on,
+        the messages the saved index misses are indexed on the first search
+        """
+        if (
+            not bot_memory.backend
+            and self.messages.next_doc > bot_memory.messages.next_seq
+        ):
+            # the memory lost messages the index already saw
+            self.logger.warning("Search index is ahead of the memory")
+            self.messages = InvertedIndex()
+        self.bot_memory = bot_memory
+        bot_memory.search_index = self
+        self.catch_up_from = self.messages.next_doc
+        self.live_from = None
+
+    def _catch_up(self) -> None:
+        start = self.catch_up_from
+        if start is None or self.bot_memory is None:
+            return
+        self.catch_up_from = None
+        indexed = 0
+        for seq, message in self.bot_memory.get_messages_from(start):
+            if self.live_from is not None and seq >= self.live_from:
+                break
+            self.add_message(seq, message.content)
+            indexed += 1
+        self.logger.info(f"Indexed {indexed} messages for search")
+
+    def add_message(self, seq: int, content: str) -> None:
+        if self.catch_up_from is not None and self.live_from is None:
+            self.live_from = seq
+        with self.lock:
+            self.messages.add(seq, content)
+            self.unsaved_messages += 1
+
+    def drop_messages_before(self, seq: int) -> None:
+        with self.lock:
+            self.messages.first_doc = max(self.messages.first_doc, seq)
+            self.unsaved_messages += 1
+
+    def set_summary(self, period: str, start_time: int, text: str) -> None:
+        self._set_summary_doc((period, start_time), text)
+
+    def delete_summary(self, period: str, start_time: int) -> None:
+        # an empty text leaves no postings behind
+        self._set_summary_doc((period, start_time), "")
+
+    def set_mind_map(self, mind_map: str | None) -> None:
+        self._set_summary_doc(MIND_MAP_KEY, mind_map or "")
+
+    def _index_summaries(self) -> None:
+        if self.summaries_indexed or self.bot_memory is None:
+            return
+        self.summaries_indexed = True
+        for period in Periods:
+            for summary in self.bot_memory.get_periodic_summaries(period):
+                self.set_summary(
+                    period.value,
+                    summary.period_start_date,
+                    summary.summary_text,
+                )
+        self.set_mind_map(self.bot_memory.mind_map)
+
+    def _set_summary_doc(self, key: tuple[str, int], text: str) -> None:
+        with self.lock:
+            doc = self.summary_docs.get(key)
+            if doc is None:
+                doc = self.summary_docs[key] = len(self.summary_keys)
+                self.summary_keys.append(key)
+            else:
+                self.summaries.remove(doc, self.summary_texts[doc])
+            self.summary_texts[doc] = text
+            self.summaries.add(doc, text)
+
+    def search_messages(self, query: str, limit: int) -> list[int]:
+        """Returns the seqs of matching messages, newest first"""
+        self._catch_up()
+        with self.lock:
+            return self.messages.search(query, limit)
+
+    def search_summaries(self, query: str, limit: int) -> list[SearchHitDict]:
+        self._index_summaries()
+        with self.lock:
+            docs = self.summaries.search(query, limit)
+        hits: list[SearchHitDict] = []
+        for doc in docs:
+            period, start_time = self.summary_keys[doc]
+            if (period, start_time) == MIND_MAP_KEY:
+                hits.append(
+                    {
+                        "kind": "mind_map",
+                        "seq": None,
+                        "role": None,
+                        "period": None,
+                        "start_time": None,
+                        "content": self.summary_texts[doc],
+                    }
+                )
+            else:
+                hits.append(
+                    {
+                        "kind": "summary",
+                        "seq": None,
+                        "role": None,
+                        "period": period,
+                        "start_time": start_time,
+                        "content": self.summary_texts[doc],
+                    }
+                )
+        return hits
+
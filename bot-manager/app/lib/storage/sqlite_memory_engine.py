@@ -0,0 +1,376 @@
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterator
+
+from app.lib.storage.bot_memory import (
+    BotMemory,
+    ModelMessage,
+    PeriodicSummary,
+    Periods,
+    Roles,
+)
+from app.lib.storage.config import Config, Durability
+from app.lib.storage.durable_files import DurableFiles
+from app.lib.storage.memory_backend import MemoryBackend
+from app.lib.storage.memory_engines import MemoryEngine
+from app.lib.storage.storage_stats import StorageStats
+from app.lib.storage.token_counter import count_message_tokens
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    seq INTEGER PRIMARY KEY,
+    timestamp_ns INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    token_count INTEGER
+);
+CREATE INDEX IF NOT EXISTS messages_by_timestamp
+    ON messages (timestamp_ns, seq);
+CREATE TABLE IF NOT EXISTS periodic_summaries (
+    period TEXT NOT NULL,
+    period_start_date INTEGER NOT NULL,
+    summary_text TEXT NOT NULL,
+    PRIMARY KEY (period, period_start_date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS memory_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+) WITHOUT ROWID;
+"""
+
+# messages read at once when walking back from the newest
+NEWEST_MESSAGES_PAGE = 64
+
+SYNCHRONOUS_MODES: dict[Durability, str] = {
+    Durability.NONE: "OFF",
+    # in wal journal mode NORMAL only fsyncs on checkpoints
+    Durability.BATCH: "NORMAL",
+    Durability.ALWAYS: "FULL",
+}
+
+
+class SqliteMemoryEngine(MemoryEngine, MemoryBackend):
+    """
+    Keeps messages and summaries in bot_memory.sqlite3 and answers
+    reads with indexed queries, only the mind map stays in RAM.
+    Writes go into an open transaction that is committed on store.
+    """
+
+    def __init__(
+        self,
+        data_dir: Path,
+        config: Config,
+        stats: StorageStats,
+        files: DurableFiles,
+    ) -> None:
+        super().__init__(data_dir, config, stats, files)
+        self.db_path: Path = data_dir / "bot_memory.sqlite3"
+        # the connection is shared by the scheduler, message and web threads
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            self.db_path, check_same_thread=False
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            f"PRAGMA synchronous={SYNCHRONOUS_MODES[config.durability]}"
+        )
+        self.connection.executescript(SCHEMA)
+        columns = [
+            row[1]
+            for row in self.connection.execute("PRAGMA table_info(messages)")
+        ]
+        if "token_count" not in columns:
+            # databases created before token counts were cached
+            self.connection.execute(
+                "ALTER TABLE messages ADD COLUMN token_count INTEGER"
+            )
+
+    def load(self) -> BotMemory:
+        with self.lock:
+            initialized = self.connection.execute(
+                "SELECT value FROM memory_meta WHERE key = 'initialized'"
+            ).fetchone()
+        if not initialized:
+            self._import_snapshot()
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT value FROM memory_meta WHERE key = 'mind_map'"
+            ).fetchone()
+        self.logger.info(f"Bot memory opened from {self.db_path}")
+        return BotMemory(mind_map=row[0] if row else None, backend=self)
+
+    def store(self, bot_memory: BotMemory) -> None:
+        # the records were already written through the backend methods
+        dirty_sections = bot_memory.drain_dirty_sections()
+        _, journal_bytes = bot_memory.drain_journal()
+        if not dirty_sections:
+            self.stats.skipped_writes += 1
+            return
+        with self.lock:
+            self.connection.commit()
+        self.stats.writes += 1
+        self.stats.bytes_written += journal_bytes
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.commit()
+            self.connection.close()
+
+    def _import_snapshot(self) -> None:
+        """Migrate an existing bot_memory.json into the database once."""
+        bot_memory = self._load_snapshot()
+        with self.lock:
+            self.connection.executemany(
+                "INSERT INTO messages (seq, timestamp_ns, role, content) "
+                + "VALUES (?, ?, ?, ?)",
+                (
+                    (seq, timestamp_ns, message.role.value, message.content)
+                    for seq, timestamp_ns, message in bot_memory.messages.entries()
+                ),
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO periodic_summaries VALUES (?, ?, ?)",
+                (
+                    (
+                        summary.period.value,
+                        summary.period_start_date,
+                        summary.summary_text,
+                    )
+                    for summaries in bot_memory.periodic_summaries.values()
+                    for summary in summaries.values()
+                ),
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO memory_meta VALUES (?, ?)",
+                (("mind_map", bot_memory.mind_map), ("initialized", "1")),
+            )
+            self.connection.commit()
+        self.logger.info(
+            f"Imported {len(bot_memory.messages)} messages into {self.db_path}"
+        )
+
+    ##
+    ##  MemoryBackend
+    ##
+    def add_message(
+        self, timestamp_ns: int, message: ModelMessage, token_count: int
+    ) -> int:
+        with self.lock:
+            cursor = self.connection.execute(
+                "INSERT INTO messages (timestamp_ns, role, content, token_count) "
+                + "VALUES (?, ?, ?, ?)",
+                (timestamp_ns, message.role.value, message.content, token_count),
+            )
+        return int(cursor.lastrowid or 0)
+
+    def get_newest_messages(self) -> Iterator[tuple[int, ModelMessage, int]]:
+        before_seq: int | None = None
+        while True:
+            with self.lock:
+                rows = self.connection.execute(
+                    "SELECT seq, role, content, token_count FROM messages "
+                    + "WHERE ? IS NULL OR seq < ? ORDER BY seq DESC LIMIT ?",
+                    (before_seq, before_seq, NEWEST_MESSAGES_PAGE),
+                ).fetchall()
+                uncounted = [
+                    (count_message_tokens(content), seq)
+                    for seq, _, content, token_count in rows
+                    if token_count is None
+                ]
+                if uncounted:
+                    self.connection.executemany(
+                        "UPDATE messages SET token_count = ? WHERE seq = ?",
+                        uncounted,
+                    )
+            counted = {seq: token_count for token_count, seq in uncounted}
+            for seq, role, content, token_count in rows:
+                yield (
+                    seq,
+                    ModelMessage(Roles(role), content),
+                    token_count or counted[seq],
+                )
+            if len(rows) < NEWEST_MESSAGES_PAGE:
+                return
+            before_seq = rows[-1][0]
+
+    def get_last_n_messages(self, n: int) -> list[ModelMessage]:
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT role, content FROM "
+                + "(SELECT seq, role, content FROM messages ORDER BY seq DESC LIMIT ?) "
+                + "ORDER BY seq",
+                (n,),
+            ).fetchall()
+        return [ModelMessage(Roles(role), content) for role, content in rows]
+
+    def get_message(self, seq: int) -> ModelMessage | None:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT role, content FROM messages WHERE seq = ?", (seq,)
+            ).fetchone()
+        return ModelMessage(Roles(row[0]), row[1]) if row else None
+
+    def get_messages_from(
+        self, seq: int, limit: int | None
+    ) -> list[tuple[int, ModelMessage]]:
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT seq, role, content FROM messages WHERE seq >= ? "
+                + "ORDER BY seq LIMIT ?",
+                # a negative limit means no limit in sqlite
+                (seq, -1 if limit is None else limit),
+            ).fetchall()
+        return [
+            (row_seq, ModelMessage(Roles(role), content))
+            for row_seq, role, content in rows
+        ]
+
+    def get_next_message_time(self, start_ns: int) -> int | None:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT MIN(timestamp_ns) FROM messages WHERE timestamp_ns >= ?",
+                (start_ns,),
+            ).fetchone()
+        return None if row[0] is None else int(row[0])
+
+    def get_messages_in_range(
+        self, start_ns: int, to_ns: int
+    ) -> list[ModelMessage]:
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT role, content FROM messages "
+                + "WHERE timestamp_ns BETWEEN ? AND ? ORDER BY timestamp_ns, seq",
+                (start_ns, to_ns),
+            ).fetchall()
+        return [ModelMessage(Roles(role), content) for role, content in rows]
+
+    def get_messages(self) -> list[tuple[int, int, ModelMessage]]:
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT seq, timestamp_ns, role, content FROM messages ORDER BY seq"
+            ).fetchall()
+        return [
+            (seq, timestamp_ns, ModelMessage(Roles(role), content))
+            for seq, timestamp_ns, role, content in rows
+        ]
+
+    def count_messages(self) -> int:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT COUNT(*) FROM messages"
+            ).fetchone()
+        return int(row[0])
+
+    def get_messages_bytes(self) -> int:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT SUM(LENGTH(CAST(content AS BLOB))) FROM messages"
+            ).fetchone()
+        return int(row[0] or 0)
+
+    def get_oldest_messages(
+        self, n: int
+    ) -> list[tuple[int, int, ModelMessage]]:
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT seq, timestamp_ns, role, content FROM messages "
+                + "ORDER BY seq LIMIT ?",
+                (n,),
+            ).fetchall()
+        return [
+            (seq, timestamp_ns, ModelMessage(Roles(role), content))
+            for seq, timestamp_ns, role, content in rows
+        ]
+
+    def drop_messages_before(self, seq: int) -> int:
+        with self.lock:
+            cursor = self.connection.execute(
+                "DELETE FROM messages WHERE seq < ?", (seq,)
+            )
+        return cursor.rowcount
+
+    def set_periodic_summary(self, summary: PeriodicSummary) -> None:
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO periodic_summaries VALUES (?, ?, ?)",
+                (
+                    summary.period.value,
+                    summary.period_start_date,
+                    summary.summary_text,
+                ),
+            )
+
+    def get_periodic_summary(
+        self, interval: Periods, start_time: int
+    ) -> PeriodicSummary | None:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT summary_text FROM periodic_summaries "
+                + "WHERE period = ? AND period_start_date = ?",
+                (interval.value, start_time),
+            ).fetchone()
+        if not row:
+            return None
+        return PeriodicSummary(interval, start_time, row[0])
+
+    def get_periodic_summaries(
+        self, interval: Periods
+    ) -> list[PeriodicSummary]:
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT period_start_date, summary_text FROM periodic_summaries "
+                + "WHERE period = ? ORDER BY period_start_date",
+                (interval.value,),
+            ).fetchall()
+        return [
+            PeriodicSummary(interval, start_time, summary_text)
+            for start_time, summary_text in rows
+        ]
+
+    def get_latest_periodic_summary(
+        self, interval: Periods, time: int
+    ) -> PeriodicSummary | None:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT period_start_date, summary_text FROM periodic_summaries "
+                + "WHERE period = ? AND period_start_date <= ? "
+                + "ORDER BY period_start_date DESC LIMIT 1",
+                (interval.value, time),
+            ).fetchone()
+        if not row:
+            return None
+        return PeriodicSummary(interval, row[0], row[1])
+
+    def get_periodic_summaries_starting(
+        self, interval: Periods, start_time: int, to_time: int
+    ) -> list[PeriodicSummary]:
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT period_start_date, summary_text FROM periodic_summaries "
+                + "WHERE period = ? AND period_start_date BETWEEN ? AND ? "
+                + "ORDER BY period_start_date",
+                (interval.value, start_time, to_time),
+            ).fetchall()
+        return [
+            PeriodicSummary(interval, period_start_date, summary_text)
+            for period_start_date, summary_text in rows
+        ]
+
+    def delete_periodic_summary(
+        self, interval: Periods, start_time: int
+    ) -> bool:
+        with self.lock:
+            cursor = self.connection.execute(
+                "DELETE FROM periodic_summaries "
+                + "WHERE period = ? AND period_start_date = ?",
+                (interval.value, start_time),
+            )
+        return cursor.rowcount > 0
+
+    def set_mind_map(self, mind_map: str | None) -> None:
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO memory_meta VALUES ('mind_map', ?)",
+                (mind_map,),
+            )
@@ -1,11 +1,62 @@
+import atexit
 import json
 import logging
+import time
+from bisect import bisect_left
+from dataclasses import dataclass
 from pathlib import Path
 from typing import TypedDict
 
 from app.lib.logger import setup_logger
-from app.lib.storage.bot_memory import BotMemory, BotMemoryDict
-from app.lib.storage.config import Config, ConfigDict
+from app.lib.storage.bot_memory import (
+    BotMemory,
+    BotMemoryDict,
+    ModelMessageDict,
+    Periods,
+)
+from app.lib.storage.config import (
+    Config,
+    ConfigDict,
+    RetentionActions,
+    StorageModes,
+)
+from app.lib.storage.durable_files import DurableFiles
+from app.lib.storage.memory_engines import (
+    JsonMemoryEngine,
+    MemoryEngine,
+    WalMemoryEngine,
+)
+from app.lib.storage.message_archive import (
+    DAY_NS,
+    ArchivedMessage,
+    MessageArchive,
+)
+from app.lib.storage.search_index import (
+    MemorySearchIndex,
+    SearchHitDict,
+    tokenize,
+)
+from app.lib.storage.sqlite_memory_engine import SqliteMemoryEngine
+from app.lib.storage.storage_flusher import StorageFlusher
+from app.lib.storage.storage_stats import StorageStats
+from app.lib.storage.vector_index import MemoryVectorIndex
+
+
+# messages indexed before the search index is written with a flush
+SEARCH_INDEX_SAVE_MESSAGES = 1000
+# messages evicted per retention step
+RETENTION_BATCH = 10_000
+
+
+def user_data_dir(dev_mode: bool) -> Path:
+    """The user folder next to the app, or next to the build in production"""
+    current_dir = Path(__file__).parent
+    grandparent_dir = (
+        current_dir.parent.parent.parent
+        if dev_mode
+        else current_dir.parent.parent.parent.parent
+    )
+    return grandparent_dir / "user"
 
 
 class StorageDict(TypedDict):
@@ -13,51 +64,374 @@ class StorageDict(TypedDict):
     bot_memory: BotMemoryDict
 
 
+@dataclass(frozen=True)
+class StorageSnapshot:
+    """Config and memory as they were published, see Storage.snapshot()"""
+
+    bot_config: ConfigDict
+    bot_memory: BotMemory
+
+    def to_dict(self) -> StorageDict:
+        return {
+            "bot_config": self.bot_config,
+            "bot_memory": self.bot_memory.to_dict(),
+        }
+
+
 class Storage:
     bot_config: Config
     bot_memory: BotMemory
+    memory_engine: MemoryEngine
+    files: DurableFiles
+    archive: MessageArchive
+    search_index: MemorySearchIndex | None
+    vector_index: MemoryVectorIndex | None
 
-    def __init__(self, dev_mode: bool):
+    def __init__(self, dev_mode: bool, data_dir: Path | None = None):
         self.logger = setup_logger(
             "StorageManager",
             logging.DEBUG,
         )
-        current_dir = Path(__file__).parent
-        grandparent_dir = (
-            current_dir.parent.parent.parent
-            if dev_mode
-            else current_dir.parent.parent.parent.parent
+        # bots hosted together each have their own data_dir
+        self.data_dir = (
+            data_dir if data_dir is not None else user_data_dir(dev_mode)
         )
-        self.config_path = grandparent_dir / "user/config.json"
-        self.memory_path = grandparent_dir / "user/bot_memory.json"
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        self.config_path = self.data_dir / "config.json"
+        # config.json as last read or written
+        self.config_data: bytes = b""
+        self.stats: StorageStats = StorageStats()
 
         self.load_data()
+        self.flusher = StorageFlusher(
+            write=self._write_data,
+            flush_interval_seconds=self.bot_config.flush_interval_seconds,
+            flush_max_pending_bytes=self.bot_config.flush_max_pending_bytes,
+        )
+        atexit.register(self.flusher.stop)
+        if self.search_index:
+            atexit.register(self.search_index.save)
+        if self.vector_index:
+            atexit.register(self.vector_index.save)
         self.store_data()
 
+    def snapshot(self) -> StorageSnapshot:
+        """
+        The current version of config and memory for readers on other
+        threads like the web api, writers go on while they read it
+        """
+        return StorageSnapshot(
+            bot_config=self.bot_config.to_dict(),
+            bot_memory=self.bot_memory.get_snapshot(),
+        )
+
     def to_dict(self) -> StorageDict:
-        return {
-            "bot_config": self.bot_config.to_dict(),
-            "bot_memory": self.bot_memory.to_dict(),
-        }
+        return self.snapshot().to_dict()
 
     def load_data(self) -> None:
         """Load both config and memory data."""
         try:
             self.logger.info("Started loading bot config and memory")
+            started = time.perf_counter()
             self._load_config()
             self._load_memory()
-            self.logger.info("Done loading bot config and memory")
+            # writes the defaults of keys the config file is missing
+            self._store_config()
+            self.stats.load_seconds = time.perf_counter() - started
+            self.logger.info(
+                f"Done loading bot config and memory in {self.stats.load_seconds:.3f}s"
+            )
         except Exception as e:
             self.logger.exception(f"Failed to read bot config and memory: {e}")
 
     def store_data(self) -> None:
-        """Store both config and memory data."""
+        """
+        Mark config and memory as changed, they get written
+        together with all other changes of the flush window.
+        """
         try:
-            self._store_config()
-            self._store_memory()
+            self.flusher.mark_dirty(self.bot_memory.journal_bytes)
         except Exception as e:
             self.logger.exception(f"Failed to store bot config and memory: {e}")
 
+    def flush(self) -> None:
+        """Write pending changes now, for callers that need durability."""
+        self.flusher.flush()
+
+    async def flushed(self) -> None:
+        """Wait until all changes stored before the call are written."""
+        await self.flusher.flushed()
+
+    def enforce_retention(self, batch_size: int = RETENTION_BATCH) -> int:
+        """
+        Evicts up to batch_size of the oldest messages that break a
+        retention policy to the archive or deletes them, returns how many
+        were evicted. Call again while it returns batch_size.
+        """
+        messages, evicted_bytes = self.select_evictions(batch_size)
+        if not messages:
+            return 0
+        dropped = self.evict_messages(messages, evicted_bytes)
+        self.store_data()
+        return dropped
+
+    def select_evictions(
+        self, batch_size: int = RETENTION_BATCH
+    ) -> tuple[list[ArchivedMessage], int]:
+        """
+        Returns up to batch_size of the oldest messages that break a
+        retention policy and the utf-8 size of their contents, archived
+        and synced when retention_action is archive.
+        Reads the published snapshot, so it can run on a worker thread.
+        """
+        config = self.bot_config
+        bot_memory = self.bot_memory.get_snapshot()
+        oldest = bot_memory.get_oldest_messages(batch_size)
+        # the newest message is always kept
+        evictable = len(oldest)
+        count = bot_memory.count_messages()
+        if evictable == count:
+            evictable -= 1
+        if evictable <= 0:
+            return [], 0
+
+        timestamps = [timestamp for _, timestamp, _ in oldest]
+        evict = 0
+        if config.retention_max_messages > 0:
+            evict = max(evict, count - config.retention_max_messages)
+        if config.archive_after_days > 0:
+            cutoff_ns = time.time_ns() - config.archive_after_days * DAY_NS
+            evict = max(evict, bisect_left(timestamps, cutoff_ns))
+        sizes = [
+            len(message.content.encode("utf-8")) for _, _, message in oldest
+        ]
+        if config.retention_max_bytes > 0:
+            excess = bot_memory.get_messages_bytes() - config.retention_max_bytes
+            position = 0
+            while excess > 0 and position < len(sizes):
+                excess -= sizes[position]
+                position += 1
+            evict = max(evict, position)
+        if config.retention_keep_unsummarized:
+            # keep messages until a daily summary covers them
+            summarized_ns = bot_memory.get_summarized_until() * 1_000_000_000
+            evict = min(evict, bisect_left(timestamps, summarized_ns))
+        evict = min(evict, evictable)
+        if evict <= 0:
+            return [], 0
+
+        messages = oldest[:evict]
+        if config.retention_action == RetentionActions.ARCHIVE:
+            self.archive.archive(messages)
+            # the segments must be durable before the messages leave the memory
+            self.files.sync()
+        return messages, sum(sizes[:evict])
+
+    def evict_messages(
+        self, messages: list[ArchivedMessage], evicted_bytes: int
+    ) -> int:
+        """
+        Drops messages returned by select_evictions from the memory,
+        returns how many were dropped. The caller stores the memory.
+        """
+        before_seq = messages[-1][0] + 1
+        dropped = self.bot_memory.drop_messages_before(before_seq)
+        if self.vector_index:
+            self.vector_index.drop_messages_before(before_seq)
+        self.stats.evicted_messages += dropped
+        self.stats.evicted_bytes += evicted_bytes
+        return dropped
+
+    def enforce_summary_retention(self) -> int:
+        """
+        Deletes daily and weekly summaries older than
+        summary_retention_days once the monthly summary of their month
+        exists, returns how many were deleted. The caller stores the
+        memory.
+        """
+        if self.bot_config.summary_retention_days <= 0:
+            return 0
+        bot_memory = self.bot_memory
+        cutoff = (
+            int(time.time()) - self.bot_config.summary_retention_days * 86400
+        )
+        latest_daily = bot_memory.get_latest_periodic_summary(
+            Periods.DAILY, cutoff
+        )
+        deleted = 0
+        for period in (Periods.DAILY, Periods.WEEKLY):
+            for summary in bot_memory.get_periodic_summaries_between(
+                period, 0, cutoff
+            ):
+                start = summary.period_start_date
+                if period.end_of(start) > cutoff:
+                    continue
+                if (
+                    period == Periods.DAILY
+                    and latest_daily
+                    and start == latest_daily.period_start_date
+                ):
+                    # the summary pipeline continues after the latest one
+                    continue
+                month_start = Periods.MONTHLY.start_of(start)
+                if not bot_memory.get_periodic_summary(
+                    Periods.MONTHLY, month_start
+                ):
+                    continue
+                if bot_memory.delete_periodic_summary(period, start):
+                    deleted += 1
+        self.stats.evicted_summaries += deleted
+        return deleted
+
+    def enforce_archive_retention(self) -> int:
+        """Deletes archived days older than archive_retention_days."""
+        if self.bot_config.archive_retention_days <= 0:
+            return 0
+        return self.drop_archived_messages_before(
+            time.time_ns() - self.bot_config.archive_retention_days * DAY_NS
+        )
+
+    def drop_archived_messages_before(self, timestamp_ns: int) -> int:
+        """Delete archive segments older than timestamp_ns."""
+        return self.archive.drop_before(timestamp_ns)
+
+    def get_messages_in_range(
+        self, start_ns: int, to_ns: int
+    ) -> list[ModelMessageDict]:
+        """
+        Returns the messages with start_ns <= timestamp <= to_ns
+        from the archive and the memory
+        """
+        bot_memory = self.bot_memory.get_snapshot()
+        first_seq = bot_memory.messages.first_seq()
+        archived = [
+            message.to_dict()
+            for seq, _, message in self.archive.read_range(start_ns, to_ns)
+            # still in the memory if the drop was not stored before a crash
+            if seq < first_seq
+        ]
+        return archived + bot_memory.get_messages_in_range(start_ns, to_ns)
+
+    def search_memory(self, query: str, limit: int) -> list[SearchHitDict]:
+        """
+        Returns summaries, the mind map and messages matching all words
+        of the query, newest messages first.
+        A query in double quotes matches the words as a phrase.
+        """
+        if self.search_index is None:
+            return self._scan_memory(query, limit)
+        hits = self.search_index.search_summaries(query, limit)
+        for seq in self.search_index.search_messages(query, limit - len(hits)):
+            message = self.bot_memory.get_message(seq)
+            if message is None:
+                # archived after the index was last saved
+                continue
+            hits.append(
+                {
+                    "kind": "message",
+                    "seq": seq,
+                    "role": message.role.value,
+                    "period": None,
+                    "start_time": None,
+                    "content": message.content,
+                }
+            )
+        return hits
+
+    def index_vectors(self, batch_size: int = 1024) -> int:
+        """
+        Embeds the next batch of messages for get_relevant_memories,
+        returns how many were embedded, 0 once the index is up to date.
+        Reads a snapshot of the memory, so it can run on a worker thread
+        """
+        if self.vector_index is None:
+            return 0
+        bot_memory = self.bot_memory.get_snapshot()
+        embedded = self.vector_index.build_step(bot_memory, batch_size)
+        if not embedded:
+            self.vector_index.index_summaries(bot_memory)
+            self.vector_index.save()
+        return embedded
+
+    def get_relevant_memories(
+        self, text: str, k: int, before_seq: int | None = None
+    ) -> list[SearchHitDict]:
+        """
+        Returns the k messages and summaries most similar to text,
+        most similar first, only messages older than before_seq
+        """
+        if self.vector_index is None or k <= 0:
+            return []
+        messages, summaries = self.vector_index.search(text, k, before_seq)
+        scored: list[tuple[float, SearchHitDict]] = []
+        for seq, score in messages:
+            message = self.bot_memory.get_message(seq)
+            if message is None:
+                continue
+            scored.append(
+                (
+                    score,
+                    {
+                        "kind": "message",
+                        "seq": seq,
+                        "role": message.role.value,
+                        "period": None,
+                        "start_time": None,
+                        "content": message.content,
+                    },
+                )
+            )
+        for period, start_time, score in summaries:
+            summary = self.bot_memory.get_periodic_summary(period, start_time)
+            if summary is None:
+                continue
+            scored.append(
+                (
+                    score,
+                    {
+                        "kind": "summary",
+                        "seq": None,
+                        "role": None,
+                        "period": period.value,
+                        "start_time": start_time,
+                        "content": summary.summary_text,
+                    },
+                )
+            )
+        scored.sort(key=lambda hit: hit[0], reverse=True)
+        return [hit for _, hit in scored[:k]]
+
+    def _scan_memory(self, query: str, limit: int) -> list[SearchHitDict]:
+        """Searches the messages one by one while the index is disabled."""
+        terms = set(tokenize(query))
+        hits: list[SearchHitDict] = []
+        if not terms:
+            return hits
+        for seq, message in reversed(self.bot_memory.get_messages_from(0)):
+            if len(hits) >= limit:
+                break
+            if terms.issubset(tokenize(message.content)):
+                hits.append(
+                    {
+                        "kind": "message",
+                        "seq": seq,
+                        "role": message.role.value,
+                        "period": None,
+                        "start_time": None,
+                        "content": message.content,
+                    }
+                )
+        return hits
+
+    def _write_data(self) -> None:
+        """Store both config and memory data."""
+        self._store_config()
+        self._store_memory()
+        if self.search_index:
+            # the index is rebuilt from the memory, so it is saved seldom
+            self.search_index.save(min_unsaved=SEARCH_INDEX_SAVE_MESSAGES)
+        self.files.sync()
+
     def _load_config(self) -> None:
         """Load configuration from config.json."""
         if not self.config_path.is_file():
@@ -67,53 +441,90 @@ class Storage:
             self.bot_config = Config.from_default()
             return
 
-        with open(self.config_path, "r", encoding="utf-8") as f:
-            try:
-                config_data = json.load(f)
-                self.bot_config = Config.from_dict(config_data)
-                self.logger.info(
-                    f"Config loaded successfully from {self.config_path}"
-                )
-            except json.JSONDecodeError as e:
-                raise ValueError(f"Invalid JSON in config file: {e}") from e
+        self.config_data = self.config_path.read_bytes()
+        try:
+            config_data = json.loads(self.config_data)
+            self.bot_config = Config.from_dict(config_data)
+            self.logger.info(
+                f"Config loaded successfully from {self.config_path}"
+            )
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON in config file: {e}") from e
 
     def _store_config(self) -> None:
-        """Store configuration to config.json."""
+        """
+        Store configuration to config.json if it differs from the file.
+        The config is small, so it is serialized and compared, which also
+        catches dicts changed in place and defaults filled in on load.
+        """
         if self.bot_config is None:
             raise ValueError("bot_config is not loaded and cannot be stored.")
 
-        with open(self.config_path, "w", encoding="utf-8") as f:
-            json.dump(self.bot_config.to_dict(), f, indent=4)
-            self.logger.info(
-                f"Config stored successfully to {self.config_path}"
-            )
+        dirty_fields = self.bot_config.drain_dirty_fields()
+        data = json.dumps(self.bot_config.to_dict(), indent=4).encode("utf-8")
+        if data == self.config_data:
+            self.stats.skipped_writes += 1
+            self.stats.bytes_not_written += len(data)
+            return
+        self.files.write_atomic(self.config_path, data)
+        self.config_data = data
+        self.stats.writes += 1
+        self.stats.bytes_written += len(data)
+        self.logger.info(
+            f"Config stored successfully to {self.config_path}: {', '.join(sorted(dirty_fields)) or 'changed in place'}"
+        )
 
     def _load_memory(self) -> None:
-        """Load bot memory from bot_memory.json."""
-        if not self.memory_path.is_file():
-            self.logger.warning(
-                f"Memory file not found at {self.memory_path}. Initializing empty memory."
+        """Load bot memory with the engine selected in the config."""
+        self.search_index = None
+        self.files = DurableFiles(self.bot_config.durability)
+        self.memory_engine = self._create_memory_engine()
+        self.bot_memory = self.memory_engine.load()
+        self.archive = MessageArchive(
+            self.data_dir / "archive", self.files, self.stats
+        )
+        # never hand out a seq again that is already archived
+        self.bot_memory.messages.next_seq = max(
+            self.bot_memory.messages.next_seq, self.archive.archived_seq + 1
+        )
+        if self.bot_config.search_index:
+            self.search_index = MemorySearchIndex(
+                self.data_dir / "search_index.bin", self.files
             )
-            self.bot_memory = BotMemory()
-            return
+            self.search_index.load()
+            self.search_index.attach(self.bot_memory)
+        self.vector_index = None
+        if self.bot_config.vector_index:
+            self.vector_index = MemoryVectorIndex(
+                self.data_dir / "vector_index.npz",
+                self.files,
+                self.bot_config.embedding_dimensions,
+            )
+            self.vector_index.load()
+            if (
+                not self.bot_memory.backend
+                and self.vector_index.next_seq > self.bot_memory.messages.next_seq
+            ):
+                # the memory lost messages the index already embedded
+                self.vector_index.clear()
+        self.bot_memory.publish()
 
-        with open(self.memory_path, "r", encoding="utf-8") as f:
-            try:
-                memory_data = json.load(f)
-                self.bot_memory = BotMemory.from_dict(memory_data)
-                self.logger.info(
-                    f"Bot memory loaded successfully from {self.memory_path}"
-                )
-            except json.JSONDecodeError as e:
-                raise ValueError(f"Invalid JSON in memory file: {e}") from e
+    def _create_memory_engine(self) -> MemoryEngine:
+        storage_mode = self.bot_config.storage_mode
+        self.logger.info(
+            f"Using {storage_mode.value} memory storage engine with {self.bot_config.durability.value} durability"
+        )
+        engine_class: type[MemoryEngine] = JsonMemoryEngine
+        if storage_mode == StorageModes.SQLITE:
+            engine_class = SqliteMemoryEngine
+        elif storage_mode == StorageModes.WAL:
+            engine_class = WalMemoryEngine
+        return engine_class(
+            self.data_dir, self.bot_config, self.stats, self.files
+        )
 
     def _store_memory(self) -> None:
-        """Store bot memory to bot_memory.json."""
+        """Store bot memory with the selected engine."""
         if self.bot_memory is None:
             raise ValueError("bot_memory is not loaded and cannot be stored.")
-
-        with open(self.memory_path, "w", encoding="utf-8") as f:
-            json.dump(self.bot_memory.to_dict(), f, indent=4)
-            self.logger.info(
-                f"Bot memory stored successfully to {self.memory_path}"
-            )
+        self.memory_engine.store(self.bot_memory)
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Callable
+
+from app.lib.logger import setup_logger
+
+
+class StorageFlusher:
+    """
+    Write-behind flusher for the storage.
+    Mutations only mark the storage dirty, a background thread coalesces
+    everything marked within flush_interval_seconds into a single write.
+    The write happens earlier once flush_max_pending_bytes are pending.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[], None],
+        flush_interval_seconds: float,
+        flush_max_pending_bytes: int,
+    ) -> None:
+        self.logger = setup_logger(
+            "StorageFlusher",
+            logging.DEBUG,
+        )
+        self.write: Callable[[], None] = write
+        self.flush_interval_seconds: float = flush_interval_seconds
+        self.flush_max_pending_bytes: int = flush_max_pending_bytes
+        self.condition = threading.Condition()
+        # serializes writes from the flusher thread and explicit flushes
+        self.write_lock = threading.Lock()
+        self.dirty_since: float | None = None
+        self.pending_bytes: int = 0
+        # every mark_dirty call gets a generation, a write covers all
+        # generations that were marked before it started
+        self.dirty_generation: int = 0
+        self.flushed_generation: int = 0
+        self.mutation_count: int = 0
+        self.write_count: int = 0
+        self.stopped: bool = False
+        self.thread: threading.Thread | None = None
+        if flush_interval_seconds > 0:
+            self.thread = threading.Thread(
+                target=self._flush_loop, name="StorageFlusher", daemon=True
+            )
+            self.thread.start()
+
+    def mark_dirty(self, pending_bytes: int = 0) -> None:
+        """
+        Schedule a write, pending_bytes is the size of the unwritten changes
+        """
+        self.mark(pending_bytes)
+        if not self.thread:
+            self.flush()
+
+    def mark(self, pending_bytes: int = 0) -> int:
+        """
+        Records a change without writing it, even without a flusher thread,
+        returns the generation a write has to reach to cover it
+        """
+        with self.condition:
+            self.dirty_generation += 1
+            self.mutation_count += 1
+            self.pending_bytes = max(self.pending_bytes, pending_bytes)
+            if self.dirty_since is None:
+                self.dirty_since = time.monotonic()
+            self.condition.notify_all()
+            return self.dirty_generation
+
+    def flush(self) -> None:
+        """
+        Write all pending changes now and return once they are on disk
+        """
+        with self.condition:
+            if self.flushed_generation >= self.dirty_generation:
+                return
+        self._write()
+
+    async def flushed(self) -> None:
+        """
+        Wait until every change marked before the call is written
+        """
+        with self.condition:
+            generation = self.dirty_generation
+        await asyncio.get_running_loop().run_in_executor(
+            None, self.wait_flushed, generation
+        )
+
+    def wait_flushed(self, generation: int) -> None:
+        with self.condition:
+            while self.flushed_generation < generation and not self.stopped:
+                self.condition.wait()
+
+    def stop(self) -> None:
+        self.flush()
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+
+    def _write(self) -> None:
+        with self.write_lock:
+            with self.condition:
+                generation = self.dirty_generation
+                self.dirty_since = None
+                self.pending_bytes = 0
+            if generation <= self.flushed_generation:
+                return
+            self.write()
+            with self.condition:
+                self.write_count += 1
+                self.flushed_generation = generation
+                self.condition.notify_all()
+
+    def _flush_loop(self) -> None:
+        while True:
+            with self.condition:
+                while self.dirty_since is None and not self.stopped:
+                    self.condition.wait()
+                if self.stopped:
+                    return
+                # wait for the window to close unless enough bytes piled up
+                while (
+                    self.dirty_since is not None
+                    and self.pending_bytes < self.flush_max_pending_bytes
+                ):
+                    remaining = (
+                        self.dirty_since
+                        + self.flush_interval_seconds
+                        - time.monotonic()
+                    )
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                if self.dirty_since is None:
+                    # flushed explicitly while we were waiting
+                    continue
+            try:
+                self._write()
+            except Exception as e:
+                self.logger.exception(f"Background flush failed: {e}")
+                with self.condition:
+                    # retry with the next window
+                    self.dirty_since = self.dirty_since or time.monotonic()
+                continue
+            self.logger.debug(
+                f"Flushed storage, {self.mutation_count} mutations in {self.write_count} writes so far"
+            )
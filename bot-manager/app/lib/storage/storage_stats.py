@@ -0,0 +1,58 @@
+from dataclasses import asdict, dataclass
+from typing import TypedDict
+
+
+class StorageStatsDict(TypedDict):
+    writes: int
+    skipped_writes: int
+    bytes_written: int
+    bytes_not_written: int
+    bytes_not_serialized: int
+    archived_messages: int
+    archive_segments_read: int
+    archive_bytes_raw: int
+    archive_bytes_stored: int
+    load_seconds: float
+    materialize_seconds: float
+    evicted_messages: int
+    evicted_bytes: int
+    evicted_summaries: int
+    deleted_archive_segments: int
+    deleted_archive_bytes: int
+
+
+@dataclass
+class StorageStats:
+    """Counters for what the storage wrote and what dirty tracking avoided"""
+
+    writes: int = 0
+    # files that were left untouched because nothing in them changed
+    skipped_writes: int = 0
+    bytes_written: int = 0
+    # size of the untouched files
+    bytes_not_written: int = 0
+    # unchanged memory sections that were reused instead of serialized again
+    bytes_not_serialized: int = 0
+    # messages moved out of the hot memory into archive segments
+    archived_messages: int = 0
+    # segments mapped to answer range reads
+    archive_segments_read: int = 0
+    # size of the archived message bodies and of the segments storing them
+    archive_bytes_raw: int = 0
+    archive_bytes_stored: int = 0
+    # time spent loading config and memory at startup
+    load_seconds: float = 0.0
+    # time spent loading older memory parts after a lazy startup
+    materialize_seconds: float = 0.0
+    # messages the retention policies removed from the memory
+    # and the size of their contents
+    evicted_messages: int = 0
+    evicted_bytes: int = 0
+    # summaries removed after a monthly summary covered them
+    evicted_summaries: int = 0
+    # expired archive segments and their size on disk
+    deleted_archive_segments: int = 0
+    deleted_archive_bytes: int = 0
+
+    def to_dict(self) -> StorageStatsDict:
+        return StorageStatsDict(**asdict(self))  # type: ignore
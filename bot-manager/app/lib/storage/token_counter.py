@@ -0,0 +1,17 @@
+import re
+
+# word pieces of up to four characters and single symbols,
+# close to what BPE tokenizers produce for english text
+TOKEN_PIECE = re.compile(r"\w{1,4}|[^\w\s]")
+# role and separators every chat message adds to the request
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def count_tokens(text: str) -> int:
+    """Estimates the tokens of text without a model specific tokenizer"""
+    return len(TOKEN_PIECE.findall(text))
+
+
+def count_message_tokens(content: str) -> int:
+    """Estimates the tokens a chat message with content adds to a request"""
+    return count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
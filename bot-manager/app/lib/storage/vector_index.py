@@ -0,0 +1,280 @@
+import io
+import logging
+import threading
+import zlib
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import numpy.typing as npt
+
+from app.lib.logger import setup_logger
+from app.lib.storage.bot_memory import BotMemory, Periods
+from app.lib.storage.durable_files import DurableFiles
+from app.lib.storage.search_index import tokenize
+
+VECTOR_INDEX_VERSION = 1
+# odd multiplier that mixes the hashes of two neighbouring words
+BIGRAM_MULTIPLIER = 0x9E3779B1
+# hits below this cosine similarity are not related to the query
+MIN_SCORE = 0.1
+
+
+class HashingEmbedder:
+    """
+    Embeds texts without a model or network: every word and pair of
+    neighbouring words is hashed into one of dimensions buckets with a
+    random sign, the counts are damped and the vector normalized.
+    Texts sharing words end up with a high cosine similarity.
+    """
+
+    def __init__(self, dimensions: int) -> None:
+        self.dimensions: int = dimensions
+        # crc32 of every word seen, hashing dominates embedding otherwise
+        self.word_hashes: dict[str, int] = {}
+
+    def _hash(self, word: str) -> int:
+        word_hash = self.word_hashes.get(word)
+        if word_hash is None:
+            word_hash = self.word_hashes[word] = zlib.crc32(
+                word.encode("utf-8")
+            )
+        return word_hash
+
+    def embed(self, texts: list[str]) -> npt.NDArray[np.float32]:
+        """Returns one normalized row per text"""
+        hashes: list[int] = []
+        rows: list[int] = []
+        for row, text in enumerate(texts):
+            words = tokenize(text)
+            hashes += [self._hash(word) for word in words]
+            rows += [row] * len(words)
+        word_hashes = np.array(hashes, dtype=np.uint64)
+        word_rows = np.array(rows, dtype=np.int64)
+        # a pair of words is only a bigram when both are in the same text
+        same_text = word_rows[1:] == word_rows[:-1]
+        bigram_hashes = (
+            word_hashes[:-1][same_text] * np.uint64(BIGRAM_MULTIPLIER)
+            ^ word_hashes[1:][same_text]
+        ) & np.uint64(0xFFFFFFFF)
+        all_hashes = np.concatenate([word_hashes, bigram_hashes])
+        all_rows = np.concatenate([word_rows, word_rows[1:][same_text]])
+        buckets = (all_hashes >> np.uint64(1)) % np.uint64(self.dimensions)
+        signs = np.where(all_hashes & np.uint64(1), 1.0, -1.0)
+        counts = np.bincount(
+            all_rows * self.dimensions + buckets.astype(np.int64),
+            weights=signs,
+            minlength=len(texts) * self.dimensions,
+        ).reshape(len(texts), self.dimensions)
+        vectors = (np.sign(counts) * np.log1p(np.abs(counts))).astype(
+            np.float32
+        )
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        result: npt.NDArray[np.float32] = vectors / norms
+        return result
+
+
+class VectorIndex:
+    """
+    Brute force cosine similarity search over a growing matrix of
+    normalized vectors, one matrix product per query.
+    Rows are appended in doc order into a buffer that doubles in size.
+    """
+
+    def __init__(self, dimensions: int) -> None:
+        self.dimensions: int = dimensions
+        self.docs: npt.NDArray[np.int64] = np.empty(0, dtype=np.int64)
+        self.vectors: npt.NDArray[np.float32] = np.empty(
+            (0, dimensions), dtype=np.float32
+        )
+        self.count: int = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def add(
+        self,
+        docs: list[int] | npt.NDArray[np.int64],
+        vectors: npt.NDArray[np.float32],
+    ) -> None:
+        needed = self.count + len(docs)
+        if needed > len(self.docs):
+            capacity = max(needed, 2 * len(self.docs), 1024)
+            self.docs = np.resize(self.docs, capacity)
+            self.vectors = np.resize(self.vectors, (capacity, self.dimensions))
+        self.docs[self.count : needed] = docs
+        self.vectors[self.count : needed] = vectors
+        self.count = needed
+
+    def keep(self, mask: npt.NDArray[np.bool_]) -> None:
+        """Keeps the rows where mask is True"""
+        self.docs = self.docs[: self.count][mask]
+        self.vectors = self.vectors[: self.count][mask]
+        self.count = len(self.docs)
+
+    def search(
+        self, query: npt.NDArray[np.float32], k: int
+    ) -> list[tuple[int, float]]:
+        """Returns up to k (doc, score) with the highest scores first"""
+        if not self.count or k <= 0:
+            return []
+        scores = self.vectors[: self.count] @ query
+        k = min(k, self.count)
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [
+            (int(self.docs[row]), float(scores[row]))
+            for row in best
+            if scores[row] >= MIN_SCORE
+        ]
+
+
+class MemoryVectorIndex:
+    """
+    Embeddings of the messages and summaries of the bot memory.
+    Messages are embedded in batches while the bot dreams and stored
+    in vector_index.npz, summaries are few and embedded on the fly.
+    """
+
+    def __init__(self, path: Path, files: DurableFiles, dimensions: int):
+        self.logger = setup_logger(
+            "MemoryVectorIndex",
+            logging.DEBUG,
+        )
+        self.path: Path = path
+        self.files: DurableFiles = files
+        self.embedder: HashingEmbedder = HashingEmbedder(dimensions)
+        self.messages: VectorIndex = VectorIndex(dimensions)
+        # messages below next_seq are embedded
+        self.next_seq: int = 0
+        self.summaries: VectorIndex = VectorIndex(dimensions)
+        self.summary_keys: list[tuple[Periods, int]] = []
+        self.summary_texts: dict[tuple[Periods, int], str] = {}
+        # the latest row of every summary
+        self.summary_rows: dict[tuple[Periods, int], int] = {}
+        self.unsaved: bool = False
+        # the dreaming thread builds while the bot thread searches
+        self.lock: threading.Lock = threading.Lock()
+
+    def load(self) -> None:
+        if not self.path.is_file():
+            return
+        try:
+            with np.load(self.path) as data:
+                version, dimensions, next_seq = data["header"]
+                if (
+                    version != VECTOR_INDEX_VERSION
+                    or dimensions != self.embedder.dimensions
+                ):
+                    raise ValueError("unsupported version or dimensions")
+                self.messages.add(data["docs"], data["vectors"])
+                self.next_seq = int(next_seq)
+        except (ValueError, KeyError, OSError) as e:
+            self.logger.warning(f"Rebuilding the vector index: {e}")
+            self.clear()
+
+    def clear(self) -> None:
+        """Drops the message embeddings, they are rebuilt while dreaming"""
+        with self.lock:
+            self.messages = VectorIndex(self.embedder.dimensions)
+            self.next_seq = 0
+            self.unsaved = True
+
+    def save(self) -> None:
+        if not self.unsaved:
+            return
+        with self.lock:
+            count = self.messages.count
+            buffer = io.BytesIO()
+            np.savez(
+                buffer,
+                header=np.array(
+                    [
+                        VECTOR_INDEX_VERSION,
+                        self.embedder.dimensions,
+                        self.next_seq,
+                    ],
+                    dtype=np.int64,
+                ),
+                docs=self.messages.docs[:count],
+                vectors=self.messages.vectors[:count],
+            )
+            self.unsaved = False
+        self.files.write_atomic(self.path, buffer.getvalue())
+        self.logger.info(f"Vector index stored to {self.path}")
+
+    def build_step(self, bot_memory: BotMemory, batch_size: int) -> int:
+        """
+        Embeds the next batch of messages, returns how many were embedded
+        """
+        messages = bot_memory.get_messages_from(self.next_seq, batch_size)
+        if not messages:
+            return 0
+        vectors = self.embedder.embed(
+            [message.content for _, message in messages]
+        )
+        with self.lock:
+            self.messages.add([seq for seq, _ in messages], vectors)
+            self.next_seq = messages[-1][0] + 1
+            self.unsaved = True
+        return len(messages)
+
+    def drop_messages_before(self, seq: int) -> None:
+        with self.lock:
+            count = self.messages.count
+            if count and self.messages.docs[0] < seq:
+                self.messages.keep(self.messages.docs[:count] >= seq)
+                self.unsaved = True
+
+    def index_summaries(self, bot_memory: BotMemory) -> int:
+        """Embeds new and changed summaries, returns how many"""
+        changed = [
+            summary
+            for period in Periods
+            for summary in bot_memory.get_periodic_summaries(period)
+            if self.summary_texts.get((period, summary.period_start_date))
+            != summary.summary_text
+        ]
+        if not changed:
+            return 0
+        vectors = self.embedder.embed(
+            [summary.summary_text for summary in changed]
+        )
+        with self.lock:
+            keys = [
+                (summary.period, summary.period_start_date)
+                for summary in changed
+            ]
+            rows = list(
+                range(len(self.summary_keys), len(self.summary_keys) + len(keys))
+            )
+            for key, row, summary in zip(keys, rows, changed):
+                self.summary_texts[key] = summary.summary_text
+                # replaced summaries keep their old row, search skips it
+                self.summary_rows[key] = row
+            self.summaries.add(rows, vectors)
+            self.summary_keys += keys
+        return len(changed)
+
+    def search(
+        self, text: str, k: int, before_seq: Optional[int] = None
+    ) -> tuple[list[tuple[int, float]], list[tuple[Periods, int, float]]]:
+        """
+        Returns the k messages (seq, score) and summaries
+        (period, start time, score) most similar to text
+        """
+        query = self.embedder.embed([text])[0]
+        with self.lock:
+            messages = [
+                (seq, score)
+                # ask for more, newer messages are filtered out below
+                for seq, score in self.messages.search(query, 2 * k)
+                if before_seq is None or seq < before_seq
+            ][:k]
+            summaries = [
+                (*self.summary_keys[row], score)
+                for row, score in self.summaries.search(query, 2 * k)
+                if self.summary_rows[self.summary_keys[row]] == row
+            ]
+        return messages, summaries[:k]
@@ -0,0 +1,72 @@
+import json
+import os
+import logging
+from pathlib import Path
+from typing import Iterator
+
+from app.lib.logger import setup_logger
+from app.lib.storage.bot_memory import MemoryRecordDict
+from app.lib.storage.durable_files import DurableFiles
+
+
+class WriteAheadLog:
+    """
+    Append-only log of bot memory mutations, stored as one JSON record per line
+    """
+
+    def __init__(self, path: Path, files: DurableFiles) -> None:
+        self.logger = setup_logger(
+            "WriteAheadLog",
+            logging.DEBUG,
+        )
+        self.path: Path = path
+        self.files: DurableFiles = files
+        self.record_count: int = 0
+
+    def append(self, records: list[MemoryRecordDict]) -> None:
+        if not records:
+            return
+        lines = "".join(
+            json.dumps(record, separators=(",", ":")) + "\n"
+            for record in records
+        )
+        self.files.append(self.path, lines.encode("utf-8"))
+        self.record_count += len(records)
+
+    def read(self) -> Iterator[MemoryRecordDict]:
+        """
+        Yields all records in the log. A torn last line from a crash is
+        skipped and cut off the log, records appended later would be
+        written onto its end otherwise
+        """
+        self.record_count = 0
+        if not self.path.is_file():
+            return
+        # offset after the last complete line
+        end = 0
+        with open(self.path, "rb") as f:
+            for line_number, line in enumerate(f, start=1):
+                if not line.endswith(b"\n"):
+                    self.logger.warning(
+                        f"Skipping torn record on line {line_number} of {self.path}"
+                    )
+                    break
+                end += len(line)
+                if not line.strip():
+                    continue
+                try:
+                    record: MemoryRecordDict = json.loads(line)
+                except ValueError as e:
+                    self.logger.warning(
+                        f"Skipping corrupt record on line {line_number} of {self.path}: {e}"
+                    )
+                    continue
+                self.record_count += 1
+                yield record
+        if self.path.stat().st_size > end:
+            os.truncate(self.path, end)
+
+    def truncate(self) -> None:
+        with open(self.path, "w", encoding="utf-8"):
+            pass
+        self.record_count = 0
@@ -0,0 +1,223 @@
+import logging
+import re
+from abc import abstractmethod
+from collections import Counter
+from typing import TYPE_CHECKING
+
+from app.lib.logger import setup_logger
+from app.lib.storage.bot_memory import BotMemory, PeriodicSummary, Periods
+
+if TYPE_CHECKING:
+    from app.lib.storage.storage import Storage
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+WORD = re.compile(r"\w+")
+STOP_WORDS = frozenset(
+    "the and for are but not you your with this that have from they will"
+    " was were what when where which who how can all any our out has had"
+    " his her its into than then them there these those about just".split()
+)
+# the summaries a period is rolled up from
+ROLLUP_SOURCES: dict[Periods, Periods] = {
+    Periods.WEEKLY: Periods.DAILY,
+    Periods.MONTHLY: Periods.DAILY,
+    Periods.YEARLY: Periods.MONTHLY,
+}
+
+
+class Summarizer:
+    @abstractmethod
+    def summarize(self, texts: list[str], max_chars: int) -> str:
+        """
+        Returns a summary of the texts with at most max_chars characters
+        """
+
+
+class ExtractiveSummarizer(Summarizer):
+    """
+    Picks the sentences that contain the most frequent words,
+    summarizes without calling the model
+    """
+
+    def summarize(self, texts: list[str], max_chars: int) -> str:
+        sentences: list[str] = []
+        seen: set[str] = set()
+        for text in texts:
+            for sentence in SENTENCE_END.split(text):
+                sentence = " ".join(sentence.split())
+                if sentence and sentence not in seen:
+                    seen.add(sentence)
+                    sentences.append(sentence)
+        if not sentences:
+            return ""
+        words = [
+            [
+                word
+                for word in WORD.findall(sentence.lower())
+                if len(word) > 2 and word not in STOP_WORDS
+            ]
+            for sentence in sentences
+        ]
+        frequencies = Counter(word for sentence in words for word in sentence)
+
+        def score(position: int) -> float:
+            if not words[position]:
+                return 0
+            return sum(frequencies[word] for word in words[position]) / len(
+                words[position]
+            )
+
+        picked: list[int] = []
+        length = 0
+        for position in sorted(range(len(sentences)), key=score, reverse=True):
+            if length + len(sentences[position]) + 1 > max_chars:
+                continue
+            picked.append(position)
+            length += len(sentences[position]) + 1
+        if not picked:
+            return sentences[0][:max_chars]
+        # keep the order of the conversation
+        return " ".join(sentences[position] for position in sorted(picked))
+
+
+class SummaryPipeline:
+    """
+    Turns messages into daily summaries and rolls those up into weekly,
+    monthly and yearly ones, one period per step.
+    The stored summaries are the checkpoint: every step continues after
+    the latest summary of its period, so the pipeline resumes after a
+    restart and never summarizes a period twice.
+    next_summary() only reads a snapshot of the memory, so it can run on
+    a worker thread while the loop goes on, store() then applies it.
+    """
+
+    def __init__(
+        self,
+        storage: "Storage",
+        summarizer: Summarizer,
+        max_summary_chars: int = 2000,
+    ) -> None:
+        self.logger = setup_logger(
+            "SummaryPipeline",
+            logging.DEBUG,
+        )
+        self.storage: "Storage" = storage
+        self.summarizer: Summarizer = summarizer
+        self.max_summary_chars: int = max_summary_chars
+
+    def run_step(self, now: int) -> bool:
+        """
+        Summarizes the next finished period, returns False once
+        everything before now is summarized
+        """
+        summary = self.next_summary(now)
+        if summary is None:
+            return False
+        self.store(summary)
+        self.storage.store_data()
+        return True
+
+    def next_summary(self, now: int) -> PeriodicSummary | None:
+        """
+        Returns the summary of the next finished period without storing
+        it, None once everything before now is summarized
+        """
+        bot_memory = self.storage.bot_memory.get_snapshot()
+        summary = self._summarize_next_day(bot_memory, now)
+        if summary is not None:
+            return summary
+        for period in ROLLUP_SOURCES:
+            summary = self._roll_up_next(bot_memory, period, now)
+            if summary is not None:
+                return summary
+        return None
+
+    def store(self, summary: PeriodicSummary) -> None:
+        self.storage.bot_memory.set_periodic_summary(
+            interval=summary.period,
+            start_time=summary.period_start_date,
+            summary=summary.summary_text,
+        )
+        self.logger.info(
+            f"Stored {summary.period.value} summary starting at {summary.period_start_date}"
+        )
+
+    def _next_message_time(self, bot_memory: BotMemory) -> int | None:
+        return bot_memory.get_next_message_time(
+            bot_memory.get_summarized_until() * 1_000_000_000
+        )
+
+    def _summarize_next_day(
+        self, bot_memory: BotMemory, now: int
+    ) -> PeriodicSummary | None:
+        next_message_ns = self._next_message_time(bot_memory)
+        if next_message_ns is None:
+            return None
+        day_start = Periods.DAILY.start_of(next_message_ns // 1_000_000_000)
+        day_end = Periods.DAILY.end_of(day_start)
+        if day_end > now:
+            return None
+        messages = bot_memory.get_messages_in_range(
+            day_start * 1_000_000_000, day_end * 1_000_000_000 - 1
+        )
+        summary = self.summarizer.summarize(
+            [message["content"] for message in messages],
+            self.max_summary_chars,
+        )
+        return PeriodicSummary(
+            period=Periods.DAILY,
+            period_start_date=day_start,
+            summary_text=summary,
+        )
+
+    def _summarized_until(
+        self, bot_memory: BotMemory, period: Periods, now: int
+    ) -> int:
+        """
+        Returns the time before which every period is summarized
+        or has no messages
+        """
+        source = ROLLUP_SOURCES.get(period)
+        if source:
+            return period.start_of(
+                self._summarized_until(bot_memory, source, now)
+            )
+        today = Periods.DAILY.start_of(now)
+        next_message_ns = self._next_message_time(bot_memory)
+        if next_message_ns is None:
+            return today
+        return min(
+            today, Periods.DAILY.start_of(next_message_ns // 1_000_000_000)
+        )
+
+    def _roll_up_next(
+        self, bot_memory: BotMemory, period: Periods, now: int
+    ) -> PeriodicSummary | None:
+        source = ROLLUP_SOURCES[period]
+        latest = bot_memory.get_latest_periodic_summary(period, now)
+        search_from = period.end_of(latest.period_start_date) if latest else 0
+        source_until = self._summarized_until(bot_memory, source, now)
+        sources = [
+            summary
+            for summary in bot_memory.get_periodic_summaries_between(
+                source, search_from, source_until
+            )
+            if summary.period_start_date >= search_from
+        ]
+        if not sources:
+            return None
+        start = period.start_of(sources[0].period_start_date)
+        end = period.end_of(start)
+        if end > source_until:
+            return None
+        summary = self.summarizer.summarize(
+            [
+                summary.summary_text
+                for summary in sources
+                if summary.period_start_date < end
+            ],
+            self.max_summary_chars,
+        )
+        return PeriodicSummary(
+            period=period, period_start_date=start, summary_text=summary
+        )
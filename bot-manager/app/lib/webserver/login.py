@@ -1,7 +1,8 @@
 import logging
+from functools import wraps
 from typing import TYPE_CHECKING, Any, Callable, TypedDict, TypeVar, cast
 
-from flask import request
+from flask import current_app, request
 from flask_login import login_required  # type: ignore
 from flask_login import login_user  # type: ignore
 from flask_login import (  # type: ignore
@@ -34,25 +35,26 @@ class WebLoginManager:
 
     def __init__(self, dev_mode: bool) -> None:
         self.dev_mode: bool = False  #  dev_mode
+        # sessions log in to one bot, the id of the user is the bot id
+        self.user_id: str = ""
 
     def init_login(self, bot: "BotManager") -> None:
         path_prefix = "/api"
-        self.login_manager = LoginManager(bot.web_server.app)
-        self.login_manager.login_view = (  # type: ignore
-            'login'  # Redirect to login if unauthorized
+        routes = bot.web_server.app
+        self.user_id = bot.id
+        self.login_manager = bot.web_server.server_app.login_manager  # type: ignore
+        # Redirect to login of the bot if unauthorized
+        self.login_manager.blueprint_login_views[routes.name] = (  # type: ignore
+            f"{routes.name}.login"
         )
         self.logger = setup_logger(
             "BotManager",
             logging.DEBUG,
         )
 
-        @self.login_manager.user_loader  # type: ignore
-        def load_user(user_id: str) -> User | None:  # type: ignore
-            return User(user_id) if user_id == "admin" else None
-
-        @bot.web_server.app.route(f'{path_prefix}/auth-check', methods=['GET'])
+        @routes.route(f'{path_prefix}/auth-check', methods=['GET'])
         def auth_check():  # type: ignore
-            logged_in = cast(User, current_user).is_authenticated
+            logged_in = self.is_logged_in()
             return {
                 "loggedIn": logged_in,
                 "requiresSetup": (
@@ -62,7 +64,7 @@ class WebLoginManager:
                 ),
             }, 200
 
-        @bot.web_server.app.route(f'{path_prefix}/login', methods=['POST'])
+        @routes.route(f'{path_prefix}/login', methods=['POST'])
         def login() -> tuple[dict[str, None | bool | str], int]:  # type: ignore
             user_data = cast(
                 UserLoginRequest,
@@ -74,7 +76,7 @@ class WebLoginManager:
                 == bot.storage.bot_config.web_interface_api_key
             ) or not bot.storage.bot_config.web_interface_api_key:
                 self.logger.info("Successful login")
-                user = User(id='admin')
+                user = User(id=self.user_id)
                 login_user(user)
                 self.logger.info("Web fronted logged in")
                 return {"success": True}, 200
@@ -84,21 +86,32 @@ class WebLoginManager:
                 200,
             )
 
-        @bot.web_server.app.route(f'{path_prefix}/logout', methods=["GET"])
+        @routes.route(f'{path_prefix}/logout', methods=["GET"])
         @login_required
         def logout():  # type: ignore
             logout_user()
             self.logger.info("Web fronted logged out")
             return {"success": True}, 200
 
+    def is_logged_in(self) -> bool:
+        user = cast(User, current_user)
+        return bool(user.is_authenticated and user.get_id() == self.user_id)
+
     def conditional_login_required(
         self,
     ) -> Callable[[F], F]:
         def decorator(func: F) -> F:
             if self.dev_mode:
                 return func
-            else:
-                return cast(F, login_required(func))
+
+            @wraps(func)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                # a login to another bot of the host does not count
+                if not self.is_logged_in():
+                    return current_app.login_manager.unauthorized()  # type: ignore
+                return func(*args, **kwargs)
+
+            return cast(F, wrapper)
 
         return decorator
 
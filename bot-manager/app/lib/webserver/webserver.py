@@ -1,34 +1,67 @@
 import logging
 from datetime import timedelta
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Container
 
-from flask import Flask
+from flask import Blueprint, Flask
 from flask_cors import CORS
+from flask_login import LoginManager  # type: ignore
 
 from app.lib.logger import setup_logger
-from app.lib.webserver.login import WebLoginManager
+from app.lib.webserver.login import User, WebLoginManager
 
 if TYPE_CHECKING:
     from app.lib.bot_manager import BotManager
 
 
+def create_web_app(bot_ids: Container[str]) -> Flask:
+    """
+    The flask app of a bot, or the one shared by all bots of a BotHost.
+    bot_ids holds the ids of the bots served by the app.
+    """
+    app: Flask = Flask(__name__)
+    app.secret_key = 'supersecretkey'
+    CORS(app, origins=["http://localhost:3000"], supports_credentials=True)
+
+    # Session Configuration
+    app.config['SESSION_COOKIE_SAMESITE'] = 'None'
+    app.config['SESSION_COOKIE_SECURE'] = True  # Needed for SameSite=None
+    app.config['SESSION_PERMANENT'] = True
+    app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=1)
+
+    login_manager = LoginManager(app)
+
+    @login_manager.user_loader  # type: ignore
+    def load_user(user_id: str) -> User | None:
+        # the user id is the id of the bot the session is logged in to
+        if user_id not in bot_ids:
+            return None
+        return User(user_id)
+
+    return app
+
+
 class WebServer:
-    def __init__(self, bot: "BotManager", dev_mode: bool) -> None:
+    def __init__(
+        self, bot: "BotManager", dev_mode: bool, app: Flask | None = None
+    ) -> None:
         self.bot: "BotManager" = bot
         self.logger = setup_logger(
             "WebServer",
             logging.DEBUG,
         )
-        app: Flask = Flask(__name__)
-        app.secret_key = 'supersecretkey'
-        CORS(app, origins=["http://localhost:3000"], supports_credentials=True)
-
-        # Session Configuration
-        app.config['SESSION_COOKIE_SAMESITE'] = 'None'
-        app.config['SESSION_COOKIE_SECURE'] = True  # Needed for SameSite=None
-        app.config['SESSION_PERMANENT'] = True
-        app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=1)
-        self.app: Flask = app
+        # bots of a BotHost share its app, their routes are under /bots/<id>
+        self.shared: bool = app is not None
+        self.server_app: Flask = (
+            app if app is not None else create_web_app({bot.id})
+        )
+        self.url_prefix: str = f"/bots/{bot.id}" if self.shared else ""
+        # plugins add their routes here, they are registered on the
+        # server app once all plugins are initialized
+        self.app: Blueprint = Blueprint(
+            f"bot-{bot.id}" if self.shared else "bot",
+            __name__,
+            url_prefix=self.url_prefix or None,
+        )
         self.login_manager: WebLoginManager = WebLoginManager(dev_mode)
 
     def start_web_server(
@@ -37,14 +70,19 @@ class WebServer:
         self.logger.info(
             f"Starting web server on port: {self.bot.storage.bot_config.web_interface_port}"
         )
-        self.login_manager.init_login(self.bot)
-        self.init_web_server_plugins()
-        self.app.run(
+        self.init_routes()
+        self.server_app.run(
             host="0.0.0.0",
             port=self.bot.storage.bot_config.web_interface_port,
             debug=False,
         )
 
+    def init_routes(self) -> None:
+        """Adds the login and plugin routes of the bot to the server app"""
+        self.login_manager.init_login(self.bot)
+        self.init_web_server_plugins()
+        self.server_app.register_blueprint(self.app)
+
     def init_web_server_plugins(self) -> None:
         """
         Initializes plugins with api's
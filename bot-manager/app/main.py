@@ -1,3 +1,4 @@
+from app.lib.bot_host import BotHost
 from app.lib.bot_manager import BotManager
 
 
@@ -6,3 +7,9 @@ def main(dev_mode: bool) -> None:
     # bot.run_startup_tasks()
     bot.scheduler.start_scheduler()
     bot.web_server.start_web_server()
+
+
+def main_host(dev_mode: bool, bots: int, port: int) -> None:
+    host = BotHost(dev_mode=dev_mode)
+    host.load_bots(min_bots=bots)
+    host.start(port=port)
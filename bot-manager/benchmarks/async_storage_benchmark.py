@@ -0,0 +1,103 @@
+"""
+Event loop blocking while a coroutine stores messages, with the flusher
+disabled so every message is written. Storage.store_data() writes on the
+loop, AsyncStorage.commit() waits for the write on the storage I/O thread.
+A LoopMonitor measures how late the loop wakes up meanwhile.
+
+Run from the bot-manager folder: python -m benchmarks.async_storage_benchmark
+"""
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from app.lib.runtime import LoopMonitor
+from app.lib.storage.async_storage import AsyncStorage
+from app.lib.storage.bot_memory import Roles
+from app.lib.storage.config import Config, StorageModes
+from app.lib.storage.storage import Storage
+
+
+def create_storage(data_dir: Path, storage_mode: str, messages: int) -> Storage:
+    config = Config.from_default().to_dict()
+    config["storage"].update(
+        {
+            "flush_interval_seconds": 0,
+            "storage_mode": storage_mode,
+            # the indexes save at exit, after the data_dir is gone
+            "search_index": False,
+            "vector_index": False,
+        }
+    )
+    (data_dir / "config.json").write_text(json.dumps(config), encoding="utf-8")
+    storage = Storage(dev_mode=True, data_dir=data_dir)
+    for number in range(messages):
+        storage.bot_memory.add_message(
+            role=Roles.USER, content=f"message {number} " + "x" * 200
+        )
+    storage.flush()
+    return storage
+
+
+async def store_sync(storage: Storage, writes: int) -> None:
+    for number in range(writes):
+        storage.bot_memory.add_message(role=Roles.USER, content=f"sync {number}")
+        storage.store_data()
+        await asyncio.sleep(0)
+
+
+async def store_async(storage: Storage, writes: int) -> None:
+    async_storage = AsyncStorage(storage)
+    for number in range(writes):
+        storage.bot_memory.add_message(
+            role=Roles.USER, content=f"async {number}"
+        )
+        await async_storage.commit()
+    await async_storage.close()
+
+
+async def measure(label: str, storage: Storage, writes: int, sync: bool) -> None:
+    monitor = LoopMonitor(interval_seconds=0.001, slow_seconds=float("inf"))
+    monitor_task = asyncio.create_task(monitor.run())
+    await asyncio.sleep(0.01)
+    monitor.reset()
+    started = time.perf_counter()
+    if sync:
+        await store_sync(storage, writes)
+    else:
+        await store_async(storage, writes)
+    elapsed = time.perf_counter() - started
+    monitor_task.cancel()
+    stats = monitor.to_dict()
+    print(
+        f"{label:<24} {elapsed / writes * 1000:>8.3f} ms/write"
+        + f"   loop blocked {stats['blocked_seconds'] / elapsed * 100:>5.1f} %"
+        + f"   max block {stats['max_blocked_seconds'] * 1000:>8.3f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--writes", type=int, default=100)
+    parser.add_argument(
+        "--storage-mode",
+        choices=[mode.value for mode in StorageModes],
+        default=StorageModes.JSON.value,
+    )
+    args = parser.parse_args()
+
+    for label, sync in [("Storage.store_data", True), ("AsyncStorage", False)]:
+        with tempfile.TemporaryDirectory() as directory:
+            storage = create_storage(
+                Path(directory), args.storage_mode, args.messages
+            )
+            asyncio.run(measure(label, storage, args.writes, sync))
+            storage.flusher.stop()
+
+
+if __name__ == "__main__":
+    main()
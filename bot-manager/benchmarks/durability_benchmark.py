@@ -0,0 +1,79 @@
+"""
+Write latency of the storage per durability level, for atomic snapshot
+writes and write ahead log appends. In batch mode the storage fsyncs
+once per flush, simulated here by a sync every --batch-size writes.
+
+Run from the bot-manager folder: python -m benchmarks.durability_benchmark
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+from app.lib.storage.config import Durability
+from app.lib.storage.durable_files import DurableFiles
+
+
+def measure(write: Callable[[], None], repeat: int) -> list[float]:
+    latencies: list[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        write()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def report(label: str, latencies: list[float]) -> None:
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(
+        f"{label:<28} p50 {statistics.median(latencies) * 1000:>8.3f} ms"
+        + f"   p99 {p99 * 1000:>8.3f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--snapshot-kb", type=int, default=512)
+    parser.add_argument("--record-bytes", type=int, default=256)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=10)
+    args = parser.parse_args()
+
+    snapshot = b"x" * (args.snapshot_kb * 1024)
+    record = b"r" * (args.record_bytes - 1) + b"\n"
+    with tempfile.TemporaryDirectory() as directory:
+        for durability in Durability:
+            files = DurableFiles(durability)
+            snapshot_path = Path(directory) / f"{durability.value}.json"
+            wal_path = Path(directory) / f"{durability.value}.wal"
+            writes = [0]
+
+            def flush_batch() -> None:
+                writes[0] += 1
+                if writes[0] % args.batch_size == 0:
+                    files.sync()
+
+            def write_snapshot() -> None:
+                files.write_atomic(snapshot_path, snapshot)
+                flush_batch()
+
+            def append_record() -> None:
+                files.append(wal_path, record)
+                flush_batch()
+
+            report(
+                f"{durability.value} snapshot {args.snapshot_kb} KiB",
+                measure(write_snapshot, args.repeat),
+            )
+            report(
+                f"{durability.value} wal append",
+                measure(append_record, args.repeat),
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Compares BotMemory.get_last_n_messages and range reads on the columnar
+message log against sorting all message keys on every call.
+
+Run from the bot-manager folder: python -m benchmarks.message_log_benchmark
+"""
+
+import argparse
+import time
+from typing import Callable
+
+from app.lib.storage.bot_memory import BotMemory, ModelMessage, Roles
+
+
+def build_memory(message_count: int) -> BotMemory:
+    bot_memory = BotMemory()
+    start_ns = time.time_ns() - message_count * 1_000_000_000
+    for i in range(message_count):
+        bot_memory.messages.append(
+            Roles.USER, f"message {i}", start_ns + i * 1_000_000_000
+        )
+    return bot_memory
+
+
+def sorted_last_n(
+    messages: dict[int, ModelMessage], n: int
+) -> list[ModelMessage]:
+    # what get_last_n_messages did on the timestamp keyed dict
+    newest = sorted(messages.keys(), reverse=True)[:n]
+    return [messages[timestamp] for timestamp in sorted(newest)]
+
+
+def measure(label: str, function: Callable[[], object], repeat: int) -> None:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    per_call = (time.perf_counter() - started) / repeat
+    print(f"{label:<40} {per_call * 1_000_000:>12.1f} us/call")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--last-n", type=int, default=5)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    bot_memory = build_memory(args.messages)
+    print(
+        f"built {args.messages} messages in {time.perf_counter() - started:.2f} s"
+    )
+    newest_ns = bot_memory.messages.timestamps_ns[-1]
+    messages_dict = {
+        timestamp_ns // 1_000_000_000: message
+        for _, timestamp_ns, message in bot_memory.messages.entries()
+    }
+
+    measure(
+        "sort all keys of a dict (before)",
+        lambda: sorted_last_n(messages_dict, args.last_n),
+        3,
+    )
+    measure(
+        "get_last_n_messages (message log)",
+        lambda: bot_memory.get_last_n_messages(args.last_n),
+        10_000,
+    )
+    measure(
+        "get_messages_in_range last hour (log)",
+        lambda: bot_memory.get_messages_in_range(
+            newest_ns - 3600 * 1_000_000_000, newest_ns
+        ),
+        1_000,
+    )
+    measure(
+        "add_message (log append)",
+        lambda: bot_memory.add_message(Roles.SYSTEM, "wakeup"),
+        10_000,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Latency of model requests to the local stub server with and without the
+keep-alive connection pool of the ModelClient. Without pooling every
+request opens a new connection, against a real api over TLS the
+handshake adds a few round trips more than measured here.
+
+Run from the bot-manager folder: python -m benchmarks.model_client_benchmark
+"""
+
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+
+from aiohttp import web
+
+from app.lib.model_client import ModelClient
+from app.lib.runtime import Runtime
+from app.lib.storage.bot_memory import ModelMessageDict, Roles
+from app.lib.storage.config import Config
+from benchmarks.stub_model_server import COMPLETIONS_PATH, PEERS, start
+
+
+def serve(
+    host: str, port: int, delay_seconds: float
+) -> tuple[asyncio.AbstractEventLoop, web.AppRunner]:
+    """Runs the stub on its own loop, so it does not compete with the client"""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    runner = asyncio.run_coroutine_threadsafe(
+        start(host, port, delay_seconds), loop
+    ).result()
+    return loop, runner
+
+
+async def measure(
+    client: ModelClient, requests: int, concurrency: int
+) -> list[float]:
+    messages: list[ModelMessageDict] = [
+        {"role": Roles.USER.value, "content": "hello " * 50}
+    ]
+    latencies: list[float] = []
+    queue: asyncio.Queue[int] = asyncio.Queue()
+    for number in range(requests):
+        queue.put_nowait(number)
+
+    async def worker() -> None:
+        while not queue.empty():
+            queue.get_nowait()
+            started = time.perf_counter()
+            await client.complete(messages)
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    await client.close()
+    return latencies
+
+
+def report(label: str, latencies: list[float], connections: int) -> None:
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(
+        f"{label:<14} p50 {statistics.median(latencies) * 1000:>8.3f} ms"
+        + f"   p99 {p99 * 1000:>8.3f} ms   {connections:>5} connections"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--pool-size", type=int, default=8)
+    parser.add_argument("--delay-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    host = "127.0.0.1"
+    loop, runner = serve(host, args.port, args.delay_ms / 1000)
+    config = Config.from_default()
+    config.model_api_url = f"http://{host}:{args.port}{COMPLETIONS_PATH}"
+    config.model_api_key = "stub"
+    runtime = Runtime(model_pool_size=args.pool_size)
+    for label, pooled in [("pooled", True), ("not pooled", False)]:
+        peers = runner.app[PEERS]
+        peers.clear()
+        latencies = runtime.run(
+            measure(
+                ModelClient(config, runtime, pooled=pooled),
+                args.requests,
+                args.concurrency,
+            )
+        )
+        report(label, latencies, len(peers))
+    runtime.stop()
+    asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Hit ratio of the response cache on a simulated bot. Every round the bot
+answers --user-turns user messages, each with a send_message command,
+and then wakes up --idle-wakeups times without activity, looks at its
+empty mind map and goes back to sleep. The stub model answers by the
+last message. Requests are keyed and cached like the standard_api
+plugin does: only the turns of fixed prompts, only answers running a
+command without side effects.
+
+Run from the bot-manager folder: python -m benchmarks.response_cache_benchmark
+"""
+
+import argparse
+import tempfile
+from pathlib import Path
+
+from app.lib.context_builder import ContextBuilder
+from app.lib.model_commands_parser import ModelCommandsParser
+from app.lib.response_cache import ResponseCache
+from app.lib.storage.bot_memory import Roles
+from app.lib.storage.storage import Storage
+from plugins.bots.standard_api.main import CACHEABLE_COMMANDS
+from profiles.default import Profile
+
+
+def stub_model(profile: Profile, content: str) -> str:
+    if content == profile.no_activity:
+        return "get_mind_map()"
+    if content.startswith("user message"):
+        return f'send_message(message="re: {content}", receiver_room_id=1)'
+    return "timeout(3600)"
+
+
+def simulate(
+    data_dir: Path, rounds: int, user_turns: int, idle_wakeups: int
+) -> tuple[ResponseCache, int]:
+    """Returns the cache and how many requests the model answered"""
+    storage = Storage(dev_mode=True, data_dir=data_dir)
+    profile = Profile()
+    context_builder = ContextBuilder(storage, profile)
+    cache = ResponseCache(max_entries=1000, ttl_seconds=86400)
+    config = storage.bot_config
+    fixed_prompts = (
+        profile.get_initial_prompt(config.bot_name),
+        profile.no_activity,
+        profile.mind_map_empty,
+        profile.summary_stored,
+    )
+    model_requests = 0
+
+    def turn(content: str, role: Roles = Roles.SYSTEM) -> str:
+        nonlocal model_requests
+        storage.bot_memory.add_message(role=role, content=content)
+        context = context_builder.build(
+            system_prompt=profile.get_initial_prompt(config.bot_name),
+            query=content,
+        )
+        cacheable = content in fixed_prompts
+        key = ResponseCache.key(
+            config.model_name,
+            context.messages,
+            {"model_api_url": config.model_api_url},
+        )
+        answer = cache.get(key) if cacheable else None
+        if answer is None:
+            model_requests += 1
+            answer = stub_model(profile, content)
+            command = ModelCommandsParser.get_command_name(answer)
+            if cacheable and command in CACHEABLE_COMMANDS:
+                cache.put(key, answer, 1.0)
+        storage.bot_memory.add_message(role=Roles.ASSISTANT, content=answer)
+        return answer
+
+    for round in range(rounds):
+        for number in range(user_turns):
+            turn(f"user message {round}.{number}", Roles.USER)
+            turn(profile.successfully_sent_message)
+        for _ in range(idle_wakeups):
+            if turn(profile.no_activity) == "get_mind_map()":
+                turn(profile.mind_map_empty)
+    storage.flusher.stop()
+    return cache, model_requests
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--user-turns", type=int, default=5)
+    parser.add_argument("--idle-wakeups", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        cache, model_requests = simulate(
+            Path(data_dir), args.rounds, args.user_turns, args.idle_wakeups
+        )
+    stats = cache.to_dict()
+    print(
+        f"lookups {stats['lookups']}   hits {stats['hits']}"
+        + f"   hit ratio {stats['hit_ratio']:.1%}"
+        + f"   model requests {model_requests}"
+    )
+
+
+if __name__ == "__main__":
+    main()
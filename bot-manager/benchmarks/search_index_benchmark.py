@@ -0,0 +1,112 @@
+"""
+Compares searching the conversation history with the inverted index
+against scanning every message, and measures what indexing costs.
+
+Run from the bot-manager folder: python -m benchmarks.search_index_benchmark
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+from app.lib.storage.bot_memory import BotMemory, Roles
+from app.lib.storage.config import Durability
+from app.lib.storage.durable_files import DurableFiles
+from app.lib.storage.search_index import MemorySearchIndex, tokenize
+
+WORDS = [f"word{i}" for i in range(20_000)]
+
+
+def build_memory(message_count: int) -> BotMemory:
+    bot_memory = BotMemory()
+    start_ns = time.time_ns() - message_count * 1_000_000_000
+    random.seed(1)
+    for i in range(message_count):
+        # zipf like word frequencies, like in real conversations
+        words = [
+            WORDS[min(int(random.paretovariate(1.1)) - 1, len(WORDS) - 1)]
+            for _ in range(12)
+        ]
+        bot_memory.messages.append(
+            Roles.USER, " ".join(words), start_ns + i * 1_000_000_000
+        )
+    return bot_memory
+
+
+def scan(bot_memory: BotMemory, query: str, limit: int) -> list[int]:
+    # what a search without the index has to do
+    terms = set(tokenize(query))
+    seqs: list[int] = []
+    for seq, message in reversed(bot_memory.get_messages_from(0)):
+        if terms.issubset(tokenize(message.content)):
+            seqs.append(seq)
+            if len(seqs) >= limit:
+                break
+    return seqs
+
+
+def measure(label: str, function: Callable[[], object], repeat: int) -> None:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    per_call = (time.perf_counter() - started) / repeat
+    print(f"{label:<40} {per_call * 1_000:>12.3f} ms/call")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    bot_memory = build_memory(args.messages)
+    print(
+        f"built {args.messages} messages in {time.perf_counter() - started:.2f} s"
+    )
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "search_index.bin"
+        search_index = MemorySearchIndex(path, DurableFiles(Durability.NONE))
+        started = time.perf_counter()
+        search_index.attach(bot_memory)
+        # the messages are indexed on the first search
+        search_index.search_messages("word1", 1)
+        print(f"indexed in {time.perf_counter() - started:.2f} s")
+        started = time.perf_counter()
+        search_index.save()
+        print(
+            f"saved {path.stat().st_size / 2**20:.1f} MiB in {time.perf_counter() - started:.2f} s"
+        )
+        started = time.perf_counter()
+        search_index.load()
+        print(f"loaded in {time.perf_counter() - started:.2f} s")
+
+        for label, query in [
+            ("frequent word", "word1"),
+            ("rare word", "word5000"),
+            ("two words", "word2 word40"),
+            ("phrase", '"word1 word2"'),
+        ]:
+            measure(
+                f"scan, {label}",
+                lambda: scan(bot_memory, query, args.limit),
+                1,
+            )
+            measure(
+                f"index, {label}",
+                lambda: search_index.search_messages(query, args.limit),
+                100,
+            )
+        measure(
+            "add_message (with index)",
+            lambda: bot_memory.add_message(Roles.SYSTEM, "wakeup word7"),
+            10_000,
+        )
+
+
+if __name__ == "__main__":
+    main()
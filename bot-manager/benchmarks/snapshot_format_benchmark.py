@@ -0,0 +1,76 @@
+"""
+Load and store time and file size of the JSON snapshot (json.dump with
+indent=4, as the storage writes it) against the binary snapshot.
+
+Run from the bot-manager folder: python -m benchmarks.snapshot_format_benchmark
+"""
+
+import argparse
+import json
+import time
+from typing import Callable
+
+from app.lib.storage.binary_snapshot import BinarySnapshot
+from app.lib.storage.bot_memory import BotMemory, Periods, Roles
+
+ROLE_CYCLE = (Roles.USER, Roles.ASSISTANT, Roles.SYSTEM)
+
+
+def build_memory(message_count: int) -> BotMemory:
+    bot_memory = BotMemory(mind_map="people, places and plans " * 50)
+    start_ns = time.time_ns() - message_count * 1_000_000_000
+    for i in range(message_count):
+        bot_memory.messages.append(
+            ROLE_CYCLE[i % 3],
+            f"message {i} about something that happened today",
+            start_ns + i * 1_000_000_000,
+        )
+    for day in range(365):
+        bot_memory.set_periodic_summary(
+            Periods.DAILY, day * 86400, f"summary of day {day} " * 20
+        )
+    return bot_memory
+
+
+def timed(function: Callable[[], object]) -> tuple[object, float]:
+    started = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--messages", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    args = parser.parse_args()
+
+    print(
+        f"{'messages':>10} {'format':<7} {'store s':>9} {'load s':>9} {'size MiB':>10}"
+    )
+    for message_count in args.messages:
+        bot_memory = build_memory(message_count)
+        json_data, json_store = timed(
+            lambda: json.dumps(bot_memory.to_dict(), indent=4).encode("utf-8")
+        )
+        _, json_load = timed(
+            lambda: BotMemory.from_dict(json.loads(json_data))  # type: ignore
+        )
+        binary_data, binary_store = timed(
+            lambda: BinarySnapshot.encode(bot_memory)
+        )
+        _, binary_load = timed(
+            lambda: BinarySnapshot.decode(binary_data)  # type: ignore
+        )
+        for label, store, load, data in (
+            ("json", json_store, json_load, json_data),
+            ("binary", binary_store, binary_load, binary_data),
+        ):
+            print(
+                f"{message_count:>10} {label:<7} {store:>9.3f} {load:>9.3f}"
+                + f" {len(data) / 1024 / 1024:>10.2f}"  # type: ignore
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Time until the command of a completion can run, waiting for the whole
+completion versus streaming it and detecting the command as soon as its
+closing parenthesis arrives. The stub server sends the command followed
+by --trailing-chars of explanation, one chunk every --chunk-delay-ms.
+
+Run from the bot-manager folder: python -m benchmarks.streaming_benchmark
+"""
+
+import argparse
+import asyncio
+import contextlib
+import statistics
+import threading
+import time
+
+from aiohttp import web
+
+from app.lib.model_client import ModelClient
+from app.lib.model_commands_parser import CommandDetector
+from app.lib.runtime import Runtime
+from app.lib.storage.bot_memory import ModelMessageDict, Roles
+from app.lib.storage.config import Config
+from benchmarks.stub_model_server import COMPLETIONS_PATH, start
+
+COMMAND = 'send_message(message="On my way (see you soon)", receiver_room_id=1)'
+
+
+def serve(
+    host: str, port: int, reply: str, chunk_delay_seconds: float
+) -> tuple[asyncio.AbstractEventLoop, web.AppRunner]:
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    runner = asyncio.run_coroutine_threadsafe(
+        start(host, port, reply=reply, chunk_delay_seconds=chunk_delay_seconds),
+        loop,
+    ).result()
+    return loop, runner
+
+
+async def first_command_complete(
+    client: ModelClient, messages: list[ModelMessageDict]
+) -> str:
+    return await client.complete(messages)
+
+
+async def first_command_streamed(
+    client: ModelClient, messages: list[ModelMessageDict]
+) -> str:
+    detector = CommandDetector()
+    async with contextlib.aclosing(client.stream(messages)) as chunks:
+        async for chunk in chunks:
+            command = detector.feed(chunk)
+            if command is not None:
+                return command
+    return detector.text
+
+
+async def measure(
+    config: Config, runtime: Runtime, repeat: int, stream: bool
+) -> list[float]:
+    client = ModelClient(config, runtime)
+    messages: list[ModelMessageDict] = [
+        {"role": Roles.USER.value, "content": "hello"}
+    ]
+    latencies: list[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        if stream:
+            command = await first_command_streamed(client, messages)
+        else:
+            command = await first_command_complete(client, messages)
+        latencies.append(time.perf_counter() - started)
+        assert command.startswith(COMMAND)
+    await client.close()
+    return latencies
+
+
+def report(label: str, latencies: list[float]) -> None:
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(
+        f"{label:<16} p50 {statistics.median(latencies) * 1000:>8.3f} ms"
+        + f"   p99 {p99 * 1000:>8.3f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--chunk-delay-ms", type=float, default=2.0)
+    parser.add_argument("--trailing-chars", type=int, default=400)
+    args = parser.parse_args()
+
+    host = "127.0.0.1"
+    reply = COMMAND + "\n" + "x" * args.trailing_chars
+    loop, runner = serve(host, args.port, reply, args.chunk_delay_ms / 1000)
+    config = Config.from_default()
+    config.model_api_url = f"http://{host}:{args.port}{COMPLETIONS_PATH}"
+    config.model_api_key = "stub"
+    runtime = Runtime()
+    for label, stream in [("full completion", False), ("streamed", True)]:
+        latencies = runtime.run(measure(config, runtime, args.repeat, stream))
+        report(label, latencies)
+    runtime.stop()
+    asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+
+
+if __name__ == "__main__":
+    main()
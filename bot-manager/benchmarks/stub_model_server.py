@@ -0,0 +1,139 @@
+"""
+Local stand-in for the chat completions api, answers every request with
+the same completion after --delay-ms. Streamed requests get the reply in
+chunks of --chunk-chars, one every --chunk-delay-ms. Point model_api_url
+of a bot at http://127.0.0.1:8089/v1/chat/completions and set any
+model_api_key to run it without a model.
+
+Run from the bot-manager folder: python -m benchmarks.stub_model_server
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from aiohttp import web
+
+COMPLETIONS_PATH = "/v1/chat/completions"
+
+# client addresses seen, one per connection the clients opened
+PEERS = web.AppKey("peers", set[tuple[str, int]])
+
+
+def create_app(
+    delay_seconds: float,
+    reply: str,
+    chunk_delay_seconds: float = 0.0,
+    chunk_chars: int = 4,
+) -> web.Application:
+    async def stream(request: web.Request, model: str) -> web.StreamResponse:
+        response = web.StreamResponse(
+            headers={"Content-Type": "text/event-stream"}
+        )
+        await response.prepare(request)
+        for start in range(0, len(reply), chunk_chars):
+            content = reply[start : start + chunk_chars]
+            chunk = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "delta": {"content": content},
+                        "finish_reason": None,
+                    }
+                ],
+            }
+            try:
+                await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            except ConnectionResetError:
+                # the client has what it needs, stop generating
+                return response
+            if chunk_delay_seconds:
+                await asyncio.sleep(chunk_delay_seconds)
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def complete(request: web.Request) -> web.StreamResponse:
+        request.app[PEERS].add(request.transport.get_extra_info("peername"))  # type: ignore
+        data = await request.json()
+        if delay_seconds:
+            await asyncio.sleep(delay_seconds)
+        if data.get("stream"):
+            return await stream(request, data.get("model", "stub"))
+        if chunk_delay_seconds:
+            # as long as generating the streamed chunks takes
+            chunks = -(-len(reply) // chunk_chars)
+            await asyncio.sleep(chunk_delay_seconds * chunks)
+        return web.json_response(
+            {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": data.get("model", "stub"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {
+                            "role": "assistant",
+                            "content": reply,
+                            "refusal": None,
+                        },
+                        "logprobs": None,
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {"total_tokens": 0},
+                "system_fingerprint": "stub",
+            }
+        )
+
+    app = web.Application()
+    app[PEERS] = set()
+    app.router.add_post(COMPLETIONS_PATH, complete)
+    return app
+
+
+async def start(
+    host: str,
+    port: int,
+    delay_seconds: float = 0.0,
+    reply: str = "ok",
+    chunk_delay_seconds: float = 0.0,
+) -> web.AppRunner:
+    """Serves the stub on the running loop until the runner is cleaned up"""
+    runner = web.AppRunner(
+        create_app(delay_seconds, reply, chunk_delay_seconds)
+    )
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--delay-ms", type=float, default=0.0)
+    parser.add_argument("--reply", default="get_mind_map()")
+    parser.add_argument("--chunk-delay-ms", type=float, default=0.0)
+    parser.add_argument("--chunk-chars", type=int, default=4)
+    args = parser.parse_args()
+    web.run_app(
+        create_app(
+            args.delay_ms / 1000,
+            args.reply,
+            args.chunk_delay_ms / 1000,
+            args.chunk_chars,
+        ),
+        host=args.host,
+        port=args.port,
+    )
+
+
+if __name__ == "__main__":
+    main()
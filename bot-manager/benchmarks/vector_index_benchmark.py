@@ -0,0 +1,84 @@
+"""
+Measures how fast the hashing embedder builds the vector index and
+how long a relevant memory lookup takes over all messages.
+
+Run from the bot-manager folder: python -m benchmarks.vector_index_benchmark
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from app.lib.storage.bot_memory import BotMemory, Roles
+from app.lib.storage.config import Durability
+from app.lib.storage.durable_files import DurableFiles
+from app.lib.storage.vector_index import MemoryVectorIndex
+
+WORDS = [f"word{i}" for i in range(20_000)]
+
+
+def build_memory(message_count: int) -> BotMemory:
+    bot_memory = BotMemory()
+    start_ns = time.time_ns() - message_count * 1_000_000_000
+    random.seed(1)
+    for i in range(message_count):
+        words = [
+            WORDS[min(int(random.paretovariate(1.1)) - 1, len(WORDS) - 1)]
+            for _ in range(12)
+        ]
+        bot_memory.messages.append(
+            Roles.USER, " ".join(words), start_ns + i * 1_000_000_000
+        )
+    return bot_memory
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--dimensions", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    bot_memory = build_memory(args.messages)
+    print(
+        f"built {args.messages} messages in {time.perf_counter() - started:.2f} s"
+    )
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "vector_index.npz"
+        vector_index = MemoryVectorIndex(
+            path, DurableFiles(Durability.NONE), args.dimensions
+        )
+        started = time.perf_counter()
+        while vector_index.build_step(bot_memory, args.batch_size):
+            pass
+        seconds = time.perf_counter() - started
+        print(
+            f"embedded in {seconds:.2f} s, {args.messages / seconds:,.0f} messages/s"
+        )
+        started = time.perf_counter()
+        vector_index.save()
+        print(
+            f"saved {path.stat().st_size / 2**20:.1f} MiB in {time.perf_counter() - started:.2f} s"
+        )
+        started = time.perf_counter()
+        loaded = MemoryVectorIndex(
+            path, DurableFiles(Durability.NONE), args.dimensions
+        )
+        loaded.load()
+        print(f"loaded in {time.perf_counter() - started:.2f} s")
+
+        repeat = 20
+        started = time.perf_counter()
+        for i in range(repeat):
+            loaded.search(f"word{i} word{i + 1} word3", args.k)
+        per_call = (time.perf_counter() - started) / repeat
+        print(f"top {args.k} search: {per_call * 1_000:.1f} ms/call")
+
+
+if __name__ == "__main__":
+    main()
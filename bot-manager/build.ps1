@@ -25,6 +25,6 @@ isort ./profiles
 pylint ./profiles
 mypy ./profiles
 
-pyinstaller --onedir start.py --name colabai --noconfirm
+pyinstaller --onedir start.py --name colabai --noconfirm --collect-submodules profiles
 
 # --icon=icon.ico
\ No newline at end of file
@@ -2,4 +2,4 @@ python -m venv .venv
 .venv\Scripts\activate
 pip install -r requirements.txt
 pip install -r requirements.txt
-pyinstaller --onedir start.py
\ No newline at end of file
+pyinstaller --onedir start.py --collect-submodules profiles
\ No newline at end of file
@@ -6,7 +6,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=[],
+    hiddenimports=['profiles.default'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
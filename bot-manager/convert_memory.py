@@ -0,0 +1,18 @@
+import argparse
+
+from app.lib.storage.binary_snapshot import convert_snapshot
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Convert a bot memory snapshot between json and binary"
+    )
+    parser.add_argument('direction', choices=['to-binary', 'to-json'])
+    parser.add_argument('source', help='e.g. user/bot_memory.json')
+    parser.add_argument('target', help='e.g. user/bot_memory.bin')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    convert_snapshot(args.source, args.target, args.direction == 'to-binary')
@@ -1,42 +1,88 @@
 import asyncio
+import contextlib
 import datetime
 import json
-from enum import Enum
-from typing import Literal, Tuple, TypedDict
+import time
+from typing import Tuple
 
 from app.lib.messaging.bot_profile import SetUserNameResponse
 from app.lib.messaging.message_received import ReceiveChatMessage
 from app.lib.messaging.message_send import SendChatMessageResponse
 from app.lib.messaging.rooms import ChatRooms
-from app.lib.model_commands_parser import ModelCommandsParser
+from app.lib.model_commands_parser import CommandDetector, ModelCommandsParser
 from app.lib.plugins.plugin_base import PluginBase
 from app.lib.scheduler import WakeUpSchedule, WakeUpScheduleType
-from app.lib.storage.bot_memory import Roles
+from app.lib.storage.bot_memory import ModelMessageDict, PeriodicSummary, Roles
+from app.lib.summary_pipeline import ExtractiveSummarizer, SummaryPipeline
+
+# commands that change nothing outside the bot's own schedule, answers
+# running them are replayed from the response cache
+CACHEABLE_COMMANDS = frozenset(
+    {
+        "help",
+        "get_my_name",
+        "timeout",
+        "request_rooms_list",
+        "request_room_history",
+        "get_users",
+        "get_mind_map",
+        "get_summary",
+        "search_memory",
+    }
+)
 
 
 class Plugin(PluginBase):
     parser: ModelCommandsParser = ModelCommandsParser()
 
     async def dream(self) -> None:
+        pipeline = SummaryPipeline(self.bot.storage, ExtractiveSummarizer())
+        loop = asyncio.get_running_loop()
         while self.bot.scheduler.should_dream.is_set():
+            # the steps run on a worker thread, the loop is shared by all bots
+            summary = None
+            if self.bot.storage.bot_config.summarize_while_dreaming:
+                summary = await loop.run_in_executor(
+                    None, pipeline.next_summary, int(time.time())
+                )
+            if summary is not None:
+                pipeline.store(summary)
+                self.bot.async_storage.store_data()
+                continue
+            if await loop.run_in_executor(None, self.bot.storage.index_vectors):
+                continue
             self.logger.info("I'm dreaming")
             await asyncio.sleep(20)
 
     ##
     ##  Callbacks
     ##
-    async def new_message_callback(self, message: ReceiveChatMessage) -> None:
-        await self._send_and_respond_to_model(
-            message_content=self.bot.profile.new_message_received.format(
+    async def new_messages_callback(
+        self, messages: list[ReceiveChatMessage]
+    ) -> None:
+        for message in messages:
+            self.logger.info(
+                f"new message received, room: {message.room_name} - from: {message.sender_name} - message: {message.message}"
+            )
+        entries = [
+            self.bot.profile.new_message_received.format(
                 sender_id=message.sender_id,
                 sender_name=message.sender_name,
                 room_name=message.room_name,
                 room_id=message.room_id,
                 message=message.message,
             )
-        )
-        self.logger.info(
-            f"new message received, room: {message.room_name} - from: {message.sender_name} - message: {message.message}"
+            for message in messages
+        ]
+        # one model call answers all messages of the batch
+        await self._send_and_respond_to_model(
+            message_content=(
+                entries[0]
+                if len(entries) == 1
+                else self.bot.profile.new_messages_received.format(
+                    count=len(entries), messages="".join(entries)
+                )
+            )
         )
 
     async def on_scheduled_wakeup(self) -> None:
@@ -89,7 +135,7 @@ class Plugin(PluginBase):
                 )
                 return
             self.bot.storage.bot_config.bot_name = bot_name
-            self.bot.storage.store_data()
+            await self.bot.async_storage.commit()
             await self._get_my_name()
 
     async def _get_my_name(self) -> None:
@@ -173,16 +219,22 @@ class Plugin(PluginBase):
             self.bot.storage.bot_memory.set_periodic_summary(
                 interval=_interval, start_time=_start_time, summary=summary
             )
-            self.bot.storage.store_data()
+            await self.bot.async_storage.commit()
             response = self.bot.profile.summary_stored
         await self._send_and_respond_to_model(message_content=response)
 
     async def _store_mind_map(self, text: str) -> None:
-        self.bot.storage.bot_memory.mind_map = text
-        self.bot.storage.store_data()
-        await self._send_and_respond_to_model(
-            message_content=self.bot.profile.mind_map_stored
-        )
+        max_chars = self.bot.storage.bot_config.mind_map_max_chars
+        response: str
+        if max_chars and len(text) > max_chars:
+            response = self.bot.profile.mind_map_too_long.format(
+                length=len(text), max_chars=max_chars
+            )
+        else:
+            self.bot.storage.bot_memory.set_mind_map(text)
+            await self.bot.async_storage.commit()
+            response = self.bot.profile.mind_map_stored
+        await self._send_and_respond_to_model(message_content=response)
 
     async def _get_mind_map(self) -> None:
         response: str
@@ -192,25 +244,62 @@ class Plugin(PluginBase):
             response = self.bot.profile.mind_map_empty
         await self._send_and_respond_to_model(message_content=response)
 
-    async def _get_summary(self, interval: str, start_time: str) -> None:
+    async def _get_summary(
+        self, interval: str, start_time: str, end_time: str | None = None
+    ) -> None:
         _interval = self.parser.parse_interval(interval)
         _start_time = self.parser.parse_date(start_time)
+        _end_time = self.parser.parse_date(end_time) if end_time else None
         response: str
         if not _interval:
             response = self.bot.profile.summary_malformed_interval
 
         elif not _start_time:
             response = self.bot.profile.summary_malformed_start_time
+        elif end_time and not _end_time:
+            response = self.bot.profile.summary_malformed_end_time
         else:
-            summary = self.bot.storage.bot_memory.get_periodic_summary(
-                interval=_interval, start_time=_start_time
-            )
-            if summary:
-                response = summary.summary_text
+            bot_memory = self.bot.storage.bot_memory
+            summaries: list[PeriodicSummary]
+            if _end_time:
+                summaries = bot_memory.get_periodic_summaries_between(
+                    interval=_interval, start_time=_start_time, to_time=_end_time
+                )
+            else:
+                # fall back to the latest summary instead of a failed lookup
+                summary = bot_memory.get_periodic_summary(
+                    interval=_interval, start_time=_start_time
+                ) or bot_memory.get_latest_periodic_summary(
+                    interval=_interval, time=_start_time
+                )
+                summaries = [summary] if summary else []
+            if summaries:
+                response = "".join(
+                    self.bot.profile.summary_entry.format(
+                        interval=summary.period.value,
+                        start_date=datetime.datetime.fromtimestamp(
+                            summary.period_start_date
+                        ).strftime("%Y-%m-%d"),
+                        summary=summary.summary_text,
+                    )
+                    for summary in summaries
+                )
             else:
                 response = self.bot.profile.summary_empty
         await self._send_and_respond_to_model(message_content=response)
 
+    async def _search_memory(self, query: str, limit: str = "10") -> None:
+        _limit = int(limit) if limit.isdigit() else 10
+        hits = self.bot.storage.search_memory(query, _limit)
+        response: str
+        if hits:
+            response = self.bot.profile.search_results.format(
+                results=self.bot.context_builder.format_hits(hits)
+            )
+        else:
+            response = self.bot.profile.search_empty.format(query=query)
+        await self._send_and_respond_to_model(message_content=response)
+
     # async def _auto_summary(self, interval: str):
     #     # Implementation for auto_summary
     #     pass
@@ -251,53 +340,113 @@ class Plugin(PluginBase):
         self.bot.storage.bot_memory.add_message(
             role=role, content=message_content
         )
-        self.bot.storage.store_data()
-        return False, None
-        # headers = {
-        #     "Content-Type": "application/json",
-        #     "Authorization": f"Bearer {self.bot.storage.bot_config.model_api_key}",
-        # }
-
-        # data = {
-        #     "model": self.bot.storage.bot_config.model_name,
-        #     "messages": [
-        #         *self.bot.storage.bot_memory.get_last_n_messages(5),
-        #         {"role": Roles.SYSTEM.value, "content": message_content},
-        #     ],
-        # }
-
-        # try:
-        #     response = requests.post(
-        #         self.bot.storage.bot_config.model_api_url,
-        #         headers=headers,
-        #         data=json.dumps(data),
-        #     )
-
-        #     if response.status_code == 200:
-        #         model_response: ModelResponseDict = response.json()
-        #         self.logger.info(f"Model response JSON: {model_response}")
-        #         message: str = model_response["choices"][0]["message"][
-        #             "content"
-        #         ]
-        #         self.bot.storage.bot_memory.add_message(
-        #             role=Roles.ASSISTANT, content=message
-        #         )
-        #         self.bot.storage.store_data()
-        #         await self.parser.parse_command(
-        #             plugin=self,
-        #             command=message,
-        #             on_command_not_valid=self._on_command_not_valid,
-        #         )
-
-        #         return True, message
-        #     self.logger.error(
-        #         f"Error response from from the model {self.bot.storage.bot_config.model_api_url} - Error: {response.status_code}, {response.text}"
-        #     )
-        # except Exception as e:
-        #     self.logger.exception(
-        #         f"Error getting response from from the model {self.bot.storage.bot_config.model_api_url}: {e}"
-        #     )
-        # return False, None
+        self.bot.async_storage.store_data()
+        context = self.bot.context_builder.build(
+            system_prompt=self.bot.profile.get_initial_prompt(
+                self.bot.storage.bot_config.bot_name
+            ),
+            query=message_content,
+        )
+        self.logger.debug(
+            f"Model context: {len(context.messages)} messages, {context.token_count} of {context.token_budget} tokens"
+        )
+        if not self.bot.model_client.configured:
+            self.logger.error(
+                "Not sending the message to the model, no model_api_key or model_api_url is configured"
+            )
+            return False, None
+        try:
+            message, command = await self._ask_model(
+                context.messages, self._is_fixed_prompt(message_content)
+            )
+        except Exception as e:
+            self.logger.exception(
+                f"Error getting response from the model {self.bot.storage.bot_config.model_api_url}: {e}"
+            )
+            return False, None
+        self.logger.info(f"Model response: {message}")
+        self.bot.storage.bot_memory.add_message(
+            role=Roles.ASSISTANT, content=message
+        )
+        self.bot.async_storage.store_data()
+        await self.parser.parse_command(
+            plugin=self,
+            command=command,
+            on_command_not_valid=self._on_command_not_valid,
+        )
+        return True, message
+
+    def _is_fixed_prompt(self, message_content: str) -> bool:
+        """
+        The prompts sent without any variable part, the same context
+        often gets the same answer to them
+        """
+        profile = self.bot.profile
+        return message_content in (
+            profile.get_initial_prompt(self.bot.storage.bot_config.bot_name),
+            profile.no_activity,
+            profile.mind_map_empty,
+            profile.summary_stored,
+        )
+
+    async def _ask_model(
+        self, messages: list[ModelMessageDict], cacheable: bool = False
+    ) -> Tuple[str, str]:
+        """
+        Returns the model's answer to messages and the command to run.
+        Answers to cacheable requests come from the response cache when
+        it has them, answers running a command with side effects are
+        not cached.
+        """
+        config = self.bot.storage.bot_config
+        cache = self.bot.response_cache if cacheable else None
+        key = ""
+        if cache is not None:
+            key = cache.key(
+                config.model_name,
+                messages,
+                {"model_api_url": config.model_api_url},
+            )
+            answer = cache.get(key)
+            # the on-disk cache may hold answers stored by older versions
+            if (
+                answer is not None
+                and self.parser.get_command_name(answer) in CACHEABLE_COMMANDS
+            ):
+                self.logger.debug("Model response from the response cache")
+                # a streamed answer ends with its command
+                return answer, CommandDetector().feed(answer) or answer
+        started = time.perf_counter()
+        if config.model_stream:
+            message, command = await self._stream_from_model(messages)
+        else:
+            message = await self.bot.model_client.complete(messages)
+            command = message
+        if (
+            cache is not None
+            and self.parser.get_command_name(command) in CACHEABLE_COMMANDS
+        ):
+            cache.put(key, message, time.perf_counter() - started)
+        return message, command
+
+    async def _stream_from_model(
+        self, messages: list[ModelMessageDict]
+    ) -> Tuple[str, str]:
+        """
+        Reads the streamed answer only up to the end of its command, the
+        model stops generating once the stream is closed. Returns the
+        text received and the command, or twice the whole answer when it
+        does not start with a command.
+        """
+        detector = CommandDetector()
+        async with contextlib.aclosing(
+            self.bot.model_client.stream(messages)
+        ) as chunks:
+            async for chunk in chunks:
+                command = detector.feed(chunk)
+                if command is not None:
+                    return detector.text, command
+        return detector.text, detector.text
 
     async def _on_command_not_valid(self, error_message: str) -> None:
         await self._send_and_respond_to_model(
@@ -305,35 +454,3 @@ class Plugin(PluginBase):
                 error_message=error_message
             )
         )
-
-
-class ModelFinishReason(Enum):
-    STOP = "stop"
-
-
-class ModelResponseMessage(TypedDict):
-    role: Roles
-    content: str
-    refusal: None
-
-
-class ModelResponseChoices(TypedDict):
-    index: int
-    message: ModelResponseMessage
-
-    logprobs: None
-    finish_reason: ModelFinishReason
-
-
-class ModelResponseUsage(TypedDict):
-    total_tokens: int
-
-
-class ModelResponseDict(TypedDict):
-    id: str
-    object: Literal['chat.completion']
-    created: int
-    model: str
-    choices: list[ModelResponseChoices]
-    usage: ModelResponseUsage
-    system_fingerprint: str
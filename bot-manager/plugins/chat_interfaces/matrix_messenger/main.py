@@ -1,5 +1,6 @@
 from typing import Optional
 
+from aiohttp import ClientSession, ClientTimeout, TraceConfig
 from nio import (  # type: ignore
     AsyncClient,
     Event,
@@ -21,6 +22,7 @@ from nio import (  # type: ignore
     RoomSendError,
     RoomSendResponse,
 )
+from nio.client.async_client import on_request_chunk_sent  # type: ignore
 
 from app.lib.bot_manager import BotManager
 from app.lib.messaging.bot_profile import SetUserNameResponse
@@ -74,6 +76,7 @@ class Plugin(PluginBase):
                 self.bot.storage.bot_config.matrix_server,
                 self.bot.storage.bot_config.matrix_user_name,
             )
+            self.client.client_session = self._create_session()
             await self.client.login(
                 self.bot.storage.bot_config.matrix_user_password
             )
@@ -93,6 +96,21 @@ class Plugin(PluginBase):
                 "Missing matrix user name, password and/or server"
             )
 
+    def _create_session(self) -> ClientSession:
+        """
+        A session like the one nio creates, on the connection pool of
+        the runtime so sync and requests of all bots share it.
+        The client closes its session, the runtime closes the pool.
+        """
+        trace = TraceConfig()
+        trace.on_request_chunk_sent.append(on_request_chunk_sent)
+        return ClientSession(
+            timeout=ClientTimeout(total=self.client.config.request_timeout),
+            trace_configs=[trace],
+            connector=self.bot.runtime.http_connector(),
+            connector_owner=False,
+        )
+
     async def send_message(
         self, message: str, room_id: str, user_id: str | None
     ) -> SendChatMessageResponse:
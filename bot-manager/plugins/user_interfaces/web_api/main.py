@@ -1,9 +1,17 @@
+import time
 from typing import TYPE_CHECKING, Tuple, Union
 
 from flask import Response, jsonify, request
 
+from app.lib.message_batcher import MessageBatcherStatsDict
+from app.lib.model_commands_parser import ModelCommandsParser
 from app.lib.plugins.plugin_base import PluginBase
+from app.lib.response_cache import ResponseCacheStatsDict
+from app.lib.runtime import LoopStatsDict
+from app.lib.storage.bot_memory import ModelMessageDict, PeriodicSummaryDict
+from app.lib.storage.search_index import SearchHitDict
 from app.lib.storage.storage import StorageDict
+from app.lib.storage.storage_stats import StorageStatsDict
 
 if TYPE_CHECKING:
     from app.lib.webserver.webserver import WebServer
@@ -26,7 +34,84 @@ class Plugin(PluginBase):
             data = request.json
             if not isinstance(data, dict):  # Type check for data
                 return jsonify({"error": "Invalid data format"}), 400
-            for key, value in data.items():
-                setattr(bot_config, key, value)
-            print("Updated config:", bot_config)
+            try:
+                self.bot.storage.bot_config.update(data)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            self.logger.debug(f"Updated config: {', '.join(sorted(data))}")
+            self.bot.storage.store_data()
             return self.bot.storage.to_dict(), 200
+
+        @web_server.app.route(f'{path_prefix}/memory/messages', methods=['GET'])
+        @web_server.login_manager.conditional_login_required()
+        def get_memory_messages() -> tuple[list[ModelMessageDict], int]:  # type: ignore
+            start = request.args.get("from", type=float)
+            if start is not None:
+                to = request.args.get("to", default=time.time(), type=float)
+                return (
+                    self.bot.storage.get_messages_in_range(
+                        int(start * 1_000_000_000), int(to * 1_000_000_000)
+                    ),
+                    200,
+                )
+            limit = request.args.get("limit", default=50, type=int)
+            bot_memory = self.bot.storage.bot_memory.get_snapshot()
+            return bot_memory.get_last_n_messages(limit), 200
+
+        @web_server.app.route(
+            f'{path_prefix}/memory/summaries/<period>', methods=['GET']
+        )
+        @web_server.login_manager.conditional_login_required()
+        def get_memory_summaries(period: str) -> Tuple[Union[list[PeriodicSummaryDict], Response], int]:  # type: ignore
+            interval = ModelCommandsParser.parse_interval(period)
+            if not interval:
+                return jsonify({"error": "Invalid period"}), 400
+            bot_memory = self.bot.storage.bot_memory.get_snapshot()
+            start = request.args.get("from")
+            if start is None:
+                summaries = bot_memory.get_periodic_summaries(interval)
+            else:
+                start_time = ModelCommandsParser.parse_date(start)
+                to_time = ModelCommandsParser.parse_date(
+                    request.args.get("to", start)
+                )
+                if start_time is None or to_time is None:
+                    return jsonify({"error": "Invalid date, use Y-m-d"}), 400
+                summaries = bot_memory.get_periodic_summaries_between(
+                    interval, start_time, to_time
+                )
+            return [summary.to_dict() for summary in summaries], 200
+
+        @web_server.app.route(f'{path_prefix}/memory/search', methods=['GET'])
+        @web_server.login_manager.conditional_login_required()
+        def search_memory() -> Tuple[Union[list[SearchHitDict], Response], int]:  # type: ignore
+            query = request.args.get("q", "")
+            if not query.strip():
+                return jsonify({"error": "Missing query q"}), 400
+            limit = request.args.get("limit", default=20, type=int)
+            return self.bot.storage.search_memory(query, limit), 200
+
+        @web_server.app.route(f'{path_prefix}/storage/stats', methods=['GET'])
+        @web_server.login_manager.conditional_login_required()
+        def get_storage_stats() -> tuple[StorageStatsDict, int]:  # type: ignore
+            return self.bot.storage.stats.to_dict(), 200
+
+        @web_server.app.route(f'{path_prefix}/runtime/stats', methods=['GET'])
+        @web_server.login_manager.conditional_login_required()
+        def get_runtime_stats() -> tuple[LoopStatsDict, int]:  # type: ignore
+            # the loop is shared, so are its stats with the other bots
+            return self.bot.runtime.monitor.to_dict(), 200
+
+        @web_server.app.route(f'{path_prefix}/messages/stats', methods=['GET'])
+        @web_server.login_manager.conditional_login_required()
+        def get_message_stats() -> tuple[MessageBatcherStatsDict, int]:  # type: ignore
+            return self.bot.message_batcher.to_dict(), 200
+
+        @web_server.app.route(
+            f'{path_prefix}/model/cache/stats', methods=['GET']
+        )
+        @web_server.login_manager.conditional_login_required()
+        def get_model_cache_stats() -> Tuple[Union[ResponseCacheStatsDict, Response], int]:  # type: ignore
+            if self.bot.response_cache is None:
+                return jsonify({"error": "Response cache is disabled"}), 404
+            return self.bot.response_cache.to_dict(), 200
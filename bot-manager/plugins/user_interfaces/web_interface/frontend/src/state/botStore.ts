@@ -152,9 +152,10 @@ export interface Config {
     // eslint-disable-next-line @typescript-eslint/ban-types
     periodic_summaries: {};
     messages: {
-      [timestamp: string]: {
+      [seq: string]: {
         content: string;
         role: "system" | "assistant" | "user";
+        timestamp_ns: number;
       };
     };
   };
@@ -1,7 +1,7 @@
 import os
 from typing import TYPE_CHECKING
 
-from flask import Response, redirect, send_from_directory
+from flask import Response, redirect, send_from_directory, url_for
 
 from app.lib.bot_manager import BotManager
 from app.lib.plugins.plugin_base import PluginBase
@@ -26,7 +26,8 @@ class Plugin(PluginBase):
         # Route to serve React frontend
         @web_server.app.route('/')
         def home_redirect():  # type: ignore
-            return redirect(f'{path_prefix}')
+            # relative to the blueprint, which has a prefix per hosted bot
+            return redirect(url_for('.serve_react'))
 
         @web_server.app.route(f'{path_prefix}/')
         @web_server.app.route(f'{path_prefix}/<path:path>')
@@ -1,8 +1,17 @@
+from app.lib.prompt_template import PromptTemplate
 from app.lib.storage.bot_memory import Periods
 
 
 class Profile:
     def get_initial_prompt(self, bot_name: str | None) -> str:
+        """Built once per bot_name, help() and every request send it"""
+        prompt = self.initial_prompts.get(bot_name)
+        if prompt is None:
+            prompt = PromptTemplate(self.build_initial_prompt(bot_name))
+            self.initial_prompts[bot_name] = prompt
+        return prompt
+
+    def build_initial_prompt(self, bot_name: str | None) -> str:
         return f"""
             You are an AI assistant in a messaging app with a dynamic number of participants, including both humans and bots.
             Below are your available commands and guidelines for managing conversations effectively.
@@ -28,7 +37,8 @@ class Profile:
                 store_mind_map(text: string) — Saves important points, reminders about your role or key information for easy reference; memory starts empty.
                 store_summary(interval: string, start_time, summary: string) — Stores summaries at regular intervals (e.g., "daily," "weekly") to manage extensive histories.
                 get_mind_map() — Retrieves your mind map for reminders about your role or key information.
-                get_summary(start_time, interval: string) — Retrieves a previously saved summary based on an interval (e.g., "daily," "weekly").
+                get_summary(interval: string, start_time: date, end_time?: date) — Retrieves previously saved summaries of an interval (e.g., "daily," "weekly"). Without end_time it returns the summary starting at start_time or the latest one before it, with end_time all summaries overlapping the range.
+                search_memory(query: string, limit?: number) — Searches your messages, summaries and mind map for all words of the query, newest first. Put the query in double quotes to search for an exact phrase.
                 get_users(room_id: string) — Lists current chat members with their usernames and IDs.
 
             Guidelines
@@ -50,6 +60,7 @@ class Profile:
         """
 
     def __init__(self) -> None:
+        self.initial_prompts: dict[str | None, PromptTemplate] = {}
 
         self.no_activity: str = """
             woke up after 1 day inactivity
@@ -91,9 +102,47 @@ class Profile:
             start time is invalid, should be Y-m-d
         """
 
+        self.summary_malformed_interval: str = f"""
+            the interval is not valid, valid are: {', '.join([period.value for period in Periods])}
+        """
+        self.summary_malformed_start_time: str = """
+            start time is invalid, should be Y-m-d
+        """
+        self.summary_malformed_end_time: str = """
+            end time is invalid, should be Y-m-d
+        """
+        self.summary_entry: str = """
+            {interval} summary from {start_date}:
+            {summary}
+        """
+
+        self.search_results: str = """
+            Search results:
+            {results}
+        """
+        self.search_entry: str = """
+            {source}:
+            {content}
+        """
+        self.search_empty: str = """
+            nothing found for: {query}
+        """
+        self.context_mind_map: str = """
+            Your mind map:
+            {mind_map}
+        """
+        self.relevant_memories: str = """
+            Older memories related to the conversation:
+            {memories}
+        """
+
         self.mind_map_stored: str = """
             mind_map stored successfully
         """
+        self.mind_map_too_long: str = """
+            mind_map not stored, it has {length} characters but at most {max_chars} are allowed
+            keep only the most important points and store it again
+        """
 
         self.bot_name_already_exits: str = """"
             error: name already taken
@@ -114,6 +163,10 @@ class Profile:
             message:
             {message}
         """
+        self.new_messages_received: str = """
+            {count} new messages, answer them together:
+            {messages}
+        """
         self.room_not_found: str = """"
             receiver_room_id not found
         """
@@ -1,6 +1,6 @@
 import argparse
 
-from app import main
+from app import main, main_host
 
 
 def parse_args() -> argparse.Namespace:
@@ -8,9 +8,29 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument(
         '--dev-mode', action='store_true', help='Enable development mode'
     )
+    parser.add_argument(
+        '--multi-tenant',
+        action='store_true',
+        help='Host every bot folder in user/bots in this process',
+    )
+    parser.add_argument(
+        '--bots',
+        type=int,
+        default=1,
+        help='Bots to create in multi tenant mode if there are fewer folders',
+    )
+    parser.add_argument(
+        '--port',
+        type=int,
+        default=5000,
+        help='Web server port of all bots in multi tenant mode',
+    )
     return parser.parse_args()
 
 
 if __name__ == "__main__":
     args = parse_args()
-    main(dev_mode=args.dev_mode)
+    if args.multi_tenant:
+        main_host(dev_mode=args.dev_mode, bots=args.bots, port=args.port)
+    else:
+        main(dev_mode=args.dev_mode)
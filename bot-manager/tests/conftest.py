@@ -0,0 +1,42 @@
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from app.lib.storage.config import Config, Durability, StorageModes
+from app.lib.storage.durable_files import DurableFiles
+from app.lib.storage.memory_engines import (
+    JsonMemoryEngine,
+    MemoryEngine,
+    WalMemoryEngine,
+)
+from app.lib.storage.storage_stats import StorageStats
+
+EngineFactory = Callable[..., MemoryEngine]
+
+
+@pytest.fixture
+def config() -> Config:
+    config = Config.from_default()
+    config.durability = Durability.NONE
+    config.search_index = False
+    config.vector_index = False
+    return config
+
+
+@pytest.fixture
+def engine(tmp_path: Path, config: Config) -> EngineFactory:
+    """Creates a new engine on tmp_path, as a restarted bot would"""
+
+    def create(storage_mode: StorageModes = StorageModes.JSON) -> MemoryEngine:
+        config.storage_mode = storage_mode
+        engine_class: type[MemoryEngine] = (
+            WalMemoryEngine
+            if storage_mode == StorageModes.WAL
+            else JsonMemoryEngine
+        )
+        return engine_class(
+            tmp_path, config, StorageStats(), DurableFiles(config.durability)
+        )
+
+    return create
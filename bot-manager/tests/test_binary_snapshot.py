@@ -0,0 +1,64 @@
+from pathlib import Path
+
+import pytest
+
+from app.lib.storage.binary_snapshot import BinarySnapshot
+from app.lib.storage.bot_memory import BotMemory, Periods, Roles
+from app.lib.storage.config import Config, SnapshotFormats
+from tests.conftest import EngineFactory
+
+
+def create_memory() -> BotMemory:
+    bot_memory = BotMemory()
+    for number in range(10):
+        bot_memory.add_message(Roles.USER, f"message {number} ✓")
+        # equal strings share an entry of the string table
+        bot_memory.add_message(Roles.ASSISTANT, "timeout(3600)")
+    bot_memory.drop_messages_before(4)
+    bot_memory.set_periodic_summary(Periods.DAILY, 0, "timeout(3600)")
+    bot_memory.set_periodic_summary(Periods.MONTHLY, 86400, "a month 🌙")
+    return bot_memory
+
+
+def assert_same_memory(restored: BotMemory, bot_memory: BotMemory) -> None:
+    assert restored.messages_to_dict() == bot_memory.messages_to_dict()
+    assert restored.messages.next_seq == bot_memory.messages.next_seq
+    assert (
+        restored.periodic_summaries_to_dict()
+        == bot_memory.periodic_summaries_to_dict()
+    )
+    assert restored.mind_map == bot_memory.mind_map
+
+
+@pytest.mark.parametrize("mind_map", [None, "", "a map of ✓ things"])
+def test_round_trip(mind_map: str | None) -> None:
+    bot_memory = create_memory()
+    bot_memory.mind_map = mind_map
+
+    restored = BinarySnapshot.decode(BinarySnapshot.encode(bot_memory))
+
+    assert_same_memory(restored, bot_memory)
+    assert restored.add_message(Roles.USER, "next") == 20
+
+
+def test_rejects_other_data() -> None:
+    with pytest.raises(ValueError):
+        BinarySnapshot.decode(b'{"format_version": 2}'.ljust(64))
+
+
+def test_json_snapshot_is_converted(
+    engine: EngineFactory, config: Config, tmp_path: Path
+) -> None:
+    memory_engine = engine()
+    bot_memory = create_memory()
+    memory_engine.store(bot_memory)
+
+    config.snapshot_format = SnapshotFormats.BINARY
+    memory_engine = engine()
+    converted = memory_engine.load()
+    assert_same_memory(converted, bot_memory)
+    memory_engine.store(converted)
+
+    assert not (tmp_path / "bot_memory.json").exists()
+    assert (tmp_path / "bot_memory.bin").is_file()
+    assert_same_memory(engine().load(), bot_memory)
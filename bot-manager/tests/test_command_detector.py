@@ -0,0 +1,69 @@
+import pytest
+
+from app.lib.model_commands_parser import CommandDetector
+
+COMMAND = 'send_message(message="On my way (see you soon)", receiver_room_id=1)'
+
+
+def feed(chunks: list[str]) -> tuple[CommandDetector, str | None, int]:
+    """Returns the detector, the command and the chunk that completed it"""
+    detector = CommandDetector()
+    for number, chunk in enumerate(chunks):
+        command = detector.feed(chunk)
+        if command is not None:
+            return detector, command, number
+    return detector, None, len(chunks)
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 16, len(COMMAND)])
+def test_command_split_into_chunks(size: int) -> None:
+    completion = COMMAND + "\nI will tell them (later)."
+    chunks = [
+        completion[start : start + size]
+        for start in range(0, len(completion), size)
+    ]
+
+    detector, command, number = feed(chunks)
+
+    assert command == COMMAND
+    # found with the closing parenthesis, not at the end of the stream
+    assert number == (len(COMMAND) - 1) // size
+    assert detector.text == "".join(chunks[: number + 1])
+
+
+@pytest.mark.parametrize(
+    "completion, expected",
+    [
+        ("  timeout(3600)", "timeout(3600)"),
+        ("```python\nget_mind_map()\n```", "get_mind_map()"),
+        (
+            "search_memory('a (quoted) paren')",
+            "search_memory('a (quoted) paren')",
+        ),
+        (
+            'send_message(message="it\'s fine")',
+            'send_message(message="it\'s fine")',
+        ),
+        ("store_mind_map(text=f(x))", "store_mind_map(text=f(x))"),
+    ],
+)
+def test_command_in_one_chunk(completion: str, expected: str) -> None:
+    assert feed([completion])[1] == expected
+
+
+@pytest.mark.parametrize(
+    "completion",
+    ["Sure, timeout(3600)", "(timeout)", "timeout(3600", ""],
+)
+def test_no_command(completion: str) -> None:
+    detector, command, _ = feed(list(completion))
+    assert command is None
+    assert detector.text == completion
+
+
+def test_later_chunks_are_only_collected() -> None:
+    detector = CommandDetector()
+    assert detector.feed("timeout(1)") == "timeout(1)"
+    assert detector.feed(" get_mind_map()") is None
+    assert detector.command == "timeout(1)"
+    assert detector.text == "timeout(1) get_mind_map()"
@@ -0,0 +1,39 @@
+import pytest
+
+from app.lib.storage.config import Config, StorageModes
+
+
+def test_update_coerces_known_fields() -> None:
+    config = Config.from_default()
+    config.update(
+        {
+            "bot_timeout": 60,
+            "storage_mode": "wal",
+            "flush_interval_seconds": 2,
+            "model_api_key": None,
+            "context_token_budgets": {"gpt-4o": 8000},
+        }
+    )
+    assert config.bot_timeout == 60
+    assert config.storage_mode == StorageModes.WAL
+    assert config.flush_interval_seconds == 2.0
+    assert config.context_token_budgets == {"gpt-4o": 8000}
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        {"unknown_field": 1},
+        {"bot_timeout": "60"},
+        {"bot_timeout": True},
+        {"storage_mode": "tape"},
+        {"context_token_budgets": {"gpt-4o": "many"}},
+        {"bot_timeout": 60, "model_stream": "yes"},
+    ],
+)
+def test_update_rejects_without_changing(data: dict[str, object]) -> None:
+    config = Config.from_default()
+    before = config.to_dict()
+    with pytest.raises(ValueError):
+        config.update(data)
+    assert config.to_dict() == before
@@ -0,0 +1,140 @@
+import json
+from pathlib import Path
+
+from app.lib.storage.bot_memory import (
+    BOT_MEMORY_FORMAT_VERSION,
+    BotMemory,
+    MessageLog,
+    PeriodicSummary,
+    Periods,
+    Roles,
+)
+from app.lib.storage.config import Config, StorageModes
+from tests.conftest import EngineFactory
+
+
+def store_history(engine: EngineFactory, config: Config) -> None:
+    config.lazy_load = True
+    memory_engine = engine()
+    bot_memory = memory_engine.load()
+    for number in range(300):
+        bot_memory.add_message(Roles.USER, f"message {number}")
+    bot_memory.set_periodic_summary(Periods.DAILY, 0, "first day")
+    bot_memory.set_periodic_summary(Periods.DAILY, 86400, "second day")
+    memory_engine.store(bot_memory)
+
+
+def load_lazily(
+    engine: EngineFactory, storage_mode: StorageModes = StorageModes.JSON
+) -> tuple[BotMemory, list[str]]:
+    """Loads the memory and records which loaders were called"""
+    bot_memory = engine(storage_mode).load()
+    calls: list[str] = []
+    messages_loader = bot_memory.messages.loader
+    summaries_loader = bot_memory.summaries_loader
+    assert messages_loader is not None and summaries_loader is not None
+
+    def load_messages() -> MessageLog:
+        calls.append("messages")
+        return messages_loader()
+
+    def load_summaries() -> dict[str, dict[int, PeriodicSummary]]:
+        calls.append("summaries")
+        return summaries_loader()
+
+    bot_memory.messages.loader = load_messages
+    bot_memory.summaries_loader = load_summaries
+    return bot_memory, calls
+
+
+def test_store_after_lazy_load_does_not_load(
+    engine: EngineFactory, config: Config
+) -> None:
+    store_history(engine, config)
+    bot_memory, calls = load_lazily(engine)
+
+    bot_memory.add_message(Roles.SYSTEM, "wake up")
+    engine().store(bot_memory)
+
+    assert calls == []
+    restored = engine().load()
+    messages = restored.get_messages_from(0)
+    assert len(messages) == 301
+    assert messages[-1][1].content == "wake up"
+
+
+def test_replaying_records_does_not_load(
+    engine: EngineFactory, config: Config
+) -> None:
+    store_history(engine, config)
+    bot_memory, calls = load_lazily(engine)
+    memory_engine = engine()
+    bot_memory.set_periodic_summary(Periods.DAILY, 86400, "second day, again")
+    bot_memory.delete_periodic_summary(Periods.DAILY, 0)
+    bot_memory.drop_messages_before(100)
+    memory_engine.store(bot_memory)
+
+    restored, calls = load_lazily(engine)
+
+    assert calls == []
+    assert restored.get_periodic_summary(Periods.DAILY, 0) is None
+    summary = restored.get_periodic_summary(Periods.DAILY, 86400)
+    assert summary is not None
+    assert summary.summary_text == "second day, again"
+    messages = restored.get_messages_from(0)
+    assert [seq for seq, _ in messages] == list(range(100, 300))
+
+
+def test_snapshot_is_written_once_loaded(
+    engine: EngineFactory, config: Config
+) -> None:
+    store_history(engine, config)
+    bot_memory, _ = load_lazily(engine)
+    bot_memory.add_message(Roles.SYSTEM, "wake up")
+    memory_engine = engine()
+    memory_engine.store(bot_memory)
+    assert memory_engine.wal.path.stat().st_size
+
+    assert len(bot_memory.get_messages_from(0)) == 301
+    bot_memory.add_message(Roles.SYSTEM, "after loading")
+    memory_engine.store(bot_memory)
+
+    assert memory_engine.wal.path.stat().st_size == 0
+    restored = engine().load()
+    assert len(restored.get_messages_from(0)) == 302
+
+
+def test_outdated_header_is_not_used(
+    engine: EngineFactory, config: Config
+) -> None:
+    store_history(engine, config)
+    # the snapshot is rewritten by a bot that does not keep the header
+    config.lazy_load = False
+    memory_engine = engine()
+    bot_memory = memory_engine.load()
+    bot_memory.add_message(Roles.USER, "not in the header")
+    memory_engine.store(bot_memory)
+
+    config.lazy_load = True
+    restored = engine().load()
+    assert restored.messages.loader is None
+    assert restored.get_messages_from(0)[-1][1].content == "not in the header"
+
+    # the header is written again for the current snapshot
+    restored = engine().load()
+    assert restored.messages.loader is not None
+    assert len(restored.get_messages_from(0)) == 301
+
+
+def test_header_of_another_format_is_not_used(
+    engine: EngineFactory, config: Config, tmp_path: Path
+) -> None:
+    store_history(engine, config)
+    header_path = tmp_path / "bot_memory.head.json"
+    header = json.loads(header_path.read_text(encoding="utf-8"))
+    header["format_version"] = BOT_MEMORY_FORMAT_VERSION + 1
+    header_path.write_text(json.dumps(header), encoding="utf-8")
+
+    restored = engine().load()
+    assert restored.messages.loader is None
+    assert len(restored.get_messages_from(0)) == 300
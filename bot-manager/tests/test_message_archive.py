@@ -0,0 +1,119 @@
+from pathlib import Path
+
+from app.lib.storage.bot_memory import ModelMessage, Roles
+from app.lib.storage.config import Durability
+from app.lib.storage.durable_files import DurableFiles
+from app.lib.storage.message_archive import (
+    CHUNK_BYTES,
+    DAY_NS,
+    SEGMENT_HEADER,
+    ArchivedMessage,
+    MessageArchive,
+)
+from app.lib.storage.storage_stats import StorageStats
+
+# a repeated prompt, as the profile prompts are
+PROMPT = "woke up after 1 day inactivity, what should I do now? " * 4
+# 2023-11-14 00:00 UTC
+DAY_START_NS = 1699920000 * 1_000_000_000
+
+
+def create_archive(archive_dir: Path) -> MessageArchive:
+    return MessageArchive(
+        archive_dir, DurableFiles(Durability.NONE), StorageStats()
+    )
+
+
+def create_messages(days: int, per_day: int) -> list[ArchivedMessage]:
+    messages: list[ArchivedMessage] = []
+    for day in range(days):
+        for number in range(per_day):
+            seq = len(messages)
+            message = (
+                ModelMessage(Roles.SYSTEM, PROMPT)
+                if number % 2
+                else ModelMessage(Roles.USER, f"message {seq} ✓")
+            )
+            messages.append(
+                (seq, DAY_START_NS + day * DAY_NS + number * 1000, message)
+            )
+    return messages
+
+
+def test_round_trip_over_days(tmp_path: Path) -> None:
+    archive = create_archive(tmp_path)
+    messages = create_messages(days=3, per_day=50)
+
+    assert archive.archive(messages) == 150
+    assert len(archive.segments) == 3
+    assert archive.read_range(0, 2**63) == messages
+    # only the second day
+    assert (
+        archive.read_range(DAY_START_NS + DAY_NS, DAY_START_NS + 2 * DAY_NS - 1)
+        == messages[50:100]
+    )
+    # within a day
+    assert archive.read_range(DAY_START_NS + 2000, DAY_START_NS + 4000) == (
+        messages[2:5]
+    )
+
+
+def test_identical_bodies_are_stored_once(tmp_path: Path) -> None:
+    archive = create_archive(tmp_path)
+    archive.archive(create_messages(days=1, per_day=100))
+
+    data = archive.segments[0].path.read_bytes()
+    _, _, count, body_count, _, dictionary_id = SEGMENT_HEADER.unpack_from(
+        data, 0
+    )
+    assert count == 100
+    # 50 distinct user messages and the prompt
+    assert body_count == 51
+    assert dictionary_id
+    assert archive.stats.archive_bytes_stored < archive.stats.archive_bytes_raw
+
+
+def test_dictionary_is_reused_after_a_restart(tmp_path: Path) -> None:
+    messages = create_messages(days=2, per_day=20)
+    archive = create_archive(tmp_path)
+    archive.archive(messages[:20])
+    dictionaries = list(tmp_path.glob("dictionary-*.zdict"))
+    assert len(dictionaries) == 1
+
+    restarted = create_archive(tmp_path)
+    assert restarted.dictionary_id == archive.dictionary_id
+    assert restarted.archived_seq == 19
+    # archived messages are skipped
+    assert restarted.archive(messages) == 20
+    assert list(tmp_path.glob("dictionary-*.zdict")) == dictionaries
+    assert create_archive(tmp_path).read_range(0, 2**63) == messages
+
+
+def test_large_bodies_span_chunks(tmp_path: Path) -> None:
+    archive = create_archive(tmp_path)
+    messages: list[ArchivedMessage] = [
+        (
+            seq,
+            DAY_START_NS + seq,
+            ModelMessage(Roles.ASSISTANT, f"{seq}" * (CHUNK_BYTES // 3)),
+        )
+        for seq in range(10)
+    ]
+    archive.archive(messages)
+
+    data = archive.segments[0].path.read_bytes()
+    assert SEGMENT_HEADER.unpack_from(data, 0)[4] > 1
+    assert archive.read_range(DAY_START_NS + 7, DAY_START_NS + 8) == (
+        messages[7:9]
+    )
+
+
+def test_drop_before_deletes_whole_days(tmp_path: Path) -> None:
+    archive = create_archive(tmp_path)
+    messages = create_messages(days=3, per_day=10)
+    archive.archive(messages)
+
+    # the second day is not over yet
+    assert archive.drop_before(DAY_START_NS + DAY_NS + 1) == 1
+    assert len(list(tmp_path.glob("messages-*.seg"))) == 2
+    assert archive.read_range(0, 2**63) == messages[10:]
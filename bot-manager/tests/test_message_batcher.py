@@ -0,0 +1,107 @@
+import asyncio
+
+from app.lib.message_batcher import MessageBatcher
+from app.lib.messaging.message_received import ReceiveChatMessage
+from app.lib.storage.config import Config
+
+
+def message(text: str) -> ReceiveChatMessage:
+    return ReceiveChatMessage(
+        sender_id="@alice:example.org",
+        sender_name="alice",
+        message=text,
+        room_name="general",
+        room_id="!general:example.org",
+    )
+
+
+class Recorder:
+    """Records the delivered batches, answering each takes answer_seconds"""
+
+    def __init__(self, answer_seconds: float = 0.0) -> None:
+        self.answer_seconds: float = answer_seconds
+        self.batches: list[list[str]] = []
+        self.answering = asyncio.Event()
+
+    async def deliver(self, messages: list[ReceiveChatMessage]) -> None:
+        self.batches.append([message.message for message in messages])
+        self.answering.set()
+        await asyncio.sleep(self.answer_seconds)
+
+
+def create_batcher(
+    config: Config, recorder: Recorder, window_seconds: float, max_size: int
+) -> MessageBatcher:
+    config.message_batch_window_seconds = window_seconds
+    config.message_batch_max_size = max_size
+    return MessageBatcher(config, recorder.deliver)
+
+
+def test_messages_within_the_window_are_one_batch(config: Config) -> None:
+    async def run() -> None:
+        recorder = Recorder()
+        batcher = create_batcher(config, recorder, 0.05, 20)
+        for text in ["a", "b", "c"]:
+            batcher.add(message(text))
+            await asyncio.sleep(0.005)
+        assert recorder.batches == []
+        await asyncio.sleep(0.2)
+        assert recorder.batches == [["a", "b", "c"]]
+        assert batcher.to_dict()["saved_model_calls"] == 2
+
+    asyncio.run(run())
+
+
+def test_full_batches_are_delivered_right_away(config: Config) -> None:
+    async def run() -> None:
+        recorder = Recorder()
+        batcher = create_batcher(config, recorder, 10.0, 2)
+        for text in ["a", "b", "c", "d", "e"]:
+            batcher.add(message(text))
+        await asyncio.sleep(0.05)
+        # the last one waits for its window
+        assert recorder.batches == [["a", "b"], ["c", "d"]]
+        assert batcher.pending == [message("e")]
+        assert batcher.task is not None
+        batcher.task.cancel()
+
+    asyncio.run(run())
+
+
+def test_messages_arriving_meanwhile_go_into_the_next_batch(
+    config: Config,
+) -> None:
+    async def run() -> None:
+        recorder = Recorder(answer_seconds=0.1)
+        batcher = create_batcher(config, recorder, 0.01, 20)
+        batcher.add(message("a"))
+        await recorder.answering.wait()
+        batcher.add(message("b"))
+        batcher.add(message("c"))
+        await asyncio.sleep(0.05)
+        assert recorder.batches == [["a"]]
+        await asyncio.sleep(0.3)
+        assert recorder.batches == [["a"], ["b", "c"]]
+        assert batcher.to_dict()["batches"] == 2
+
+    asyncio.run(run())
+
+
+def test_failed_delivery_does_not_stop_batching(config: Config) -> None:
+    async def run() -> None:
+        delivered: list[str] = []
+
+        async def deliver(messages: list[ReceiveChatMessage]) -> None:
+            delivered.extend(message.message for message in messages)
+            if len(delivered) == 1:
+                raise RuntimeError("model api is down")
+
+        config.message_batch_window_seconds = 0.01
+        batcher = MessageBatcher(config, deliver)
+        batcher.add(message("a"))
+        await asyncio.sleep(0.05)
+        batcher.add(message("b"))
+        await asyncio.sleep(0.05)
+        assert delivered == ["a", "b"]
+
+    asyncio.run(run())
@@ -0,0 +1,62 @@
+import json
+from pathlib import Path
+
+from app.lib.storage.bot_memory import (
+    BOT_MEMORY_FORMAT_VERSION,
+    Periods,
+    Roles,
+)
+from tests.conftest import EngineFactory
+
+# messages keyed by their timestamp in seconds, without a format_version
+VERSION_1_MEMORY = {
+    "periodic_summaries": {
+        "daily": {
+            "1700000000": {
+                "period": "daily",
+                "period_start_date": 1700000000,
+                "summary_text": "a quiet day",
+            }
+        }
+    },
+    "mind_map": "people and places",
+    "messages": {
+        "1700000300": {"role": "assistant", "content": "third"},
+        "1700000100": {"role": "user", "content": "first"},
+        "1700000200": {"role": "system", "content": "second"},
+    },
+}
+
+
+def test_version_1_memory_is_migrated(
+    engine: EngineFactory, tmp_path: Path
+) -> None:
+    memory_path = tmp_path / "bot_memory.json"
+    memory_path.write_text(json.dumps(VERSION_1_MEMORY), encoding="utf-8")
+
+    memory_engine = engine()
+    bot_memory = memory_engine.load()
+    # sequence ids follow the order of the timestamps
+    assert [
+        (seq, message.content)
+        for seq, message in bot_memory.get_messages_from(0)
+    ] == [(0, "first"), (1, "second"), (2, "third")]
+    assert bot_memory.messages.timestamps_ns[0] == 1700000100 * 1_000_000_000
+    summary = bot_memory.get_periodic_summary(Periods.DAILY, 1700000000)
+    assert summary is not None and summary.summary_text == "a quiet day"
+    assert bot_memory.mind_map == "people and places"
+
+    # stored in the current format without any change
+    memory_engine.store(bot_memory)
+    stored = json.loads(memory_path.read_text(encoding="utf-8"))
+    assert stored["format_version"] == BOT_MEMORY_FORMAT_VERSION
+    assert stored["messages"]["0"] == {
+        "role": "user",
+        "content": "first",
+        "timestamp_ns": 1700000100 * 1_000_000_000,
+    }
+
+    restored = engine().load()
+    assert restored.messages_to_dict() == bot_memory.messages_to_dict()
+    # new messages continue after the migrated ones
+    assert restored.add_message(Roles.USER, "fourth") == 3
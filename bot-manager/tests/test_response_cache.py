@@ -0,0 +1,109 @@
+import time
+from pathlib import Path
+
+import pytest
+
+from app.lib.model_commands_parser import ModelCommandsParser
+from app.lib.response_cache import ResponseCache
+from app.lib.storage.bot_memory import ModelMessageDict
+from plugins.bots.standard_api.main import CACHEABLE_COMMANDS
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now: float = 1_700_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(time, "time", clock.time)
+    return clock
+
+
+def key(content: str) -> str:
+    messages: list[ModelMessageDict] = [{"role": "system", "content": content}]
+    return ResponseCache.key("model", messages, {"model_api_url": "url"})
+
+
+def test_key_depends_on_model_messages_and_parameters() -> None:
+    messages: list[ModelMessageDict] = [{"role": "system", "content": "a"}]
+    keys = {
+        ResponseCache.key("model", messages, {"model_api_url": "url"}),
+        ResponseCache.key("other", messages, {"model_api_url": "url"}),
+        ResponseCache.key("model", messages, {"model_api_url": "other"}),
+        key("b"),
+    }
+    assert len(keys) == 4
+    assert key("a") == key("a")
+
+
+def test_answers_expire_after_the_ttl(clock: Clock) -> None:
+    cache = ResponseCache(max_entries=10, ttl_seconds=60)
+    cache.put(key("help"), "get_mind_map()", latency_seconds=2.0)
+
+    clock.now += 60
+    assert cache.get(key("help")) == "get_mind_map()"
+    clock.now += 1
+    assert cache.get(key("help")) is None
+    assert cache.entries == {}
+    assert cache.to_dict()["hits"] == 1
+    assert cache.to_dict()["lookups"] == 2
+    assert cache.to_dict()["saved_seconds"] == 2.0
+
+
+def test_least_recently_used_answers_are_evicted(clock: Clock) -> None:
+    cache = ResponseCache(max_entries=2, ttl_seconds=60)
+    cache.put(key("a"), "timeout(1)", 1.0)
+    cache.put(key("b"), "timeout(2)", 1.0)
+    assert cache.get(key("a")) == "timeout(1)"
+    cache.put(key("c"), "timeout(3)", 1.0)
+
+    assert cache.get(key("b")) is None
+    assert cache.get(key("a")) == "timeout(1)"
+    assert cache.get(key("c")) == "timeout(3)"
+
+
+def test_disk_tier_survives_a_restart(clock: Clock, tmp_path: Path) -> None:
+    path = tmp_path / "response_cache.sqlite3"
+    cache = ResponseCache(max_entries=1, ttl_seconds=60, path=path)
+    cache.put(key("a"), "timeout(1)", 1.0)
+    cache.put(key("b"), "timeout(2)", 1.0)
+    # evicted from memory, still on disk
+    assert cache.get(key("a")) == "timeout(1)"
+    assert cache.to_dict()["disk_hits"] == 1
+    cache.close()
+
+    restarted = ResponseCache(max_entries=1, ttl_seconds=60, path=path)
+    assert restarted.get(key("b")) == "timeout(2)"
+    restarted.close()
+
+    # expired answers are pruned when the cache is opened
+    clock.now += 61
+    expired = ResponseCache(max_entries=1, ttl_seconds=60, path=path)
+    assert expired.connection is not None
+    rows = expired.connection.execute("SELECT COUNT(*) FROM responses")
+    assert rows.fetchone()[0] == 0
+    expired.close()
+
+
+@pytest.mark.parametrize(
+    "answer, cacheable",
+    [
+        ("timeout(3600)", True),
+        ("```python\nget_mind_map()\n```", True),
+        ('search_memory("holiday")', True),
+        ('send_message(message="hi", receiver_room_id=1)', False),
+        ('store_mind_map(text="people")', False),
+        ('set_my_name(bot_name="Ada")', False),
+        ("Let me think about it.", False),
+    ],
+)
+def test_answers_with_side_effects_are_not_cacheable(
+    answer: str, cacheable: bool
+) -> None:
+    command = ModelCommandsParser.get_command_name(answer)
+    assert (command in CACHEABLE_COMMANDS) == cacheable
@@ -0,0 +1,61 @@
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+from app.lib.storage.bot_memory import Roles
+from app.lib.storage.config import RetentionActions
+from app.lib.storage.storage import Storage
+
+
+@pytest.fixture
+def storage(tmp_path: Path) -> Iterator[Storage]:
+    storage = Storage(True, tmp_path)
+    yield storage
+    # writes what is pending before pytest closes the log streams
+    storage.flusher.stop()
+
+
+def limit_messages(storage: Storage, action: RetentionActions) -> None:
+    config = storage.bot_config
+    config.retention_max_messages = 3
+    config.retention_keep_unsummarized = False
+    config.retention_action = action
+    add_messages(storage)
+
+
+def add_messages(storage: Storage) -> None:
+    for i in range(10):
+        storage.bot_memory.add_message(Roles.USER, f"message {i}")
+
+
+def test_retention_is_off_by_default(storage: Storage) -> None:
+    add_messages(storage)
+    assert storage.select_evictions() == ([], 0)
+
+
+def test_select_evictions_archives_without_dropping(storage: Storage) -> None:
+    limit_messages(storage, RetentionActions.ARCHIVE)
+    messages, evicted_bytes = storage.select_evictions()
+    assert [message.content for _, _, message in messages] == [
+        f"message {i}" for i in range(7)
+    ]
+    assert evicted_bytes == 7 * len("message 0")
+    # only archived, the memory changes on the loop
+    assert storage.bot_memory.count_messages() == 10
+    assert len(storage.archive.read_range(0, 2**63)) == 7
+
+    assert storage.evict_messages(messages, evicted_bytes) == 7
+    assert [
+        message["content"]
+        for message in storage.bot_memory.get_last_n_messages(10)
+    ] == ["message 7", "message 8", "message 9"]
+    assert storage.select_evictions() == ([], 0)
+
+
+def test_enforce_retention_deletes(storage: Storage) -> None:
+    limit_messages(storage, RetentionActions.DELETE)
+    assert storage.enforce_retention(batch_size=5) == 5
+    assert storage.enforce_retention(batch_size=5) == 2
+    assert storage.bot_memory.count_messages() == 3
+    assert storage.archive.read_range(0, 2**63) == []
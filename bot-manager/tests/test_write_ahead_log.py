@@ -0,0 +1,70 @@
+from app.lib.storage.bot_memory import Roles
+from app.lib.storage.config import StorageModes
+from app.lib.storage.memory_engines import WalMemoryEngine
+from tests.conftest import EngineFactory
+
+
+def contents(engine: EngineFactory) -> list[str]:
+    """Loads the memory as a restarted bot would"""
+    bot_memory = engine(StorageModes.WAL).load()
+    return [message.content for _, message in bot_memory.get_messages_from(0)]
+
+
+def store_messages(engine: EngineFactory) -> WalMemoryEngine:
+    """A snapshot with one message and a log with two more"""
+    memory_engine = engine(StorageModes.WAL)
+    assert isinstance(memory_engine, WalMemoryEngine)
+    bot_memory = memory_engine.load()
+    bot_memory.add_message(Roles.USER, "in the snapshot")
+    memory_engine.store(bot_memory)
+    bot_memory.add_message(Roles.USER, "first in the log")
+    bot_memory.add_message(Roles.ASSISTANT, "second in the log")
+    memory_engine.store(bot_memory)
+    assert memory_engine.wal.record_count == 2
+    return memory_engine
+
+
+def test_log_is_replayed_on_load(engine: EngineFactory) -> None:
+    store_messages(engine)
+    assert contents(engine) == [
+        "in the snapshot",
+        "first in the log",
+        "second in the log",
+    ]
+
+
+def test_torn_record_is_cut_off(engine: EngineFactory) -> None:
+    wal_path = store_messages(engine).wal.path
+    size = wal_path.stat().st_size
+    with open(wal_path, "ab") as f:
+        f.write(b'{"op":"add_message","seq":3,"mess')
+
+    assert contents(engine) == [
+        "in the snapshot",
+        "first in the log",
+        "second in the log",
+    ]
+    assert wal_path.stat().st_size == size
+
+    # later records are not appended onto the torn one
+    memory_engine = engine(StorageModes.WAL)
+    bot_memory = memory_engine.load()
+    bot_memory.add_message(Roles.USER, "after the crash")
+    memory_engine.store(bot_memory)
+    assert contents(engine)[-1] == "after the crash"
+
+
+def test_replay_after_compaction_is_idempotent(engine: EngineFactory) -> None:
+    memory_engine = store_messages(engine)
+    log = memory_engine.wal.path.read_bytes()
+    bot_memory = memory_engine.load()
+    memory_engine.compact(bot_memory)
+    assert memory_engine.wal.path.stat().st_size == 0
+
+    # a crash after the snapshot was written, before the log was truncated
+    memory_engine.wal.path.write_bytes(log)
+    assert contents(engine) == [
+        "in the snapshot",
+        "first in the log",
+        "second in the log",
+    ]